@@ -11,10 +11,15 @@ from alembic import context
 
 # Import all models to register them
 import app.models  # noqa: F401
+from app.core.config import get_settings
 
 config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
+# Migrate the database the app is configured for
+config.set_main_option(
+    "sqlalchemy.url", str(get_settings().DATABASE_URL).replace("%", "%%")
+)
 
 target_metadata = SQLModel.metadata
 
@@ -0,0 +1,56 @@
+"""Composite and partial indexes for metric and alert reads
+
+Replaces the single-column indexes on metrics (project_id, sensor_id,
+metric_type, recorded_at) and alerts (status, created_at) with indexes
+that match the queries. Databases created by `init_db` before this
+revision have the old set; newer ones already match, so every statement
+is idempotent.
+
+On a TimescaleDB hypertable CREATE INDEX builds per chunk and locks
+writes while it runs; schedule the upgrade for a quiet period.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+LEGACY_INDEXES = {
+    "metrics": ["project_id", "sensor_id", "metric_type", "recorded_at"],
+    "alerts": ["status", "created_at"],
+}
+
+NEW_INDEXES = {
+    "ix_metrics_project_type_recorded":
+        "metrics (project_id, metric_type, recorded_at DESC, id DESC)",
+    "ix_metrics_project_recorded": "metrics (project_id, recorded_at DESC, id DESC)",
+    "ix_alerts_active_created":
+        "alerts (created_at DESC, id DESC) WHERE status = 'active'",
+    "ix_alerts_active_project_created":
+        "alerts (project_id, created_at DESC) WHERE status = 'active'",
+}
+
+
+def upgrade() -> None:
+    # Build the replacements before dropping what queries use today
+    for name, definition in NEW_INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+    for table, columns in LEGACY_INDEXES.items():
+        for column in columns:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
+
+
+def downgrade() -> None:
+    for table, columns in LEGACY_INDEXES.items():
+        for column in columns:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"
+            )
+    for name in NEW_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
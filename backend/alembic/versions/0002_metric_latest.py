@@ -0,0 +1,51 @@
+"""Latest reading per series
+
+Adds `metric_latest`, keyed by (project_id, metric_type, sensor_id) and
+maintained on ingest, and backfills it from the metrics history.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS metric_latest (
+            project_id INTEGER NOT NULL REFERENCES water_projects (id),
+            metric_type VARCHAR(50) NOT NULL,
+            sensor_id VARCHAR(100) NOT NULL,
+            metric_id BIGINT NOT NULL,
+            value FLOAT NOT NULL,
+            unit VARCHAR(20) NOT NULL,
+            is_anomaly BOOLEAN NOT NULL,
+            anomaly_score FLOAT,
+            quality_flag VARCHAR(20),
+            recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (project_id, metric_type, sensor_id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO metric_latest (
+            project_id, metric_type, sensor_id, metric_id, value, unit,
+            is_anomaly, anomaly_score, quality_flag, recorded_at
+        )
+        SELECT DISTINCT ON (project_id, metric_type, coalesce(sensor_id, ''))
+            project_id, metric_type, coalesce(sensor_id, ''), id, value, unit,
+            is_anomaly, anomaly_score, quality_flag, recorded_at
+        FROM metrics
+        ORDER BY project_id, metric_type, coalesce(sensor_id, ''),
+                 recorded_at DESC, id DESC
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS metric_latest")
@@ -0,0 +1,27 @@
+"""Windowed alert rules
+
+Adds `aggregate` and `window_seconds` to `alert_rules`, so a rule can
+compare the avg/min/max of a sensor's readings over a sliding window
+instead of a single reading.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE alert_rules ADD COLUMN IF NOT EXISTS aggregate VARCHAR(10)")
+    op.execute("ALTER TABLE alert_rules ADD COLUMN IF NOT EXISTS window_seconds INTEGER")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE alert_rules DROP COLUMN IF EXISTS window_seconds")
+    op.execute("ALTER TABLE alert_rules DROP COLUMN IF EXISTS aggregate")
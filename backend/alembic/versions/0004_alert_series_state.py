@@ -0,0 +1,50 @@
+"""One open alert per rule series
+
+Adds `sensor_id`, `occurrences` and `last_seen_at` to `alerts` and a
+unique partial index allowing one unresolved alert per (rule, project,
+sensor). Rule alerts raised before this revision carry no sensor, so all
+but the newest open alert of each (rule, project) are resolved first.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS sensor_id VARCHAR(100)")
+    op.execute("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1")
+    op.execute("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITH TIME ZONE")
+    op.execute("""
+        UPDATE alerts SET status = 'resolved', resolved_at = now()
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY rule_id, project_id, coalesce(sensor_id, '')
+                    ORDER BY created_at DESC, id DESC
+                ) AS n
+                FROM alerts
+                WHERE rule_id IS NOT NULL AND status <> 'resolved'
+            ) ranked
+            WHERE n > 1
+        )
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_alerts_open_rule_series
+        ON alerts (rule_id, project_id, coalesce(sensor_id, ''))
+        WHERE rule_id IS NOT NULL AND status <> 'resolved'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS uq_alerts_open_rule_series")
+    op.execute("ALTER TABLE alerts DROP COLUMN IF EXISTS last_seen_at")
+    op.execute("ALTER TABLE alerts DROP COLUMN IF EXISTS occurrences")
+    op.execute("ALTER TABLE alerts DROP COLUMN IF EXISTS sensor_id")
@@ -0,0 +1,42 @@
+"""Notification outbox
+
+Adds `notifications`, the outbox of alert emails and SMS written when an
+alert opens and drained by the notification dispatcher.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id SERIAL PRIMARY KEY,
+            alert_id INTEGER NOT NULL REFERENCES alerts (id),
+            channel VARCHAR(10) NOT NULL,
+            recipient VARCHAR(255) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error VARCHAR,
+            next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            sent_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_notifications_pending
+        ON notifications (channel, recipient, next_attempt_at)
+        WHERE status IN ('pending', 'sending')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS notifications")
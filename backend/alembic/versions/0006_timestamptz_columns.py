@@ -0,0 +1,63 @@
+"""Timezone-aware timestamp columns
+
+Converts the timestamp columns the models declare as
+`DateTime(timezone=True)` from `timestamp` to `timestamptz`. Stored values
+were written as naive UTC, so they are reinterpreted `AT TIME ZONE 'UTC'`
+rather than in the server's zone. Columns already converted are skipped.
+Continuous aggregates defined over `metrics.recorded_at` block the type
+change and must be dropped before upgrading and recreated afterwards.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+COLUMNS = {
+    "alerts": ["acknowledged_at", "resolved_at", "created_at"],
+    "alert_rules": ["created_at"],
+    "metrics": ["recorded_at", "ingested_at"],
+    "water_quality_readings": ["recorded_at"],
+    "tenants": ["created_at"],
+    "water_projects": ["commissioned_date", "created_at", "updated_at"],
+    "users": ["created_at", "updated_at"],
+}
+
+
+def _convert(table: str, column: str, current: str, target: str) -> None:
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = '{table}' AND column_name = '{column}'
+                  AND data_type = '{current}'
+            ) THEN
+                ALTER TABLE {table} ALTER COLUMN {column} TYPE {target}
+                USING {column} AT TIME ZONE 'UTC';
+            END IF;
+        END $$
+    """)
+
+
+def upgrade() -> None:
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            _convert(
+                table, column, "timestamp without time zone", "TIMESTAMP WITH TIME ZONE"
+            )
+
+
+def downgrade() -> None:
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            _convert(
+                table, column, "timestamp with time zone", "TIMESTAMP WITHOUT TIME ZONE"
+            )
@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 
-from app.api.routes import auth, users, projects, metrics, alerts, dashboard
+from app.api.routes import auth, users, projects, metrics, alerts, dashboard, jobs
 
 api_router = APIRouter()
 
@@ -12,3 +12,4 @@ api_router.include_router(projects.router)
 api_router.include_router(metrics.router)
 api_router.include_router(alerts.router)
 api_router.include_router(dashboard.router)
+api_router.include_router(jobs.router)
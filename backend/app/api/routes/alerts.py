@@ -2,13 +2,19 @@
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import after_commit, response_cache
 from app.core.database import get_session
-from app.core.rbac import get_current_user, require_permission
+from app.core.pagination import NEXT_CURSOR_HEADER, cursor_param, next_cursor
+from app.core.pubsub import ALERTS_CHANNEL, broker, make_message, sse_response
+from app.core.rbac import get_current_user, get_token_payload, require_permission
 from app.crud.alert import (
     get_active_alerts,
+    get_alert,
     acknowledge_alert,
     resolve_alert,
     get_alert_rules,
@@ -16,19 +22,87 @@ from app.crud.alert import (
 )
 from app.models.user import User
 from app.schemas.alert import AlertRead, AlertAcknowledge, AlertRuleCreate, AlertRuleRead
+from app.services.rules import rule_engine
 
 router = APIRouter(prefix="/alerts", tags=["Alerts"])
 
 
+async def _raise_not_open(session: AsyncSession, alert_id: int, conflict: str) -> None:
+    """Explain why a conditional alert update matched no row."""
+    if await get_alert(session, alert_id) is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    raise HTTPException(status_code=409, detail=conflict)
+
+
 @router.get("", response_model=list[AlertRead])
 async def get_alerts(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    user: Annotated[User, Depends(require_permission("view:alerts"))],
+    response: Response,
+    cursor: Annotated[tuple | None, Depends(cursor_param(datetime, int))],
+    project_id: int | None = None,
+    severity: str | None = None,
+    limit: int = 100,
+):
+    """Active alerts, newest first.
+
+    A full page sets the X-Next-Cursor header; send it back as `cursor`.
+    """
+    async def load() -> dict:
+        alerts = await get_active_alerts(
+            session, project_id, severity=severity, limit=limit, cursor=cursor
+        )
+        return {
+            "items": alerts,
+            "next_cursor": next_cursor(alerts, limit, lambda a: (a.created_at, a.id)),
+        }
+
+    page = await response_cache.get_or_set(
+        "alerts:active",
+        depends_on=("alerts",),
+        scope={
+            "role": user.role,
+            "project_id": project_id,
+            "severity": severity,
+            "limit": limit,
+            "cursor": cursor,
+        },
+        loader=load,
+    )
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return page["items"]
+
+
+@router.get("/stream")
+async def stream_alerts(
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_permission("view:alerts"))],
+    payload: Annotated[dict, Depends(get_token_payload)],
     project_id: int | None = None,
     severity: str | None = None,
     limit: int = 100,
 ):
-    return await get_active_alerts(session, project_id, severity=severity, limit=limit)
+    """Server-sent `alert` events for the national alert feed.
+
+    Opens with up to `limit` active alerts, then pushes every alert that is
+    raised, acknowledged or resolved; clients drop alerts that are no
+    longer active. `project_id` and `severity` filter both. The stream ends
+    when the access token expires; reconnect with a fresh token.
+    """
+    def accept(alert: dict) -> bool:
+        return (project_id is None or alert["project_id"] == project_id) and (
+            severity is None or alert["severity"] == severity
+        )
+
+    subscription = broker.subscribe(ALERTS_CHANNEL, accept)
+    try:
+        alerts = await get_active_alerts(session, project_id, severity=severity, limit=limit)
+    except BaseException:
+        subscription.close()
+        raise
+    snapshot = [make_message("alert", a.model_dump()) for a in reversed(alerts)]
+    return sse_response(subscription, snapshot, expires_at=payload.get("exp"))
 
 
 @router.post("/{alert_id}/acknowledge", response_model=AlertRead)
@@ -39,7 +113,7 @@ async def ack_alert(
 ):
     alert = await acknowledge_alert(session, alert_id, user.id)
     if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
+        await _raise_not_open(session, alert_id, "Only active alerts can be acknowledged")
     return alert
 
 
@@ -51,7 +125,7 @@ async def res_alert(
 ):
     alert = await resolve_alert(session, alert_id)
     if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
+        await _raise_not_open(session, alert_id, "Alert is already resolved")
     return alert
 
 
@@ -69,4 +143,6 @@ async def add_rule(
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_permission("manage:projects"))],
 ):
-    return await create_alert_rule(session, data.model_dump())
+    rule = await create_alert_rule(session, data.model_dump())
+    after_commit(session, rule_engine.invalidate)
+    return rule
@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.database import get_session
-from app.core.security import verify_password, create_access_token, create_refresh_token, decode_token
+from app.core.security import verify_password_async, create_access_token, create_refresh_token, decode_token
 from app.crud.user import get_user_by_email, create_user
 from app.schemas.auth import LoginRequest, TokenResponse, RefreshRequest, RegisterRequest
 
@@ -19,7 +19,7 @@ async def login(
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
     user = await get_user_by_email(session, data.email)
-    if not user or not verify_password(data.password, user.hashed_password):
+    if not user or not await verify_password_async(data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -0,0 +1,27 @@
+"""Background job status endpoints."""
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.rbac import get_current_user
+from app.models.user import User
+from app.schemas.job import JobRead
+from app.worker.jobs import job_owner, job_status
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: str,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """Status, progress and result of a job the current user submitted.
+
+    Jobs of other users are reported like unknown and expired ids: 404.
+    """
+    if await run_in_threadpool(job_owner, job_id) != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await run_in_threadpool(job_status, job_id)
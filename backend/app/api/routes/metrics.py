@@ -1,22 +1,32 @@
 """Metrics and sensor data endpoints."""
 
+import shutil
 from datetime import datetime
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, BinaryIO
+from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.config import get_settings
 from app.core.database import get_session
-from app.core.rbac import get_current_user, require_permission
+from app.core.pagination import NEXT_CURSOR_HEADER, cursor_param, next_cursor
+from app.core.pubsub import broker, make_message, metrics_channel, sse_response
+from app.core.rbac import get_current_user, get_token_payload, require_permission
 from app.crud.metric import (
     create_metric,
-    batch_create_metrics,
     get_metrics,
     get_latest_metrics,
     get_aggregated_metrics,
     create_quality_reading,
 )
+from app.crud.project import get_existing_project_ids
 from app.models.user import User
+from app.schemas.job import JobRead
 from app.schemas.metric import (
     MetricCreate,
     MetricRead,
@@ -24,27 +34,69 @@ from app.schemas.metric import (
     WaterQualityCreate,
     WaterQualityRead,
 )
-from app.services.anomaly import anomaly_detector
+from app.services.anomaly import AnomalyStrategy
+from app.services.ingest import prepare_metrics, remember_baselines, store_metrics
+from app.services.ingest_buffer import BufferFull, ingest_buffer
+from app.services.rules import rule_engine
+from app.utils.intervals import parse_interval
+from app.worker.jobs import submit
+from app.worker.tasks.models import refit_models, rescore_metrics
+from app.worker.tasks.reports import aggregated_report
+from app.worker.tasks.uploads import ingest_upload
+
+settings = get_settings()
 
 router = APIRouter(prefix="/metrics", tags=["Metrics & Sensor Data"])
 
+UPLOAD_COPY_BYTES = 1024 * 1024
+
+
+async def _check_projects(session: AsyncSession, metrics: list[dict]) -> None:
+    """422 if any reading names a project that does not exist."""
+    project_ids = {m["project_id"] for m in metrics}
+    unknown = project_ids - await get_existing_project_ids(session, project_ids)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown project id(s): {', '.join(map(str, sorted(unknown)))}",
+        )
+
+
+def _buffer(metrics_data: list[dict]) -> JSONResponse:
+    """Queue scored readings for write-behind; 429 when the queue is full."""
+    try:
+        accepted = ingest_buffer.submit(metrics_data)
+    except BufferFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest queue is full, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    return JSONResponse(
+        status_code=202,
+        content={"accepted": accepted, "queue_depth": ingest_buffer.depth},
+    )
+
 
 @router.post("", response_model=MetricRead, status_code=201)
 async def add_metric(
     data: MetricCreate,
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_permission("create:metrics"))],
+    strategy: AnomalyStrategy | None = None,
 ):
-    """Ingest a single metric reading."""
-    metric_data = data.model_dump()
-
-    # Run anomaly detection
-    is_anomaly, score = anomaly_detector.detect_simple(data.metric_type, data.value)
-    metric_data["is_anomaly"] = is_anomaly
-    metric_data["anomaly_score"] = score
-    metric_data["quality_flag"] = "suspect" if is_anomaly else "good"
+    """Ingest a single metric reading.
 
+    Answers 202 without a body when the write-behind buffer is running.
+    """
+    metrics = [data.model_dump()]
+    await _check_projects(session, metrics)
+    metric_data = (await prepare_metrics(session, metrics, strategy))[0]
+    if ingest_buffer.running:
+        return _buffer([metric_data])
     metric = await create_metric(session, metric_data)
+    remember_baselines(session, [metric.model_dump()])
+    await rule_engine.evaluate(session, [metric.model_dump()])
     return metric
 
 
@@ -53,32 +105,71 @@ async def add_metrics_batch(
     data: MetricBatchCreate,
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_permission("create:metrics"))],
+    strategy: AnomalyStrategy | None = None,
 ):
-    """Batch ingest metrics (IoT / SCADA integration)."""
-    metrics_data = []
-    for m in data.metrics:
-        d = m.model_dump()
-        is_anomaly, score = anomaly_detector.detect_simple(m.metric_type, m.value)
-        d["is_anomaly"] = is_anomaly
-        d["anomaly_score"] = score
-        d["quality_flag"] = "suspect" if is_anomaly else "good"
-        metrics_data.append(d)
-
-    count = await batch_create_metrics(session, metrics_data)
+    """Batch ingest metrics (IoT / SCADA integration).
+
+    `strategy` selects the anomaly detector; defaults to ANOMALY_STRATEGY.
+    Answers 202 once queued when the write-behind buffer is running.
+    """
+    metrics = [m.model_dump() for m in data.metrics]
+    await _check_projects(session, metrics)
+    metrics_data = await prepare_metrics(session, metrics, strategy)
+    if ingest_buffer.running:
+        return _buffer(metrics_data)
+    count = await store_metrics(session, metrics_data)
     return {"ingested": count}
 
 
+@router.get("/ingest/stats")
+async def ingest_stats(
+    _: Annotated[User, Depends(require_permission("view:metrics"))],
+):
+    """Write-behind buffer queue depth, throughput and flush latency."""
+    return ingest_buffer.stats()
+
+
+@router.get("/ingest/dead-letters")
+async def ingest_dead_letters(
+    _: Annotated[User, Depends(require_permission("view:metrics"))],
+):
+    """Buffered readings that failed to write on their own, oldest first."""
+    return jsonable_encoder(list(ingest_buffer.dead_letters))
+
+
+@router.post("/models/refit", response_model=JobRead, status_code=202)
+async def refit_anomaly_models(
+    user: Annotated[User, Depends(require_permission("manage:projects"))],
+    project_id: int | None = None,
+):
+    """Queue a refit of the per-sensor anomaly models, for all series or one project's."""
+    return await submit(refit_models, owner=user.id, project_id=project_id)
+
+
 @router.get("/{project_id}", response_model=list[MetricRead])
 async def get_project_metrics(
     project_id: int,
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_permission("view:metrics"))],
+    response: Response,
+    cursor: Annotated[tuple | None, Depends(cursor_param(datetime, int))],
     metric_type: str | None = None,
     start_time: datetime | None = None,
     end_time: datetime | None = None,
     limit: int = Query(default=500, le=5000),
 ):
-    return await get_metrics(session, project_id, metric_type, start_time, end_time, limit)
+    """Readings newest first.
+
+    A full page sets the X-Next-Cursor header; send it back as `cursor`
+    to continue into older history.
+    """
+    metrics = await get_metrics(
+        session, project_id, metric_type, start_time, end_time, limit, cursor=cursor
+    )
+    token = next_cursor(metrics, limit, lambda m: (m.recorded_at, m.id))
+    if token:
+        response.headers[NEXT_CURSOR_HEADER] = token
+    return metrics
 
 
 @router.get("/{project_id}/latest", response_model=list[MetricRead])
@@ -91,6 +182,31 @@ async def get_project_latest(
     return await get_latest_metrics(session, project_id)
 
 
+@router.get("/{project_id}/stream")
+async def stream_project_metrics(
+    project_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    _: Annotated[User, Depends(require_permission("view:metrics"))],
+    payload: Annotated[dict, Depends(get_token_payload)],
+):
+    """Server-sent `metric` events as a project's latest readings change.
+
+    Opens with the current latest reading of every series, then pushes each
+    new one. The stream ends when the access token expires; reconnect with
+    a fresh token.
+    """
+    subscription = broker.subscribe(metrics_channel(project_id))
+    try:
+        latest = await get_latest_metrics(session, project_id)
+    except BaseException:
+        subscription.close()
+        raise
+    snapshot = [
+        make_message("metric", m.model_dump(exclude={"ingested_at"})) for m in latest
+    ]
+    return sse_response(subscription, snapshot, expires_at=payload.get("exp"))
+
+
 @router.get("/{project_id}/aggregated")
 async def get_project_aggregated(
     project_id: int,
@@ -102,11 +218,49 @@ async def get_project_aggregated(
     end_time: datetime | None = None,
 ):
     """Get aggregated metrics for charts."""
-    return await get_aggregated_metrics(
-        session, project_id, metric_type, interval, start_time, end_time
+    try:
+        return await get_aggregated_metrics(
+            session, project_id, metric_type, interval, start_time, end_time
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post("/{project_id}/aggregated/report", response_model=JobRead, status_code=202)
+async def queue_aggregated_report(
+    project_id: int,
+    metric_type: str,
+    user: Annotated[User, Depends(require_permission("export:reports"))],
+    interval: str = "1 hour",
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+):
+    """Queue `GET /{project_id}/aggregated` as a job, for long ranges."""
+    try:
+        parse_interval(interval)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return await submit(
+        aggregated_report,
+        project_id,
+        metric_type,
+        interval,
+        start_time.isoformat() if start_time else None,
+        end_time.isoformat() if end_time else None,
+        owner=user.id,
     )
 
 
+@router.post("/{project_id}/rescore", response_model=JobRead, status_code=202)
+async def rescore_project_metrics(
+    project_id: int,
+    user: Annotated[User, Depends(require_permission("manage:projects"))],
+    metric_type: str | None = None,
+):
+    """Queue re-scoring of a project's stored readings with the current models."""
+    return await submit(rescore_metrics, project_id, metric_type, owner=user.id)
+
+
 @router.post("/quality", response_model=WaterQualityRead, status_code=201)
 async def add_quality_reading(
     data: WaterQualityCreate,
@@ -117,13 +271,24 @@ async def add_quality_reading(
     return await create_quality_reading(session, data.model_dump())
 
 
-@router.post("/upload/csv")
+def _save_upload(src: BinaryIO, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as dst:
+        shutil.copyfileobj(src, dst, UPLOAD_COPY_BYTES)
+
+
+@router.post("/upload/csv", response_model=JobRead, status_code=202)
 async def upload_csv(
     file: UploadFile = File(...),
-    session: AsyncSession = Depends(get_session),
     user: User = Depends(require_permission("upload:data")),
 ):
-    """Upload CSV/Excel file with metric readings."""
+    """Queue a CSV/Excel file of metric readings for ingestion.
+
+    The file is saved to UPLOAD_DIR, which the workers must share, and
+    processed on the `ingest` queue in chunks of UPLOAD_CHUNK_ROWS rows.
+    Poll `GET /jobs/{id}` for progress and the
+    `{"ingested", "rejected", "filename"}` result.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
 
@@ -131,47 +296,10 @@ async def upload_csv(
     if suffix not in ("csv", "xlsx", "xls"):
         raise HTTPException(status_code=400, detail="Only CSV and Excel files accepted")
 
-    content = await file.read()
-
+    path = Path(settings.UPLOAD_DIR) / f"{uuid4().hex}.{suffix}"
+    await run_in_threadpool(_save_upload, file.file, path)
     try:
-        import pandas as pd
-        import io
-
-        if suffix == "csv":
-            df = pd.read_csv(io.BytesIO(content))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
-
-        required_cols = {"project_id", "metric_type", "value", "unit"}
-        if not required_cols.issubset(set(df.columns)):
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain columns: {required_cols}",
-            )
-
-        metrics_data = []
-        for _, row in df.iterrows():
-            d = {
-                "project_id": int(row["project_id"]),
-                "metric_type": str(row["metric_type"]),
-                "value": float(row["value"]),
-                "unit": str(row["unit"]),
-                "sensor_id": str(row.get("sensor_id", "")),
-            }
-            is_anomaly, score = anomaly_detector.detect_simple(
-                d["metric_type"], d["value"]
-            )
-            d["is_anomaly"] = is_anomaly
-            d["anomaly_score"] = score
-            d["quality_flag"] = "suspect" if is_anomaly else "good"
-            metrics_data.append(d)
-
-        count = await batch_create_metrics(session, metrics_data)
-        return {"ingested": count, "filename": file.filename}
-
-    except ImportError:
-        raise HTTPException(
-            status_code=500, detail="pandas not installed for CSV processing"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing file: {e}")
+        return await submit(ingest_upload, str(path), suffix, file.filename, owner=user.id)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
@@ -5,7 +5,9 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import response_cache
 from app.core.database import get_session
+from app.core.pagination import cursor_param, next_cursor
 from app.core.rbac import Role, get_current_user, require_role, require_permission
 from app.crud.project import (
     create_project,
@@ -24,17 +26,27 @@ router = APIRouter(prefix="/projects", tags=["Water Projects"])
 async def get_projects(
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(get_current_user)],
+    cursor: Annotated[tuple | None, Depends(cursor_param(int))],
     skip: int = 0,
     limit: int = Query(default=50, le=200),
     region: str | None = None,
     status: str | None = None,
     tenant_id: int | None = None,
     project_type: str | None = None,
+    include_total: bool = True,
 ):
+    """List projects by id. Pass `next_cursor` back as `cursor` for the next page;
+    `skip` is kept for existing clients but gets slower with depth."""
     projects, total = await list_projects(
-        session, skip, limit, region, status, tenant_id, project_type
+        session, skip, limit, region, status, tenant_id, project_type,
+        after_id=cursor[0] if cursor else None,
+        include_total=include_total,
+    )
+    return ProjectList(
+        items=projects,
+        total=total,
+        next_cursor=next_cursor(projects, limit, lambda p: (p.id,)),
     )
-    return ProjectList(items=projects, total=total)
 
 
 @router.post("", response_model=ProjectRead, status_code=201)
@@ -50,11 +62,16 @@ async def add_project(
 @router.get("/map", response_model=list[ProjectRead])
 async def get_map_projects(
     session: Annotated[AsyncSession, Depends(get_session)],
-    _: Annotated[User, Depends(require_permission("view:map"))],
+    user: Annotated[User, Depends(require_permission("view:map"))],
     region: str | None = None,
 ):
     """Get projects with coordinates for map visualization."""
-    return await get_projects_for_map(session, region)
+    return await response_cache.get_or_set(
+        "projects:map",
+        depends_on=("projects",),
+        scope={"role": user.role, "region": region},
+        loader=lambda: get_projects_for_map(session, region),
+    )
 
 
 @router.get("/{project_id}", response_model=ProjectRead)
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.database import get_session
+from app.core.pagination import cursor_param, next_cursor
 from app.core.rbac import Role, get_current_user, require_role
 from app.crud.user import list_users, get_user_by_id, update_user
 from app.models.user import User
@@ -23,11 +24,22 @@ async def get_me(current_user: Annotated[User, Depends(get_current_user)]):
 async def get_users(
     session: Annotated[AsyncSession, Depends(get_session)],
     _: Annotated[User, Depends(require_role(Role.MINISTER, Role.CEO))],
+    cursor: Annotated[tuple | None, Depends(cursor_param(int))],
     skip: int = 0,
     limit: int = 50,
+    include_total: bool = True,
 ):
-    users, total = await list_users(session, skip, limit)
-    return UserList(items=users, total=total)
+    """List users by id. Pass `next_cursor` back as `cursor` for the next page."""
+    users, total = await list_users(
+        session, skip, limit,
+        after_id=cursor[0] if cursor else None,
+        include_total=include_total,
+    )
+    return UserList(
+        items=users,
+        total=total,
+        next_cursor=next_cursor(users, limit, lambda u: (u.id,)),
+    )
 
 
 @router.get("/{user_id}", response_model=UserRead)
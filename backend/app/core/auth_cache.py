@@ -0,0 +1,135 @@
+"""Short-TTL cache of authenticated users.
+
+`get_current_user` consults this before querying the users table, so a
+client hammering an endpoint with the same token costs one JWT decode
+per request instead of a DB round trip. Entries are keyed on user id and
+a digest of the token and hold a plain snapshot of the user's columns,
+minus the password hash.
+
+The default backend is per process. With the "redis" backend entries
+live in one Redis hash per user, so invalidation reaches every worker.
+Redis failures fall back to the database.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import get_settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class UserCache:
+    """Maps (user id, token) to a user snapshot for `ttl_seconds`."""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_users: int,
+        backend: str = "memory",
+        redis_url: str | None = None,
+        enabled: bool = True,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.backend = backend
+        self.redis_url = redis_url
+        self.enabled = enabled
+        # user id -> token digest -> (expires at, user fields)
+        self._entries: OrderedDict[int, dict[str, tuple[float, dict]]] = OrderedDict()
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def use_client(self, client) -> None:
+        """Swap in a Redis client (e.g. fakeredis in tests)."""
+        self._client = client
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _redis_key(self, user_id: int) -> str:
+        return f"auth:user:{user_id}"
+
+    async def get(self, user_id: int, token: str) -> User | None:
+        if not self.enabled:
+            return None
+        digest = token_digest(token)
+        if self.backend == "redis":
+            try:
+                raw = await self.client.hget(self._redis_key(user_id), digest)
+            except Exception:
+                logger.warning("User cache read failed", exc_info=True)
+                return None
+            entry = json.loads(raw) if raw is not None else None
+        else:
+            entry = self._entries.get(user_id, {}).get(digest)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+
+        if entry is None or entry[0] < time.time():
+            return None
+        # A fresh instance per request, detached from any session. The
+        # hash is never cached; password checks always read the database.
+        return User.model_validate(entry[1], update={"hashed_password": ""})
+
+    async def put(self, user_id: int, token: str, user: User) -> None:
+        if not self.enabled:
+            return
+        digest = token_digest(token)
+        entry = (
+            time.time() + self.ttl_seconds,
+            jsonable_encoder(user, exclude={"hashed_password"}),
+        )
+        if self.backend == "redis":
+            key = self._redis_key(user_id)
+            try:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    pipe.hset(key, digest, json.dumps(entry))
+                    pipe.expire(key, int(self.ttl_seconds) + 1)
+                    await pipe.execute()
+            except Exception:
+                logger.warning("User cache write failed", exc_info=True)
+            return
+
+        tokens = self._entries.setdefault(user_id, {})
+        tokens[digest] = entry
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: int) -> None:
+        """Drop every cached token for `user_id`."""
+        self._entries.pop(user_id, None)
+        if self.backend == "redis":
+            try:
+                await self.client.delete(self._redis_key(user_id))
+            except Exception:
+                logger.warning("User cache invalidation failed", exc_info=True)
+
+
+# Singleton
+user_cache = UserCache(
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_users=settings.AUTH_USER_CACHE_MAX_USERS,
+    backend=settings.AUTH_USER_CACHE_BACKEND,
+    redis_url=settings.REDIS_URL,
+    enabled=settings.AUTH_USER_CACHE_TTL_SECONDS > 0,
+)
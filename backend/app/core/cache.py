@@ -0,0 +1,205 @@
+"""Redis-backed response cache for read-heavy endpoints.
+
+Entries are keyed by namespace, the current version of every data
+namespace they depend on ("projects", "alerts", "metrics") and the
+request scope (route, query params, role). Writes mark the namespaces
+they touch as stale on the session; `get_session` bumps those versions
+after the transaction commits, which orphans every dependent entry at
+once. Orphans simply expire via their TTL.
+
+Redis problems never fail a request: errors are treated as misses and
+the cache backs off for a few seconds before trying Redis again.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STALE_NAMESPACES = "stale_cache_namespaces"
+AFTER_COMMIT = "after_commit_callbacks"
+AFTER_ROLLBACK = "after_rollback_callbacks"
+
+
+class ResponseCache:
+    """Read-through JSON cache with namespace-version invalidation."""
+
+    def __init__(
+        self,
+        url: str,
+        ttl_seconds: int,
+        enabled: bool = True,
+        prefix: str = "cache",
+        retry_seconds: float = 5.0,
+        timeout_seconds: float = 0.25,
+    ):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.prefix = prefix
+        self.retry_seconds = retry_seconds
+        self.timeout_seconds = timeout_seconds
+        self.hits = 0
+        self.misses = 0
+        self._client = None
+        self._retry_at = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.Redis.from_url(
+                self.url,
+                socket_timeout=self.timeout_seconds,
+                socket_connect_timeout=self.timeout_seconds,
+            )
+        return self._client
+
+    def use_client(self, client) -> None:
+        """Swap in a Redis client (e.g. fakeredis in tests)."""
+        self._client = client
+        self._retry_at = 0.0
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._retry_at
+
+    def _failed(self, action: str) -> None:
+        logger.warning(
+            "Response cache %s failed; bypassing Redis for %.0fs",
+            action, self.retry_seconds, exc_info=True,
+        )
+        self._retry_at = time.monotonic() + self.retry_seconds
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{self.prefix}:version:{namespace}"
+
+    async def _entry_key(self, name: str, depends_on: Iterable[str], scope: dict) -> str:
+        namespaces = sorted(depends_on)
+        versions = await self.client.mget([self._version_key(ns) for ns in namespaces])
+        parts = {
+            "versions": [int(v or 0) for v in versions],
+            "scope": scope,
+        }
+        digest = hashlib.sha1(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return f"{self.prefix}:{name}:{digest}"
+
+    async def get_or_set(
+        self,
+        name: str,
+        depends_on: Iterable[str],
+        scope: dict,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: int | None = None,
+    ) -> Any:
+        """Return the cached JSON for `name`/`scope`, or load and store it."""
+        if not self._available():
+            return await loader()
+
+        key = None
+        try:
+            key = await self._entry_key(name, depends_on, scope)
+            cached = await self.client.get(key)
+        except Exception:
+            self._failed("read")
+            cached = None
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        self.misses += 1
+        value = jsonable_encoder(await loader())
+        if key is not None and self._available():
+            try:
+                await self.client.set(
+                    key, json.dumps(value), ex=ttl_seconds or self.ttl_seconds
+                )
+            except Exception:
+                self._failed("write")
+        return value
+
+    async def invalidate(self, *namespaces: str) -> None:
+        """Bump namespace versions, orphaning every dependent entry."""
+        if not namespaces or not self._available():
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for namespace in namespaces:
+                    pipe.incr(self._version_key(namespace))
+                await pipe.execute()
+        except Exception:
+            self._failed("invalidation")
+
+
+def mark_stale(session: AsyncSession, *namespaces: str) -> None:
+    """Record that this transaction changes data in `namespaces`."""
+    session.info.setdefault(STALE_NAMESPACES, set()).update(namespaces)
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """Run `callback` once this transaction commits."""
+    session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+def after_rollback(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run `callback` if this transaction rolls back, to undo in-memory state."""
+    session.info.setdefault(AFTER_ROLLBACK, []).append(callback)
+
+
+async def flush_stale(session: AsyncSession, committed: bool = True) -> None:
+    """Run pending invalidations; call after commit or rollback.
+
+    Never raises: the transaction is already settled, so a failing
+    callback is logged and the rest still run.
+    """
+    namespaces = session.info.pop(STALE_NAMESPACES, None)
+    callbacks = session.info.pop(AFTER_COMMIT, [])
+    undo = session.info.pop(AFTER_ROLLBACK, [])
+    if not committed:
+        # Newest first, so each callback sees the state it saved
+        for callback in reversed(undo):
+            try:
+                callback()
+            except Exception:
+                logger.exception("After-rollback callback %r failed", callback)
+        return
+    if namespaces:
+        await response_cache.invalidate(*sorted(namespaces))
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception:
+            logger.exception("After-commit callback %r failed", callback)
+
+
+# Singleton
+response_cache = ResponseCache(
+    url=settings.REDIS_URL,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    enabled=settings.CACHE_ENABLED,
+)
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
+from app.core.cache import flush_stale
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -32,9 +33,10 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             await session.commit()
         except Exception:
             await session.rollback()
+            await flush_stale(session, committed=False)
             raise
-        finally:
-            await session.close()
+        # Committed: a failing callback must not turn this into a 500
+        await flush_stale(session)
 
 
 async def init_db() -> None:
@@ -46,6 +48,12 @@ async def init_db() -> None:
     import app.models.project  # noqa: F401
     import app.models.metric  # noqa: F401
     import app.models.alert  # noqa: F401
+    import app.models.notification  # noqa: F401
 
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+
+    if settings.TIMESCALE_ENABLED:
+        from app.core.timescale import setup_timescale
+
+        await setup_timescale(engine)
@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row of a page, serialized to an
+opaque URL-safe token. The next page filters on `(key columns) < cursor`
+(or `>` for ascending order) instead of OFFSET, so any page costs an index
+seek regardless of how deep it is. A full page always carries a cursor;
+the page after the last full one may come back empty.
+"""
+
+import base64
+import binascii
+import json
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, types: Sequence[type]) -> tuple:
+    """Decode a cursor whose values have `types`; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Malformed cursor")
+
+    decoded = []
+    for value, kind in zip(values, types):
+        if kind is datetime and isinstance(value, str):
+            decoded.append(datetime.fromisoformat(value))
+        elif kind is int and isinstance(value, int) and not isinstance(value, bool):
+            decoded.append(value)
+        else:
+            raise ValueError("Malformed cursor")
+    return tuple(decoded)
+
+
+def cursor_param(*types: type) -> Callable:
+    """Query dependency decoding `?cursor=` into a key tuple (400 if invalid)."""
+
+    async def dependency(
+        cursor: str | None = Query(default=None, description="`next_cursor` of the previous page"),
+    ) -> tuple | None:
+        if cursor is None:
+            return None
+        try:
+            return decode_cursor(cursor, types)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return dependency
+
+
+def after(columns: Sequence, key: tuple, descending: bool = False):
+    """Row-comparison filter selecting rows past `key` in sort order."""
+    row = tuple_(*columns)
+    return row < tuple_(*key) if descending else row > tuple_(*key)
+
+
+def next_cursor(items: Sequence, limit: int, key: Callable[[Any], tuple]) -> str | None:
+    """Cursor for the page after `items`, or None when the page is short."""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(*key(items[-1]))
@@ -0,0 +1,101 @@
+"""Role/permission matrix, compiled to integer bitmasks at import.
+
+Each permission gets one bit; each role's permissions become a single
+int, so a check is `mask & bit`. Access tokens carry the role's mask
+together with PERMISSIONS_VERSION, a fingerprint of the bit layout, so
+masks minted before a matrix change are never trusted.
+"""
+
+import hashlib
+from enum import Enum
+
+
+class Role(str, Enum):
+    MINISTER = "minister"
+    CEO = "ceo"
+    MANAGER = "manager"
+    OPERATOR = "operator"
+    ANALYST = "analyst"
+    PUBLIC = "public"
+
+
+# Permission matrix: role -> allowed actions
+PERMISSIONS: dict[Role, set[str]] = {
+    Role.MINISTER: {
+        "view:national_dashboard",
+        "view:kpis",
+        "view:alerts",
+        "view:reports",
+        "view:map",
+        "export:reports",
+        "manage:users",
+    },
+    Role.CEO: {
+        "view:regional_dashboard",
+        "view:kpis",
+        "view:alerts",
+        "view:reports",
+        "view:map",
+        "view:metrics",
+        "export:reports",
+        "manage:projects",
+        "manage:operators",
+    },
+    Role.MANAGER: {
+        "view:regional_dashboard",
+        "view:metrics",
+        "view:alerts",
+        "view:map",
+        "manage:projects",
+        "export:reports",
+    },
+    Role.OPERATOR: {
+        "view:site_dashboard",
+        "view:metrics",
+        "view:alerts",
+        "create:metrics",
+        "create:readings",
+        "upload:data",
+    },
+    Role.ANALYST: {
+        "view:regional_dashboard",
+        "view:metrics",
+        "view:kpis",
+        "view:reports",
+        "view:map",
+        "export:reports",
+    },
+    Role.PUBLIC: {
+        "view:public_dashboard",
+        "view:map",
+    },
+}
+
+
+PERMISSION_BITS: dict[str, int] = {
+    permission: 1 << i
+    for i, permission in enumerate(sorted(set().union(*PERMISSIONS.values())))
+}
+
+# Keyed by the plain role string stored on users, so checks need no enum
+ROLE_MASKS: dict[str, int] = {
+    role.value: sum(PERMISSION_BITS[p] for p in permissions)
+    for role, permissions in PERMISSIONS.items()
+}
+
+PERMISSIONS_VERSION: str = hashlib.sha1(
+    repr(sorted(PERMISSION_BITS.items()) + sorted(ROLE_MASKS.items())).encode()
+).hexdigest()[:8]
+
+
+def permission_bit(permission: str) -> int:
+    """Bit for `permission`; raises ValueError for unknown permissions."""
+    try:
+        return PERMISSION_BITS[permission]
+    except KeyError:
+        raise ValueError(f"Unknown permission: {permission!r}") from None
+
+
+def permission_claims(role: str) -> dict:
+    """JWT claims embedding the role's compiled permission mask."""
+    return {"perm": ROLE_MASKS.get(role, 0), "pv": PERMISSIONS_VERSION}
@@ -0,0 +1,268 @@
+"""Publish/subscribe fan-out for the live server-sent event streams.
+
+Writers publish once per committed change; each subscriber reads from its
+own bounded queue, so one ingest event reaches every open dashboard
+without a query per viewer. A message is rendered to its SSE frame once
+and the same string is handed to every subscriber.
+
+Backpressure is per connection: when a subscriber falls behind, its
+oldest queued messages are dropped (and counted) so a slow screen never
+blocks the publisher or other viewers.
+
+With the "redis" backend, messages travel through Redis pub/sub and one
+listener task per process fans them out locally, so viewers on any
+worker see writes from every worker. If Redis is unavailable, messages
+still reach this process's subscribers.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable, Iterable
+from typing import NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ALERTS_CHANNEL = "alerts"
+
+
+def metrics_channel(project_id: int) -> str:
+    return f"metrics:{project_id}"
+
+
+class Message(NamedTuple):
+    event: str
+    data: dict
+    frame: str  # rendered SSE frame, shared by every subscriber
+
+
+def make_message(event: str, data) -> Message:
+    data = jsonable_encoder(data)
+    payload = json.dumps(data, separators=(",", ":"))
+    return Message(event, data, f"event: {event}\ndata: {payload}\n\n")
+
+
+class Subscription:
+    """One connection's bounded queue on a channel."""
+
+    def __init__(
+        self,
+        broker: "Broker",
+        channel: str,
+        max_queue: int,
+        accept: Callable[[dict], bool] | None = None,
+    ):
+        self.broker = broker
+        self.channel = channel
+        self.accept = accept
+        self.queue: asyncio.Queue[Message] = asyncio.Queue(max_queue)
+        self.dropped = 0
+
+    def deliver(self, message: Message) -> bool:
+        if self.accept is not None and not self.accept(message.data):
+            return False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+        return True
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Channel -> subscribers registry with optional Redis relay."""
+
+    def __init__(
+        self,
+        backend: str = "memory",
+        redis_url: str | None = None,
+        queue_size: int = 256,
+        prefix: str = "live",
+        retry_seconds: float = 1.0,
+    ):
+        self.backend = backend
+        self.redis_url = redis_url
+        self.queue_size = queue_size
+        self.prefix = prefix
+        self.retry_seconds = retry_seconds
+        self.published = 0
+        self.delivered = 0
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._client = None
+        self._listener: asyncio.Task | None = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def use_client(self, client) -> None:
+        """Swap in a Redis client (e.g. fakeredis in tests)."""
+        self._client = client
+
+    @property
+    def relaying(self) -> bool:
+        return self._listener is not None and not self._listener.done()
+
+    def subscribe(
+        self, channel: str, accept: Callable[[dict], bool] | None = None
+    ) -> Subscription:
+        """Register a subscriber; `accept` filters messages by their data."""
+        subscription = Subscription(self, channel, self.queue_size, accept)
+        self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def deliver(self, channel: str, message: Message) -> None:
+        """Hand `message` to this process's subscribers on `channel`."""
+        for subscription in list(self._subscribers.get(channel, ())):
+            self.delivered += subscription.deliver(message)
+
+    async def publish(self, channel: str, event: str, data) -> None:
+        if not self.relaying and channel not in self._subscribers:
+            return
+        message = make_message(event, data)
+        self.published += 1
+        if self.relaying:
+            try:
+                await self.client.publish(
+                    f"{self.prefix}:{channel}",
+                    json.dumps({"event": event, "data": message.data}),
+                )
+                return
+            except Exception:
+                logger.warning("Pub/sub publish failed; delivering locally", exc_info=True)
+        self.deliver(channel, message)
+
+    async def publish_many(self, channel: str, event: str, items: Iterable) -> None:
+        for data in items:
+            await self.publish(channel, event, data)
+
+    def start(self) -> None:
+        """Relay messages through Redis (no-op for the memory backend)."""
+        if self.backend == "redis" and not self.relaying:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _listen(self) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        channel_prefix = f"{self.prefix}:"
+        try:
+            await pubsub.psubscribe(f"{channel_prefix}*")
+            while True:
+                try:
+                    raw = await pubsub.get_message(timeout=1.0)
+                except Exception:
+                    logger.warning("Pub/sub listener failed; retrying", exc_info=True)
+                    await asyncio.sleep(self.retry_seconds)
+                    continue
+                if raw is None:
+                    continue
+                channel = raw["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                channel = channel.removeprefix(channel_prefix)
+                if channel not in self._subscribers:
+                    continue
+                body = json.loads(raw["data"])
+                self.deliver(channel, make_message(body["event"], body["data"]))
+        finally:
+            await pubsub.aclose()
+
+    def stats(self) -> dict:
+        subscriptions = [s for subs in self._subscribers.values() for s in subs]
+        return {
+            "backend": self.backend,
+            "relaying": self.relaying,
+            "channels": len(self._subscribers),
+            "subscribers": len(subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": sum(s.dropped for s in subscriptions),
+        }
+
+
+async def sse_events(
+    subscription: Subscription,
+    snapshot: Iterable[Message] = (),
+    heartbeat_seconds: float = 15.0,
+    expires_at: float | None = None,
+) -> AsyncIterator[str]:
+    """SSE frames: the snapshot, then live messages until `expires_at`.
+
+    Idle periods send a comment line so proxies keep the connection open.
+    A `lagged` event tells the client how many messages it missed, so it
+    can refetch. The subscription is closed when the stream ends.
+    """
+    try:
+        yield "retry: 3000\n\n"
+        for message in snapshot:
+            yield message.frame
+        reported = 0
+        while expires_at is None or time.time() < expires_at:
+            timeout = heartbeat_seconds
+            if expires_at is not None:
+                timeout = min(timeout, max(expires_at - time.time(), 0))
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.dropped > reported:
+                yield make_message("lagged", {"dropped": subscription.dropped - reported}).frame
+                reported = subscription.dropped
+            yield message.frame
+    finally:
+        subscription.close()
+
+
+def sse_response(
+    subscription: Subscription,
+    snapshot: Iterable[Message] = (),
+    expires_at: float | None = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        sse_events(
+            subscription, snapshot, settings.STREAM_HEARTBEAT_SECONDS, expires_at
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Singleton
+broker = Broker(
+    backend=settings.PUBSUB_BACKEND,
+    redis_url=settings.REDIS_URL,
+    queue_size=settings.STREAM_QUEUE_SIZE,
+)
@@ -1,11 +1,19 @@
 """Role-Based Access Control (RBAC) middleware and dependencies."""
 
-from enum import Enum
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from app.core.auth_cache import user_cache
+from app.core.permissions import (  # noqa: F401  (re-exported)
+    PERMISSION_BITS,
+    PERMISSIONS,
+    PERMISSIONS_VERSION,
+    ROLE_MASKS,
+    Role,
+    permission_bit,
+)
 from app.core.security import decode_token
 from app.core.database import get_session
 from app.models.user import User
@@ -16,72 +24,9 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-class Role(str, Enum):
-    MINISTER = "minister"
-    CEO = "ceo"
-    MANAGER = "manager"
-    OPERATOR = "operator"
-    ANALYST = "analyst"
-    PUBLIC = "public"
-
-
-# Permission matrix: role -> allowed actions
-PERMISSIONS: dict[Role, set[str]] = {
-    Role.MINISTER: {
-        "view:national_dashboard",
-        "view:kpis",
-        "view:alerts",
-        "view:reports",
-        "view:map",
-        "export:reports",
-        "manage:users",
-    },
-    Role.CEO: {
-        "view:regional_dashboard",
-        "view:kpis",
-        "view:alerts",
-        "view:reports",
-        "view:map",
-        "view:metrics",
-        "export:reports",
-        "manage:projects",
-        "manage:operators",
-    },
-    Role.MANAGER: {
-        "view:regional_dashboard",
-        "view:metrics",
-        "view:alerts",
-        "view:map",
-        "manage:projects",
-        "export:reports",
-    },
-    Role.OPERATOR: {
-        "view:site_dashboard",
-        "view:metrics",
-        "view:alerts",
-        "create:metrics",
-        "create:readings",
-        "upload:data",
-    },
-    Role.ANALYST: {
-        "view:regional_dashboard",
-        "view:metrics",
-        "view:kpis",
-        "view:reports",
-        "view:map",
-        "export:reports",
-    },
-    Role.PUBLIC: {
-        "view:public_dashboard",
-        "view:map",
-    },
-}
-
-
-async def get_current_user(
+async def get_token_payload(
     token: Annotated[str, Depends(oauth2_scheme)],
-    session: Annotated[AsyncSession, Depends(get_session)],
-) -> User:
+) -> dict:
     payload = decode_token(token)
     if payload is None:
         raise HTTPException(
@@ -89,7 +34,14 @@ async def get_current_user(
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
+
 
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    payload: Annotated[dict, Depends(get_token_payload)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> User:
     user_id: str | None = payload.get("sub")
     if user_id is None:
         raise HTTPException(
@@ -97,8 +49,13 @@ async def get_current_user(
             detail="Token missing subject",
         )
 
-    result = await session.exec(select(User).where(User.id == int(user_id)))
-    user = result.first()
+    user = await user_cache.get(int(user_id), token)
+    if user is None:
+        result = await session.exec(select(User).where(User.id == int(user_id)))
+        user = result.first()
+        if user is not None and user.is_active:
+            await user_cache.put(user.id, token, user)
+
     if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -117,28 +74,42 @@ async def get_current_active_user(
 
 def require_role(*roles: Role):
     """Dependency factory: require user to have one of the specified roles."""
+    allowed = frozenset(role.value for role in roles)
+    required = [role.value for role in roles]
 
     async def role_checker(
         current_user: Annotated[User, Depends(get_current_user)],
     ) -> User:
-        if Role(current_user.role) not in roles:
+        if current_user.role not in allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Role '{current_user.role}' not authorized. Required: {[r.value for r in roles]}",
+                detail=f"Role '{current_user.role}' not authorized. Required: {required}",
             )
         return current_user
 
     return role_checker
 
 
+def token_permission_mask(payload: dict, user: User) -> int:
+    """Permission mask from the token claims, or from the user's current role.
+
+    The embedded mask is only used while the token's role matches the
+    user's role and it was compiled from the current permission matrix.
+    """
+    if payload.get("role") == user.role and payload.get("pv") == PERMISSIONS_VERSION:
+        return payload.get("perm", 0)
+    return ROLE_MASKS.get(user.role, 0)
+
+
 def require_permission(permission: str):
     """Dependency factory: require user's role to have a specific permission."""
+    bit = permission_bit(permission)
 
     async def permission_checker(
         current_user: Annotated[User, Depends(get_current_user)],
+        payload: Annotated[dict, Depends(get_token_payload)],
     ) -> User:
-        user_role = Role(current_user.role)
-        if permission not in PERMISSIONS.get(user_role, set()):
+        if not token_permission_mask(payload, current_user) & bit:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission '{permission}' not granted to role '{current_user.role}'",
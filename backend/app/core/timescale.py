@@ -0,0 +1,342 @@
+"""TimescaleDB setup for the metrics table.
+
+Converts `metrics` into a hypertable, enables native compression,
+registers retention policies and creates hourly/daily continuous
+aggregates. Every step is idempotent and runs on startup when
+TIMESCALE_ENABLED is set. Without the extension the app keeps working
+on plain Postgres and aggregations read the raw table.
+
+Refresh policies only revisit the last `start_offset` of each aggregate,
+so ingest hands the buckets of older (backfilled) readings to
+`aggregate_refresher`. It coalesces them and refreshes them in the
+background every TIMESCALE_BACKFILL_REFRESH_SECONDS, off the ingest path.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import get_settings
+from app.utils.intervals import parse_interval
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+HYPERTABLE = "metrics"
+TIME_COLUMN = "recorded_at"
+COMPRESS_SEGMENT_BY = "project_id, metric_type"
+
+
+@dataclass(frozen=True)
+class ContinuousAggregate:
+    view: str
+    bucket: timedelta
+    start_offset: timedelta
+    end_offset: timedelta
+    schedule: timedelta
+    retention: str = ""
+
+    @property
+    def horizon(self) -> timedelta | None:
+        """How far back the aggregate keeps data, or None for forever."""
+        return parse_interval(self.retention) if self.retention else None
+
+
+CONTINUOUS_AGGREGATES = (
+    ContinuousAggregate(
+        view="metrics_minutely",
+        bucket=timedelta(minutes=1),
+        start_offset=timedelta(hours=2),
+        end_offset=timedelta(minutes=1),
+        schedule=timedelta(minutes=1),
+        retention=settings.TIMESCALE_MINUTELY_RETENTION,
+    ),
+    ContinuousAggregate(
+        view="metrics_hourly",
+        bucket=timedelta(hours=1),
+        start_offset=timedelta(days=3),
+        end_offset=timedelta(hours=1),
+        schedule=timedelta(minutes=30),
+        retention=settings.TIMESCALE_HOURLY_RETENTION,
+    ),
+    ContinuousAggregate(
+        view="metrics_daily",
+        bucket=timedelta(days=1),
+        start_offset=timedelta(days=7),
+        end_offset=timedelta(days=1),
+        schedule=timedelta(hours=6),
+        retention=settings.TIMESCALE_DAILY_RETENTION,
+    ),
+)
+
+# Aggregates that exist in this database, finest first
+available_aggregates: list[ContinuousAggregate] = []
+
+# (view, start, end)
+Span = tuple[str, datetime, datetime]
+
+
+def coarsest_aggregate() -> ContinuousAggregate | None:
+    """The widest aggregate in this database, the cheapest to total, if any."""
+    return max(available_aggregates, key=lambda a: a.bucket, default=None)
+
+
+async def setup_timescale(engine: AsyncEngine) -> bool:
+    """Create or update the hypertable, policies and aggregates.
+
+    Returns False (leaving the schema untouched) when the extension is
+    not installed or setup fails.
+    """
+    async with engine.connect() as conn:
+        installed = (await conn.execute(text(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'"
+        ))).first()
+    if installed is None:
+        logger.warning("TimescaleDB extension not available; metrics stay a plain table")
+        return False
+
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+            await _ensure_time_in_primary_key(conn)
+            await _create_hypertable(conn)
+            await _enable_compression(conn)
+            await _set_retention(conn, HYPERTABLE, settings.TIMESCALE_RAW_RETENTION)
+            for aggregate in CONTINUOUS_AGGREGATES:
+                await _create_continuous_aggregate(conn, aggregate)
+    except DBAPIError:
+        logger.exception("TimescaleDB setup failed; aggregations will use raw metrics")
+        return False
+
+    available_aggregates[:] = CONTINUOUS_AGGREGATES
+    logger.info("TimescaleDB hypertable and continuous aggregates ready")
+    return True
+
+
+async def detect_aggregates(engine: AsyncEngine) -> bool:
+    """Adopt aggregates that `setup_timescale` created in another process."""
+    try:
+        async with engine.connect() as conn:
+            if (await conn.execute(text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'"
+            ))).first() is None:
+                return False
+            views = set((await conn.execute(text(
+                "SELECT view_name FROM timescaledb_information.continuous_aggregates"
+            ))).scalars())
+    except (DBAPIError, OSError):
+        logger.exception("Looking up continuous aggregates failed")
+        return False
+    available_aggregates[:] = [a for a in CONTINUOUS_AGGREGATES if a.view in views]
+    return bool(available_aggregates)
+
+
+async def refresh_continuous_aggregates(engine: AsyncEngine, spans: Sequence[Span]) -> list[Span]:
+    """Materialize `spans`; returns those that failed, after logging why.
+
+    Refreshes cannot run inside a transaction, so this uses its own
+    autocommit connection and must be called after the writes commit.
+    """
+    failed: list[Span] = []
+    remaining = list(spans)
+    try:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            while remaining:
+                view, start, end = remaining[0]
+                try:
+                    await conn.execute(
+                        text(f"CALL refresh_continuous_aggregate('{view}', :start, :end)"),
+                        {"start": start, "end": end},
+                    )
+                except DBAPIError:
+                    logger.exception("Refreshing %s from %s to %s failed", view, start, end)
+                    failed.append(remaining[0])
+                remaining.pop(0)
+    except (DBAPIError, OSError):
+        logger.exception("Lost the connection while refreshing continuous aggregates")
+    return failed + remaining
+
+
+class AggregateRefresher:
+    """Coalesces backfilled spans and refreshes them in the background."""
+
+    def __init__(self, interval_seconds: float = 30.0):
+        self.interval_seconds = interval_seconds
+        self.refreshed = 0
+        self._spans: dict[str, list[tuple[datetime, datetime]]] = defaultdict(list)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> list[Span]:
+        """Queued spans, overlapping or touching ones merged per view."""
+        merged = []
+        for view, ranges in sorted(self._spans.items()):
+            ranges = sorted(ranges)
+            start, end = ranges[0]
+            for next_start, next_end in ranges[1:]:
+                if next_start > end:
+                    merged.append((view, start, end))
+                    start = next_start
+                end = max(end, next_end)
+            merged.append((view, start, end))
+        return merged
+
+    async def add(self, spans: Sequence[Span]) -> None:
+        for view, start, end in spans:
+            self._spans[view].append((start, end))
+
+    async def refresh_pending(self, engine: AsyncEngine) -> int:
+        """Refresh everything queued; failed spans are queued again."""
+        spans = self.pending
+        self._spans.clear()
+        if not spans:
+            return 0
+        failed = await refresh_continuous_aggregates(engine, spans)
+        await self.add(failed)
+        self.refreshed += len(spans) - len(failed)
+        return len(spans) - len(failed)
+
+    # Background task
+
+    async def run(self, engine: AsyncEngine) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.refresh_pending(engine)
+            except Exception:
+                logger.exception("Continuous aggregate refresh failed")
+
+    def start(self, engine: AsyncEngine) -> None:
+        self._task = asyncio.create_task(self.run(engine))
+
+    async def stop(self, engine: AsyncEngine) -> None:
+        """Stop the task and refresh whatever is still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.refresh_pending(engine)
+
+
+async def _ensure_time_in_primary_key(conn: AsyncConnection) -> None:
+    """Widen a legacy `PRIMARY KEY (id)` to include the time column."""
+    rows = (await conn.execute(text("""
+        SELECT c.conname, a.attname
+        FROM pg_constraint c
+        JOIN pg_class t ON t.oid = c.conrelid
+        JOIN pg_attribute a
+          ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+        WHERE t.relname = :table AND c.contype = 'p'
+    """), {"table": HYPERTABLE})).all()
+    if not rows or TIME_COLUMN in {row.attname for row in rows}:
+        return
+    await conn.execute(text(
+        f'ALTER TABLE {HYPERTABLE} DROP CONSTRAINT "{rows[0].conname}", '
+        f"ADD PRIMARY KEY (id, {TIME_COLUMN})"
+    ))
+
+
+async def _create_hypertable(conn: AsyncConnection) -> None:
+    chunk = parse_interval(settings.TIMESCALE_CHUNK_INTERVAL)
+    await conn.execute(text(f"""
+        SELECT create_hypertable(
+            '{HYPERTABLE}', '{TIME_COLUMN}',
+            chunk_time_interval => CAST(:chunk AS interval),
+            create_default_indexes => FALSE,
+            if_not_exists => TRUE,
+            migrate_data => TRUE
+        )
+    """), {"chunk": chunk})
+    # Applies to new chunks when the setting changes
+    await conn.execute(
+        text(f"SELECT set_chunk_time_interval('{HYPERTABLE}', CAST(:chunk AS interval))"),
+        {"chunk": chunk},
+    )
+
+
+async def _enable_compression(conn: AsyncConnection) -> None:
+    enabled = (await conn.execute(text("""
+        SELECT compression_enabled FROM timescaledb_information.hypertables
+        WHERE hypertable_name = :table
+    """), {"table": HYPERTABLE})).scalar()
+    if not enabled:
+        await conn.execute(text(f"""
+            ALTER TABLE {HYPERTABLE} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = '{COMPRESS_SEGMENT_BY}',
+                timescaledb.compress_orderby = '{TIME_COLUMN} DESC'
+            )
+        """))
+    await conn.execute(
+        text(f"SELECT remove_compression_policy('{HYPERTABLE}', if_exists => TRUE)")
+    )
+    await conn.execute(
+        text(f"SELECT add_compression_policy('{HYPERTABLE}', CAST(:after AS interval))"),
+        {"after": parse_interval(settings.TIMESCALE_COMPRESS_AFTER)},
+    )
+
+
+async def _set_retention(conn: AsyncConnection, relation: str, retention: str) -> None:
+    await conn.execute(
+        text(f"SELECT remove_retention_policy('{relation}', if_exists => TRUE)")
+    )
+    if retention:
+        await conn.execute(
+            text(f"SELECT add_retention_policy('{relation}', CAST(:keep AS interval))"),
+            {"keep": parse_interval(retention)},
+        )
+
+
+async def _create_continuous_aggregate(
+    conn: AsyncConnection, aggregate: ContinuousAggregate
+) -> None:
+    # Sum and count (not avg) so buckets can be re-aggregated to wider ones.
+    # Real-time mode unions in raw rows newer than the last refresh.
+    seconds = int(aggregate.bucket.total_seconds())
+    await conn.execute(text(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {aggregate.view}
+        WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+        SELECT
+            project_id,
+            metric_type,
+            time_bucket(INTERVAL '{seconds} seconds', {TIME_COLUMN}) AS bucket,
+            sum(value) AS sum_value,
+            min(value) AS min_value,
+            max(value) AS max_value,
+            count(*) AS count
+        FROM {HYPERTABLE}
+        GROUP BY project_id, metric_type, bucket
+        WITH NO DATA
+    """))
+    await conn.execute(text(
+        f"SELECT remove_continuous_aggregate_policy('{aggregate.view}', if_exists => TRUE)"
+    ))
+    await conn.execute(text(f"""
+        SELECT add_continuous_aggregate_policy(
+            '{aggregate.view}',
+            start_offset => CAST(:start_offset AS interval),
+            end_offset => CAST(:end_offset AS interval),
+            schedule_interval => CAST(:schedule AS interval)
+        )
+    """), {
+        "start_offset": aggregate.start_offset,
+        "end_offset": aggregate.end_offset,
+        "schedule": aggregate.schedule,
+    })
+    await _set_retention(conn, aggregate.view, aggregate.retention)
+
+
+# Singleton
+aggregate_refresher = AggregateRefresher(settings.TIMESCALE_BACKFILL_REFRESH_SECONDS)
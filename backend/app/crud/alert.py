@@ -2,35 +2,144 @@
 
 from datetime import datetime, timezone
 
+from sqlalchemy import DateTime, Float, Integer, column, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlmodel import select, func
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.alert import Alert, AlertRule
+from app.core.cache import after_commit, mark_stale
+from app.core.pagination import after
+from app.core.pubsub import ALERTS_CHANNEL, broker
+from app.crud.base import column_values, insert_returning, update_returning
+from app.models.alert import OPEN_RULE_ALERT, Alert, AlertRule, AlertStatus
+
+# Sort key for paging through alerts
+ALERT_PAGE_KEY = (Alert.created_at, Alert.id)
+
+
+def _changed(session: AsyncSession, alert: Alert) -> None:
+    """Invalidate cached alert lists and push `alert` to the live stream."""
+    mark_stale(session, "alerts")
+    data = alert.model_dump()
+    after_commit(session, lambda: broker.publish(ALERTS_CHANNEL, "alert", data))
 
 
 async def create_alert(session: AsyncSession, data: dict) -> Alert:
-    alert = Alert(**data)
-    session.add(alert)
-    await session.flush()
-    await session.refresh(alert)
+    alert = await insert_returning(session, Alert(**data))
+    _changed(session, alert)
     return alert
 
 
+async def upsert_rule_alerts(session: AsyncSession, data: list[dict]) -> list[Alert]:
+    """Open rule alerts in one statement; returns the rows written.
+
+    A series that already has an open alert (opened by another worker,
+    say) gets that alert's `occurrences` bumped instead of a second row.
+    """
+    if not data:
+        return []
+    stmt = pg_insert(Alert).values([column_values(Alert(**d)) for d in data])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Alert.rule_id, Alert.project_id, func.coalesce(Alert.sensor_id, "")],
+        index_where=text(OPEN_RULE_ALERT),
+        set_={
+            "occurrences": Alert.occurrences + stmt.excluded.occurrences,
+            "metric_value": stmt.excluded.metric_value,
+            "last_seen_at": stmt.excluded.last_seen_at,
+        },
+    )
+    result = await session.exec(
+        stmt.returning(Alert).execution_options(populate_existing=True)  # type: ignore[call-overload]
+    )
+    alerts = list(result.scalars().all())
+    for alert in alerts:
+        _changed(session, alert)
+    return alerts
+
+
+async def bump_alerts(
+    session: AsyncSession, bumps: list[tuple[int, int, float, datetime]]
+) -> list[Alert]:
+    """Fold (alert id, firings, latest value, seen at) into open alerts.
+
+    One UPDATE ... FROM (VALUES ...) for the whole list. Alerts resolved
+    in the meantime are left alone and missing from the result.
+    """
+    if not bumps:
+        return []
+    rows = values(
+        column("id", Integer), column("n", Integer),
+        column("value", Float), column("seen_at", DateTime(timezone=True)),
+        name="bumps",
+    ).data(bumps)
+    result = await session.exec(
+        update(Alert)
+        .where(Alert.id == rows.c.id, Alert.status != AlertStatus.RESOLVED.value)
+        .values(
+            occurrences=Alert.occurrences + rows.c.n,
+            metric_value=rows.c.value,
+            last_seen_at=rows.c.seen_at,
+        )
+        .returning(Alert)
+        .execution_options(synchronize_session=False, populate_existing=True)  # type: ignore[call-overload]
+    )
+    alerts = list(result.scalars().all())
+    for alert in alerts:
+        _changed(session, alert)
+    return alerts
+
+
+async def set_alerts_status(
+    session: AsyncSession, alert_ids: list[int], status: AlertStatus
+) -> list[Alert]:
+    """Move unresolved alerts to `status` with one UPDATE."""
+    if not alert_ids:
+        return []
+    changes = {"status": status.value}
+    if status == AlertStatus.RESOLVED:
+        changes["resolved_at"] = datetime.now(timezone.utc)
+    result = await session.exec(
+        update(Alert)
+        .where(Alert.id.in_(alert_ids), Alert.status != AlertStatus.RESOLVED.value)
+        .values(**changes)
+        .returning(Alert)
+        .execution_options(synchronize_session=False, populate_existing=True)  # type: ignore[call-overload]
+    )
+    alerts = list(result.scalars().all())
+    for alert in alerts:
+        _changed(session, alert)
+    return alerts
+
+
+async def get_open_rule_alerts(session: AsyncSession) -> list[Alert]:
+    """Unresolved alerts raised by rules, to restore per-series state."""
+    result = await session.exec(
+        select(Alert).where(
+            Alert.rule_id.is_not(None), Alert.status != AlertStatus.RESOLVED.value
+        )
+    )
+    return list(result.all())
+
+
 async def get_active_alerts(
     session: AsyncSession,
     project_id: int | None = None,
     tenant_id: int | None = None,
     severity: str | None = None,
     limit: int = 100,
+    cursor: tuple[datetime, int] | None = None,
 ) -> list[Alert]:
+    """Newest first; `cursor` is the (created_at, id) of the previous page's last row."""
     query = select(Alert).where(Alert.status == "active")
 
     if project_id:
         query = query.where(Alert.project_id == project_id)
     if severity:
         query = query.where(Alert.severity == severity)
+    if cursor is not None:
+        query = query.where(after(ALERT_PAGE_KEY, cursor, descending=True))
 
-    query = query.order_by(Alert.created_at.desc()).limit(limit)  # type: ignore
+    query = query.order_by(*(c.desc() for c in ALERT_PAGE_KEY)).limit(limit)
     result = await session.exec(query)
     return list(result.all())
 
@@ -38,30 +147,47 @@ async def get_active_alerts(
 async def acknowledge_alert(
     session: AsyncSession, alert_id: int, user_id: int
 ) -> Alert | None:
-    result = await session.exec(select(Alert).where(Alert.id == alert_id))
-    alert = result.first()
+    """Acknowledge an active alert; None if it is missing or not active."""
+    alert = await update_returning(
+        session,
+        Alert,
+        Alert.id == alert_id,
+        Alert.status == AlertStatus.ACTIVE.value,
+        status=AlertStatus.ACKNOWLEDGED.value,
+        acknowledged_by=user_id,
+        acknowledged_at=datetime.now(timezone.utc),
+    )
     if alert:
-        alert.status = "acknowledged"
-        alert.acknowledged_by = user_id
-        alert.acknowledged_at = datetime.now(timezone.utc)
-        session.add(alert)
-        await session.flush()
-        await session.refresh(alert)
+        _changed(session, alert)
     return alert
 
 
 async def resolve_alert(session: AsyncSession, alert_id: int) -> Alert | None:
-    result = await session.exec(select(Alert).where(Alert.id == alert_id))
-    alert = result.first()
+    """Resolve an open alert; None if it is missing or already resolved."""
+    alert = await update_returning(
+        session,
+        Alert,
+        Alert.id == alert_id,
+        Alert.status != AlertStatus.RESOLVED.value,
+        status=AlertStatus.RESOLVED.value,
+        resolved_at=datetime.now(timezone.utc),
+    )
     if alert:
-        alert.status = "resolved"
-        alert.resolved_at = datetime.now(timezone.utc)
-        session.add(alert)
-        await session.flush()
-        await session.refresh(alert)
+        _changed(session, alert)
     return alert
 
 
+async def get_alert(session: AsyncSession, alert_id: int) -> Alert | None:
+    return await session.get(Alert, alert_id)
+
+
+async def get_alerts(session: AsyncSession, alert_ids: set[int]) -> list[Alert]:
+    if not alert_ids:
+        return []
+    result = await session.exec(select(Alert).where(Alert.id.in_(alert_ids)))
+    return list(result.all())
+
+
 async def count_active_alerts(
     session: AsyncSession,
     project_id: int | None = None,
@@ -83,8 +209,4 @@ async def get_alert_rules(
 
 
 async def create_alert_rule(session: AsyncSession, data: dict) -> AlertRule:
-    rule = AlertRule(**data)
-    session.add(rule)
-    await session.flush()
-    await session.refresh(rule)
-    return rule
+    return await insert_returning(session, AlertRule(**data))
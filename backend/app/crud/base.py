@@ -0,0 +1,64 @@
+"""Single-statement write helpers shared by the CRUD modules.
+
+`insert_returning` and `update_returning` send one INSERT/UPDATE ...
+RETURNING and give back the ORM instance loaded from the row the server
+wrote, instead of add + flush + refresh (two extra round trips).
+"""
+
+from typing import Any, TypeVar
+
+from sqlalchemy import insert, update
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+ModelT = TypeVar("ModelT", bound=SQLModel)
+
+
+def column_values(obj: SQLModel) -> dict[str, Any]:
+    """Column values of a transient instance; unset keys are left to the database."""
+    values = {}
+    for column in obj.__table__.columns:  # type: ignore[attr-defined]
+        value = getattr(obj, column.key)
+        if value is None and column.primary_key:
+            continue
+        values[column.key] = value
+    return values
+
+
+async def insert_returning(session: AsyncSession, obj: ModelT) -> ModelT:
+    """INSERT `obj` and return the persistent instance built from RETURNING."""
+    model = type(obj)
+    # Values go in as parameters so the compiled statement is cached per model
+    result = await session.exec(
+        insert(model).returning(model),  # type: ignore[call-overload]
+        params=column_values(obj),
+    )
+    return result.scalar_one()
+
+
+async def insert_many_returning(
+    session: AsyncSession, objs: list[ModelT]
+) -> list[ModelT]:
+    """INSERT `objs` of one model in a single batched statement, in order."""
+    if not objs:
+        return []
+    model = type(objs[0])
+    result = await session.exec(
+        insert(model).returning(model, sort_by_parameter_order=True),  # type: ignore[call-overload]
+        params=[column_values(obj) for obj in objs],
+    )
+    return list(result.scalars().all())
+
+
+async def update_returning(
+    session: AsyncSession, model: type[ModelT], *where, **values
+) -> ModelT | None:
+    """UPDATE the rows matching `where`; return the first updated row, if any.
+
+    Conditions on current column values make the update conditional, so
+    check-then-write transitions need no prior SELECT.
+    """
+    result = await session.exec(
+        update(model).where(*where).values(**values).returning(model)  # type: ignore[call-overload]
+    )
+    return result.scalars().first()
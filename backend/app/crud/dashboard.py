@@ -0,0 +1,219 @@
+"""Dashboard KPI queries.
+
+Metric averages and quality compliance are read from the `metric_totals`
+running totals (see app.crud.metric.update_metric_totals), so the cost of
+a KPI request depends on the number of projects, not on metric volume.
+With TimescaleDB, reading averages come from the coarsest continuous
+aggregate instead: Timescale maintains it off the ingest path, and it
+keeps its own retention (forever for `metrics_daily` by default), so the
+averages do not drift when raw chunks are dropped.
+"""
+
+from sqlalchemy import (
+    BigInteger, DateTime, Float, Integer, String, column, table, true, union_all,
+)
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.timescale import coarsest_aggregate
+from app.models.alert import Alert
+from app.models.metric import QUALITY_COMPLIANCE, MetricTotal
+from app.models.project import WaterProject
+
+# NRW placeholder (would need production/billing data)
+NRW_PERCENTAGE = 35.0  # Tanzania average ~35%
+
+READING_KPI_TYPES = ["flow", "pressure"]
+KPI_METRIC_TYPES = [*READING_KPI_TYPES, QUALITY_COMPLIANCE]
+
+
+def _kpi_totals():
+    """(project_id, metric_type, value_sum, value_count, updated_at) of every KPI series."""
+    stored = select(
+        MetricTotal.project_id,
+        MetricTotal.metric_type,
+        MetricTotal.value_sum,
+        MetricTotal.value_count,
+        MetricTotal.updated_at,
+    )
+    aggregate = coarsest_aggregate()
+    if aggregate is None:
+        return stored.where(
+            MetricTotal.metric_type.in_(KPI_METRIC_TYPES)  # type: ignore
+        ).subquery("totals")
+
+    view = table(
+        aggregate.view,
+        column("project_id", Integer),
+        column("metric_type", String),
+        column("bucket", DateTime(timezone=True)),
+        column("sum_value", Float),
+        column("count", BigInteger),
+    )
+    readings = (
+        select(
+            view.c.project_id,
+            view.c.metric_type,
+            func.sum(view.c.sum_value).label("value_sum"),
+            func.sum(view.c.count).label("value_count"),
+            func.least(func.max(view.c.bucket) + aggregate.bucket, func.now()).label(
+                "updated_at"
+            ),
+        )
+        .where(view.c.metric_type.in_(READING_KPI_TYPES))
+        .group_by(view.c.project_id, view.c.metric_type)
+    )
+    compliance = stored.where(MetricTotal.metric_type == QUALITY_COMPLIANCE)
+    return union_all(readings, compliance).subquery("totals")
+
+
+def _total(totals, metric_type: str, column):
+    return func.sum(column).filter(totals.c.metric_type == metric_type)
+
+
+def _average(totals, metric_type: str):
+    return _total(totals, metric_type, totals.c.value_sum) / func.nullif(
+        _total(totals, metric_type, totals.c.value_count), 0
+    )
+
+
+def _project_totals():
+    """Per-project averages, one row per project with any totals."""
+    totals = _kpi_totals()
+    return (
+        select(
+            totals.c.project_id,
+            _total(totals, "flow", totals.c.value_sum).label("flow_sum"),
+            _total(totals, "flow", totals.c.value_count).label("flow_count"),
+            _total(totals, "pressure", totals.c.value_sum).label("pressure_sum"),
+            _total(totals, "pressure", totals.c.value_count).label("pressure_count"),
+            func.max(totals.c.updated_at).label("updated_at"),
+        )
+        .group_by(totals.c.project_id)
+    )
+
+
+async def get_dashboard_kpis(
+    session: AsyncSession,
+    region: str | None = None,
+    tenant_id: int | None = None,
+) -> dict:
+    """Compute all dashboard KPIs in a single round trip.
+
+    Each source is aggregated once in its own CTE using conditional
+    aggregates (FILTER (WHERE ...)); the single-row CTEs are then joined.
+    Region/tenant filters scope every KPI to the matching projects.
+    """
+    project_filters = []
+    if region:
+        project_filters.append(WaterProject.region == region)
+    if tenant_id:
+        project_filters.append(WaterProject.tenant_id == tenant_id)
+    scoped_ids = select(WaterProject.id).where(*project_filters)
+
+    projects = (
+        select(
+            func.count(WaterProject.id).label("total_projects"),
+            func.count(WaterProject.id)
+            .filter(WaterProject.status == "operational")
+            .label("operational_projects"),
+            func.coalesce(func.sum(WaterProject.population_served), 0).label(
+                "total_population_served"
+            ),
+            func.coalesce(func.sum(WaterProject.connection_count), 0).label(
+                "total_connections"
+            ),
+        )
+        .where(*project_filters)
+        .cte("project_kpis")
+    )
+
+    kpi_totals = _kpi_totals()
+    totals = (
+        select(
+            func.coalesce(_average(kpi_totals, "flow"), 0).label("avg_flow"),
+            func.coalesce(_average(kpi_totals, "pressure"), 0).label("avg_pressure"),
+            _average(kpi_totals, QUALITY_COMPLIANCE).label("compliance"),
+            func.max(kpi_totals.c.updated_at).label("data_as_of"),
+        )
+        .where(kpi_totals.c.project_id.in_(scoped_ids))
+        .cte("metric_kpis")
+    )
+
+    alerts = (
+        select(func.count(Alert.id).label("active_alerts"))
+        .where(Alert.status == "active", Alert.project_id.in_(scoped_ids))  # type: ignore
+        .cte("alert_kpis")
+    )
+
+    query = (
+        select(
+            projects.c.total_projects,
+            projects.c.operational_projects,
+            projects.c.total_population_served,
+            projects.c.total_connections,
+            totals.c.avg_flow,
+            totals.c.avg_pressure,
+            totals.c.compliance,
+            totals.c.data_as_of,
+            alerts.c.active_alerts,
+        )
+        .select_from(projects)
+        .join(totals, true())
+        .join(alerts, true())
+    )
+    row = (await session.exec(query)).one()
+
+    compliance_pct = round(
+        row.compliance * 100 if row.compliance is not None else 100.0, 1
+    )
+
+    return {
+        "total_projects": row.total_projects,
+        "operational_projects": row.operational_projects,
+        "total_population_served": row.total_population_served,
+        "total_connections": row.total_connections,
+        "avg_flow_rate_ls": round(float(row.avg_flow), 2),
+        "avg_pressure_bar": round(float(row.avg_pressure), 2),
+        "active_alerts": row.active_alerts,
+        "nrw_percentage": NRW_PERCENTAGE,
+        "water_quality_compliance_pct": compliance_pct,
+        "data_as_of": row.data_as_of,
+    }
+
+
+async def get_region_kpis(session: AsyncSession) -> list[dict]:
+    """Per-region project counts, population and metric averages."""
+    per_project = _project_totals().subquery()
+    flow_count = func.sum(per_project.c.flow_count)
+    pressure_count = func.sum(per_project.c.pressure_count)
+
+    result = await session.exec(
+        select(
+            WaterProject.region,
+            func.count(WaterProject.id).label("project_count"),
+            func.coalesce(func.sum(WaterProject.population_served), 0).label(
+                "population"
+            ),
+            func.coalesce(
+                func.sum(per_project.c.flow_sum) / func.nullif(flow_count, 0), 0
+            ).label("avg_flow"),
+            func.coalesce(
+                func.sum(per_project.c.pressure_sum) / func.nullif(pressure_count, 0), 0
+            ).label("avg_pressure"),
+            func.max(per_project.c.updated_at).label("data_as_of"),
+        )
+        .outerjoin(per_project, per_project.c.project_id == WaterProject.id)
+        .group_by(WaterProject.region)
+    )
+    return [
+        {
+            "region": row.region,
+            "project_count": row.project_count,
+            "population_served": row.population,
+            "avg_flow_rate_ls": round(float(row.avg_flow), 2),
+            "avg_pressure_bar": round(float(row.avg_pressure), 2),
+            "data_as_of": row.data_as_of,
+        }
+        for row in result.all()
+    ]
@@ -1,31 +1,340 @@
 """Metric CRUD operations with time-series support."""
 
+from collections.abc import Sequence
 from datetime import datetime, timezone, timedelta
+from functools import partial
+from typing import NamedTuple
 
-from sqlmodel import select, func, text
+from sqlalchemy import (
+    Boolean, DateTime, Float, Integer, case, column, delete, literal, tuple_, union_all,
+    update, values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import func, or_, select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.metric import Metric, WaterQualityReading
+from app.core.cache import after_commit, mark_stale
+from app.core.pagination import after
+from app.core.pubsub import broker, metrics_channel
+from app.crud.base import insert_returning
+from app.core.timescale import (
+    ContinuousAggregate,
+    aggregate_refresher,
+    available_aggregates,
+    coarsest_aggregate,
+)
+from app.models.metric import (
+    QUALITY_COMPLIANCE,
+    Metric,
+    MetricLatest,
+    MetricTotal,
+    WaterQualityReading,
+)
+from app.utils.intervals import parse_interval
+
+# Matches time_bucket's default origin, so raw and aggregate buckets align
+BUCKET_ORIGIN_TS = datetime(2000, 1, 3, tzinfo=timezone.utc)
+BUCKET_ORIGIN = f"TIMESTAMPTZ '{BUCKET_ORIGIN_TS.isoformat()}'"
+
+# Column order used for COPY. Ids are drawn from the sequence up front so
+# the batch knows them (see update_metric_latest).
+METRIC_COPY_COLUMNS = (
+    "id",
+    "project_id",
+    "sensor_id",
+    "metric_type",
+    "value",
+    "unit",
+    "is_anomaly",
+    "anomaly_score",
+    "quality_flag",
+    "recorded_at",
+    "ingested_at",
+)
+
+# Sort key for paging through metric history
+METRIC_PAGE_KEY = (Metric.recorded_at, Metric.id)
+
+
+def _metric_fields(data: dict) -> dict:
+    """Drop `id` (always assigned on insert) and an explicit `recorded_at=None`
+    so the model default applies."""
+    return {
+        k: v for k, v in data.items()
+        if k != "id" and not (k == "recorded_at" and v is None)
+    }
 
 
 async def create_metric(session: AsyncSession, data: dict) -> Metric:
-    metric = Metric(**data)
-    session.add(metric)
-    await session.flush()
-    await session.refresh(metric)
+    metric = await insert_returning(session, Metric(**_metric_fields(data)))
+    await update_metric_totals(session, [data])
+    await update_metric_latest(session, [metric.model_dump()])
+    _refresh_backfilled(session, [metric.recorded_at])
     return metric
 
 
 async def batch_create_metrics(
     session: AsyncSession, metrics_data: list[dict]
 ) -> int:
-    """Batch insert metrics for high-throughput IoT ingestion."""
-    metrics = [Metric(**d) for d in metrics_data]
+    """Batch insert metrics for high-throughput IoT ingestion.
+
+    Streams rows with binary COPY on asyncpg connections and falls back
+    to ORM inserts for other drivers. Either way the dicts are annotated
+    in place with the `id` and `recorded_at` that were stored.
+    """
+    if not metrics_data:
+        return 0
+    if session.bind is not None and session.bind.dialect.driver == "asyncpg":
+        count = await batch_create_metrics_copy(session, metrics_data)
+    else:
+        count = await batch_create_metrics_orm(session, metrics_data)
+    await update_metric_totals(session, metrics_data)
+    await update_metric_latest(session, metrics_data)
+    _refresh_backfilled(session, [d["recorded_at"] for d in metrics_data])
+    return count
+
+
+async def batch_create_metrics_orm(
+    session: AsyncSession, metrics_data: list[dict]
+) -> int:
+    """Insert metrics through the ORM unit of work."""
+    metrics = [Metric(**_metric_fields(d)) for d in metrics_data]
     session.add_all(metrics)
     await session.flush()
+    for d, metric in zip(metrics_data, metrics):
+        d["id"] = metric.id
+        d["recorded_at"] = metric.recorded_at
     return len(metrics)
 
 
+async def batch_create_metrics_copy(
+    session: AsyncSession, metrics_data: list[dict]
+) -> int:
+    """Insert metrics with asyncpg's binary COPY, skipping ORM objects.
+
+    Runs on the session's connection, so rows share its transaction.
+    """
+    now = datetime.now(timezone.utc)
+    ids = await _next_metric_ids(session, len(metrics_data))
+    for d, metric_id in zip(metrics_data, ids):
+        d["id"] = metric_id
+        if d.get("recorded_at") is None:
+            d["recorded_at"] = now
+    records = [
+        (
+            d["id"],
+            d["project_id"],
+            d.get("sensor_id"),
+            d["metric_type"],
+            float(d["value"]),
+            d["unit"],
+            bool(d.get("is_anomaly", False)),
+            d.get("anomaly_score"),
+            d.get("quality_flag"),
+            d["recorded_at"],
+            now,
+        )
+        for d in metrics_data
+    ]
+
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        Metric.__tablename__, records=records, columns=METRIC_COPY_COLUMNS
+    )
+    return len(records)
+
+
+async def _next_metric_ids(session: AsyncSession, n: int) -> list[int]:
+    result = await session.exec(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('metrics', 'id')) "
+            "FROM generate_series(1, :n)"
+        ),
+        params={"n": n},
+    )
+    return list(result.scalars().all())
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+async def update_metric_latest(session: AsyncSession, metrics_data: list[dict]) -> None:
+    """Upsert each series' newest reading from a stored batch.
+
+    Expects dicts annotated with `id` and `recorded_at` (see
+    batch_create_metrics). A row is only replaced by a newer reading, with
+    the metric id breaking timestamp ties, so late or out-of-order batches
+    never move a series backwards. Series that changed are published to
+    their project's live stream after commit.
+    """
+    newest: dict[tuple[int, str, str], dict] = {}
+    for d in metrics_data:
+        key = (d["project_id"], d["metric_type"], d.get("sensor_id") or "")
+        current = newest.get(key)
+        if current is None or (_as_utc(d["recorded_at"]), d["id"]) > (
+            _as_utc(current["recorded_at"]), current["id"]
+        ):
+            newest[key] = d
+    if not newest:
+        return
+
+    stmt = insert(MetricLatest).values([
+        {
+            "project_id": project_id,
+            "metric_type": metric_type,
+            "sensor_id": sensor_id,
+            "metric_id": d["id"],
+            "value": float(d["value"]),
+            "unit": d["unit"],
+            "is_anomaly": bool(d.get("is_anomaly", False)),
+            "anomaly_score": d.get("anomaly_score"),
+            "quality_flag": d.get("quality_flag"),
+            "recorded_at": d["recorded_at"],
+        }
+        for (project_id, metric_type, sensor_id), d in sorted(newest.items())
+    ])
+    replaced = {
+        column: stmt.excluded[column]
+        for column in (
+            "metric_id", "value", "unit", "is_anomaly",
+            "anomaly_score", "quality_flag", "recorded_at",
+        )
+    }
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            MetricLatest.project_id, MetricLatest.metric_type, MetricLatest.sensor_id
+        ],
+        set_=replaced,
+        where=tuple_(MetricLatest.recorded_at, MetricLatest.metric_id)
+        < tuple_(stmt.excluded.recorded_at, stmt.excluded.metric_id),
+    ).returning(*MetricLatest.__table__.c)
+    # Only rows that actually moved forward come back; push them to live
+    # streams once the batch commits
+    changed = (await session.exec(stmt)).mappings().all()
+    by_project: dict[int, list[dict]] = {}
+    for row in changed:
+        metric = MetricLatest(**row).to_metric()
+        by_project.setdefault(row["project_id"], []).append(
+            metric.model_dump(exclude={"ingested_at"})
+        )
+    for project_id, readings in by_project.items():
+        after_commit(session, lambda p=project_id, r=readings: broker.publish_many(
+            metrics_channel(p), "metric", r
+        ))
+
+
+async def rebuild_metric_latest(session: AsyncSession) -> None:
+    """Recompute `metric_latest` from the metrics table."""
+    await session.exec(delete(MetricLatest))
+    await session.exec(text("""
+        INSERT INTO metric_latest (
+            project_id, metric_type, sensor_id, metric_id, value, unit,
+            is_anomaly, anomaly_score, quality_flag, recorded_at
+        )
+        SELECT DISTINCT ON (project_id, metric_type, coalesce(sensor_id, ''))
+            project_id, metric_type, coalesce(sensor_id, ''), id, value, unit,
+            is_anomaly, anomaly_score, quality_flag, recorded_at
+        FROM metrics
+        ORDER BY project_id, metric_type, coalesce(sensor_id, ''),
+                 recorded_at DESC, id DESC
+    """))
+
+
+async def ensure_metric_latest(session: AsyncSession) -> None:
+    """Backfill the latest readings once for databases that predate them."""
+    has_rows = (await session.exec(select(MetricLatest.project_id).limit(1))).first()
+    if has_rows is None:
+        await rebuild_metric_latest(session)
+        await session.commit()
+
+
+async def update_metric_totals(session: AsyncSession, metrics_data: list[dict]) -> None:
+    """Add a batch's readings to the per-project running totals.
+
+    Every metric and quality write goes through here, so this is also
+    where cached responses over metric data are marked stale.
+
+    With TimescaleDB the dashboard totals readings from a continuous
+    aggregate instead (see app.crud.dashboard), and only quality
+    compliance is kept here. Ingest then never waits on the row lock of a
+    busy series, and raw retention cannot leave readings counted here
+    that are gone from `metrics`. Plain Postgres has no retention, so its
+    totals stay exact.
+
+    Rows are upserted in key order so concurrent batches touching the
+    same projects lock them in a consistent order.
+    """
+    if not metrics_data:
+        return
+    mark_stale(session, "metrics")
+    if coarsest_aggregate() is not None:
+        metrics_data = [d for d in metrics_data if d["metric_type"] == QUALITY_COMPLIANCE]
+    totals: dict[tuple[int, str], list[float]] = {}
+    for d in metrics_data:
+        entry = totals.setdefault((d["project_id"], d["metric_type"]), [0.0, 0])
+        entry[0] += float(d["value"])
+        entry[1] += 1
+    if not totals:
+        return
+
+    now = datetime.now(timezone.utc)
+    stmt = insert(MetricTotal).values([
+        {
+            "project_id": project_id,
+            "metric_type": metric_type,
+            "value_sum": value_sum,
+            "value_count": value_count,
+            "updated_at": now,
+        }
+        for (project_id, metric_type), (value_sum, value_count) in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MetricTotal.project_id, MetricTotal.metric_type],
+        set_={
+            "value_sum": MetricTotal.value_sum + stmt.excluded.value_sum,
+            "value_count": MetricTotal.value_count + stmt.excluded.value_count,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await session.exec(stmt)
+
+
+async def rebuild_metric_totals(session: AsyncSession) -> None:
+    """Recompute running totals from the raw tables (backfill or repair)."""
+    metric_rows = select(
+        Metric.project_id,
+        Metric.metric_type,
+        func.sum(Metric.value),
+        func.count(),
+        func.now(),
+    ).group_by(Metric.project_id, Metric.metric_type)
+    quality_rows = select(
+        WaterQualityReading.project_id,
+        literal(QUALITY_COMPLIANCE),
+        func.sum(case((WaterQualityReading.is_compliant, 1.0), else_=0.0)),
+        func.count(),
+        func.now(),
+    ).group_by(WaterQualityReading.project_id)
+
+    await session.exec(delete(MetricTotal))
+    await session.exec(
+        insert(MetricTotal).from_select(
+            ["project_id", "metric_type", "value_sum", "value_count", "updated_at"],
+            union_all(metric_rows, quality_rows),
+        )
+    )
+
+
+async def ensure_metric_totals(session: AsyncSession) -> None:
+    """Backfill running totals once for databases that predate them."""
+    has_totals = (await session.exec(select(MetricTotal.project_id).limit(1))).first()
+    if has_totals is None:
+        await rebuild_metric_totals(session)
+        await session.commit()
+
+
 async def get_metrics(
     session: AsyncSession,
     project_id: int,
@@ -33,17 +342,30 @@ async def get_metrics(
     start_time: datetime | None = None,
     end_time: datetime | None = None,
     limit: int = 1000,
+    sensor_id: str | None = None,
+    cursor: tuple[datetime, int] | None = None,
 ) -> list[Metric]:
+    """Newest first; `cursor` is the (recorded_at, id) of the previous page's last row.
+
+    `sensor_id=""` selects readings without a sensor (NULL or empty), the
+    series `metric_latest` and the model registry key as "".
+    """
     query = select(Metric).where(Metric.project_id == project_id)
 
+    if sensor_id == "":
+        query = query.where(or_(Metric.sensor_id.is_(None), Metric.sensor_id == ""))
+    elif sensor_id is not None:
+        query = query.where(Metric.sensor_id == sensor_id)
     if metric_type:
         query = query.where(Metric.metric_type == metric_type)
     if start_time:
         query = query.where(Metric.recorded_at >= start_time)
     if end_time:
         query = query.where(Metric.recorded_at <= end_time)
+    if cursor is not None:
+        query = query.where(after(METRIC_PAGE_KEY, cursor, descending=True))
 
-    query = query.order_by(Metric.recorded_at.desc()).limit(limit)  # type: ignore
+    query = query.order_by(*(c.desc() for c in METRIC_PAGE_KEY)).limit(limit)
     result = await session.exec(query)
     return list(result.all())
 
@@ -52,30 +374,173 @@ async def get_latest_metrics(
     session: AsyncSession,
     project_id: int,
 ) -> list[Metric]:
-    """Get the latest reading for each metric type at a project."""
-    # Use a subquery to get the max recorded_at per metric_type
-    subquery = (
-        select(
-            Metric.metric_type,
-            func.max(Metric.recorded_at).label("max_time"),
-        )
-        .where(Metric.project_id == project_id)
-        .group_by(Metric.metric_type)
-        .subquery()
+    """Get the latest reading of each series (metric type and sensor) at a project.
+
+    A primary-key range read of `metric_latest`; the results are transient
+    Metric instances.
+    """
+    result = await session.exec(
+        select(MetricLatest)
+        .where(MetricLatest.project_id == project_id)
+        .order_by(MetricLatest.metric_type, MetricLatest.sensor_id)
     )
+    return [latest.to_metric() for latest in result.all()]
+
+
+async def get_series_keys(
+    session: AsyncSession, project_id: int | None = None
+) -> list[tuple[int, str, str]]:
+    """(project_id, sensor_id, metric_type) of every series, read from `metric_latest`."""
+    query = select(MetricLatest.project_id, MetricLatest.sensor_id, MetricLatest.metric_type)
+    if project_id is not None:
+        query = query.where(MetricLatest.project_id == project_id)
+    result = await session.exec(query.order_by(*MetricLatest.__table__.primary_key))
+    return [tuple(row) for row in result.all()]
 
-    query = (
-        select(Metric)
-        .join(
-            subquery,
-            (Metric.metric_type == subquery.c.metric_type)
-            & (Metric.recorded_at == subquery.c.max_time),
+
+async def update_anomaly_scores(
+    session: AsyncSession,
+    scores: Sequence[tuple[int, datetime, bool, float]],
+) -> None:
+    """Rewrite (id, recorded_at, is_anomaly, score) of stored readings with one UPDATE.
+
+    `recorded_at` lets hypertables prune chunks. Series whose latest
+    reading was rescored are updated in `metric_latest` too.
+    """
+    if not scores:
+        return
+    rows = values(
+        column("id", Integer), column("recorded_at", DateTime(timezone=True)),
+        column("is_anomaly", Boolean), column("score", Float),
+        name="scores",
+    ).data(list(scores))
+    flag = case((rows.c.is_anomaly, literal("suspect")), else_=literal("good"))
+    for table, matches in (
+        (Metric, (Metric.id == rows.c.id, Metric.recorded_at == rows.c.recorded_at)),
+        (MetricLatest, (MetricLatest.metric_id == rows.c.id,)),
+    ):
+        await session.exec(
+            update(table)
+            .where(*matches)
+            .values(is_anomaly=rows.c.is_anomaly, anomaly_score=rows.c.score, quality_flag=flag)
+            .execution_options(synchronize_session=False)  # type: ignore[call-overload]
         )
-        .where(Metric.project_id == project_id)
-    )
+    mark_stale(session, "metrics")
 
-    result = await session.exec(query)
-    return list(result.all())
+
+class QuerySegment(NamedTuple):
+    """A half-open time range [start, end) answered from one source."""
+    source: str  # "metrics" or a continuous aggregate view
+    start: datetime
+    end: datetime
+
+
+def _floor_bucket(ts: datetime, width: timedelta) -> datetime:
+    return ts - (ts - BUCKET_ORIGIN_TS) % width
+
+
+def _ceil_bucket(ts: datetime, width: timedelta) -> datetime:
+    floor = _floor_bucket(ts, width)
+    return floor if floor == ts else floor + width
+
+
+def plan_aggregation(
+    width: timedelta,
+    start: datetime,
+    end: datetime,
+    tiers: Sequence[ContinuousAggregate],
+    now: datetime,
+) -> list[QuerySegment]:
+    """Split [start, end) into raw and rollup segments.
+
+    Picks the coarsest tier whose bucket tiles `width` and still holds
+    data back to `start`. That tier answers the bucket-aligned middle of
+    the range; the unaligned head and the tail newer than the tier's
+    refresh lag (including the still-open bucket) are read raw.
+    """
+    raw = [QuerySegment("metrics", start, end)]
+    usable = [
+        tier for tier in tiers
+        if width % tier.bucket == timedelta(0)
+        and (tier.horizon is None or start >= now - tier.horizon)
+    ]
+    if not usable:
+        return raw
+    tier = max(usable, key=lambda t: t.bucket)
+
+    head_end = _ceil_bucket(start, tier.bucket)
+    tail_start = _floor_bucket(min(end, now - tier.end_offset), tier.bucket)
+    if tail_start <= head_end:
+        return raw
+
+    segments = []
+    if start < head_end:
+        segments.append(QuerySegment("metrics", start, head_end))
+    segments.append(QuerySegment(tier.view, head_end, tail_start))
+    if tail_start < end:
+        segments.append(QuerySegment("metrics", tail_start, end))
+    return segments
+
+
+def backfilled_spans(
+    times: Sequence[datetime], tiers: Sequence[ContinuousAggregate], now: datetime
+) -> list[tuple[str, datetime, datetime]]:
+    """(view, start, end) bucket spans holding `times` that each tier's
+    refresh policy no longer looks back to, within the tier's retention.
+
+    Buckets closer than the policy's own look-back are merged, as
+    refreshing the gap costs no more than a scheduled run.
+    """
+    times = [_as_utc(t) for t in times]
+    spans = []
+    for tier in tiers:
+        floor = now - tier.horizon if tier.horizon is not None else None
+        buckets = sorted({
+            _floor_bucket(t, tier.bucket) for t in times
+            if t < now - tier.start_offset and (floor is None or t >= floor)
+        })
+        if not buckets:
+            continue
+        start = end = buckets[0]
+        for bucket in buckets[1:]:
+            if bucket - end > tier.start_offset:
+                spans.append((tier.view, start, end + tier.bucket))
+                start = bucket
+            end = bucket
+        spans.append((tier.view, start, end + tier.bucket))
+    return spans
+
+
+def _refresh_backfilled(session: AsyncSession, times: Sequence[datetime]) -> None:
+    """Queue the rollup buckets of backfilled readings for a refresh once
+    they commit.
+
+    Without this the planner would answer those ranges from rollups that
+    never saw the readings.
+    """
+    if not available_aggregates:
+        return
+    spans = backfilled_spans(times, available_aggregates, datetime.now(timezone.utc))
+    if spans:
+        after_commit(session, partial(aggregate_refresher.add, spans))
+
+
+def _segment_sql(segment: QuerySegment, i: int) -> str:
+    if segment.source == "metrics":
+        time_col = "recorded_at"
+        columns = "SUM(value), MIN(value), MAX(value), COUNT(*)"
+    else:
+        time_col = "bucket"
+        columns = "SUM(sum_value), MIN(min_value), MAX(max_value), SUM(count)"
+    return f"""
+        SELECT date_bin(CAST(:width AS interval), {time_col}, {BUCKET_ORIGIN}),
+               {columns}
+        FROM {segment.source}
+        WHERE project_id = :project_id
+          AND metric_type = :metric_type
+          AND {time_col} >= :start_{i} AND {time_col} < :end_{i}
+        GROUP BY 1
+    """
 
 
 async def get_aggregated_metrics(
@@ -86,37 +551,42 @@ async def get_aggregated_metrics(
     start_time: datetime | None = None,
     end_time: datetime | None = None,
 ) -> list[dict]:
-    """Aggregate metrics over time intervals (for charts)."""
+    """Aggregate metrics over time intervals (for charts).
+
+    The range is planned into raw and rollup segments (see
+    plan_aggregation) which are unioned and merged per period in one
+    query. Raises ValueError for intervals that cannot be parsed.
+    """
+    width = parse_interval(interval)
+    now = datetime.now(timezone.utc)
     if not start_time:
-        start_time = datetime.now(timezone.utc) - timedelta(days=7)
+        start_time = now - timedelta(days=7)
     if not end_time:
-        end_time = datetime.now(timezone.utc)
+        end_time = now
+
+    # BETWEEN semantics: make the inclusive end exclusive
+    segments = plan_aggregation(
+        width, start_time, end_time + timedelta(microseconds=1), available_aggregates, now
+    )
+    params = {"width": width, "project_id": project_id, "metric_type": metric_type}
+    for i, segment in enumerate(segments):
+        params[f"start_{i}"] = segment.start
+        params[f"end_{i}"] = segment.end
 
-    query = text("""
+    union = " UNION ALL ".join(_segment_sql(seg, i) for i, seg in enumerate(segments))
+    query = text(f"""
         SELECT
-            date_trunc(:interval, recorded_at) as period,
-            AVG(value) as avg_value,
-            MIN(value) as min_value,
-            MAX(value) as max_value,
-            COUNT(*) as count
-        FROM metrics
-        WHERE project_id = :project_id
-          AND metric_type = :metric_type
-          AND recorded_at BETWEEN :start_time AND :end_time
+            period,
+            SUM(sum_value) / SUM(count) as avg_value,
+            MIN(min_value) as min_value,
+            MAX(max_value) as max_value,
+            SUM(count) as count
+        FROM ({union}) AS segments (period, sum_value, min_value, max_value, count)
         GROUP BY period
         ORDER BY period
     """)
 
-    result = await session.exec(
-        query,
-        params={
-            "interval": interval,
-            "project_id": project_id,
-            "metric_type": metric_type,
-            "start_time": start_time,
-            "end_time": end_time,
-        },
-    )
+    result = await session.exec(query, params=params)
     rows = result.all()
     return [
         {
@@ -124,7 +594,7 @@ async def get_aggregated_metrics(
             "avg_value": round(float(row[1]), 3),
             "min_value": round(float(row[2]), 3),
             "max_value": round(float(row[3]), 3),
-            "count": row[4],
+            "count": int(row[4]),
         }
         for row in rows
     ]
@@ -136,9 +606,12 @@ async def create_quality_reading(
     reading = WaterQualityReading(**data)
     # Auto-check compliance (Tanzania EWURA / WHO standards)
     reading.is_compliant = check_water_quality_compliance(reading)
-    session.add(reading)
-    await session.flush()
-    await session.refresh(reading)
+    reading = await insert_returning(session, reading)
+    await update_metric_totals(session, [{
+        "project_id": reading.project_id,
+        "metric_type": QUALITY_COMPLIANCE,
+        "value": 1.0 if reading.is_compliant else 0.0,
+    }])
     return reading
 
 
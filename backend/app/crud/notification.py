@@ -0,0 +1,168 @@
+"""Notification outbox CRUD operations."""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    DateTime, Integer, String, case, column, insert, literal, or_, union_all, update, values,
+)
+from sqlmodel import and_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.permissions import PERMISSIONS
+from app.models.alert import Alert
+from app.models.link import UserTenant
+from app.models.notification import Notification, NotificationChannel, NotificationStatus
+from app.models.project import WaterProject
+from app.models.user import User
+
+# Roles told about alerts: those allowed to see them
+ALERT_ROLES = sorted(
+    role.value for role, allowed in PERMISSIONS.items() if "view:alerts" in allowed
+)
+
+PENDING = NotificationStatus.PENDING.value
+SENDING = NotificationStatus.SENDING.value
+SENT = NotificationStatus.SENT.value
+
+
+async def enqueue_notifications(
+    session: AsyncSession,
+    alert_ids: dict[str, list[int]],
+    delays: dict[str, float],
+) -> int:
+    """Queue alerts per channel for every recipient with one INSERT ... SELECT.
+
+    Recipients are the active users of the alert's tenant whose role can
+    view alerts; SMS only goes to users with a phone number. Rows become
+    due `delays[channel]` seconds from now.
+    """
+    now = datetime.now(timezone.utc)
+    selects = []
+    for channel, ids in alert_ids.items():
+        if not ids:
+            continue
+        address = User.email if channel == NotificationChannel.EMAIL.value else User.phone
+        selects.append(
+            select(
+                Alert.id, literal(channel), address, literal(PENDING), literal(0),
+                literal(now + timedelta(seconds=delays.get(channel, 0))), literal(now),
+            )
+            .join(WaterProject, WaterProject.id == Alert.project_id)
+            .join(UserTenant, UserTenant.tenant_id == WaterProject.tenant_id)
+            .join(User, User.id == UserTenant.user_id)
+            .where(
+                Alert.id.in_(ids),
+                User.is_active,
+                User.role.in_(ALERT_ROLES),
+                address.is_not(None),
+            )
+        )
+    if not selects:
+        return 0
+    stmt = insert(Notification).from_select(
+        ["alert_id", "channel", "recipient", "status", "attempts", "next_attempt_at", "created_at"],
+        union_all(*selects),
+    )
+    result = await session.exec(stmt)  # type: ignore[call-overload]
+    return result.rowcount
+
+
+async def claim_notifications(
+    session: AsyncSession, limit: int, lease_seconds: float
+) -> list[Notification]:
+    """Lease up to `limit` rows to send, safe against concurrent workers.
+
+    Takes due rows, rows whose lease expired, and every other pending
+    email of a recipient with a due email, so those go out as one digest.
+    """
+    now = datetime.now(timezone.utc)
+    due_email_recipients = select(Notification.recipient).where(
+        Notification.status == PENDING,
+        Notification.channel == NotificationChannel.EMAIL.value,
+        Notification.next_attempt_at <= now,
+    )
+    claimable = (
+        select(Notification.id)
+        .where(
+            or_(
+                and_(
+                    Notification.status == PENDING,
+                    or_(
+                        Notification.next_attempt_at <= now,
+                        and_(
+                            Notification.channel == NotificationChannel.EMAIL.value,
+                            Notification.recipient.in_(due_email_recipients),
+                        ),
+                    ),
+                ),
+                and_(Notification.status == SENDING, Notification.next_attempt_at <= now),
+            )
+        )
+        .order_by(Notification.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.exec(
+        update(Notification)
+        .where(Notification.id.in_(claimable.scalar_subquery()))
+        .values(
+            status=SENDING,
+            attempts=Notification.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=lease_seconds),
+        )
+        .returning(Notification)
+        .execution_options(synchronize_session=False, populate_existing=True)  # type: ignore[call-overload]
+    )
+    return sorted(result.scalars().all(), key=lambda n: n.id)
+
+
+async def renew_notifications(
+    session: AsyncSession, claimed: list[Notification], lease_seconds: float
+) -> int:
+    """Extend the lease of claimed rows still being sent. Returns the number renewed.
+
+    Rows whose lease already ran out and that another worker claimed
+    since (and so counted another attempt) are left alone.
+    """
+    if not claimed:
+        return 0
+    rows = values(
+        column("id", Integer), column("attempts", Integer), name="held"
+    ).data([(n.id, n.attempts) for n in claimed])
+    result = await session.exec(
+        update(Notification)
+        .where(
+            Notification.id == rows.c.id,
+            Notification.attempts == rows.c.attempts,
+            Notification.status == SENDING,
+        )
+        .values(next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)  # type: ignore[call-overload]
+    )
+    return result.rowcount
+
+
+async def finish_notifications(
+    session: AsyncSession,
+    outcomes: list[tuple[int, str, str | None, datetime]],
+) -> None:
+    """Record (id, status, error, next attempt at) of claimed rows with one UPDATE."""
+    if not outcomes:
+        return
+    now = datetime.now(timezone.utc)
+    rows = values(
+        column("id", Integer), column("status", String), column("error", String),
+        column("next_at", DateTime(timezone=True)),
+        name="outcomes",
+    ).data(outcomes)
+    await session.exec(
+        update(Notification)
+        .where(Notification.id == rows.c.id)
+        .values(
+            status=rows.c.status,
+            last_error=rows.c.error,
+            next_attempt_at=rows.c.next_at,
+            sent_at=case((rows.c.status == SENT, literal(now)), else_=Notification.sent_at),
+        )
+        .execution_options(synchronize_session=False)  # type: ignore[call-overload]
+    )
@@ -3,14 +3,14 @@
 from sqlmodel import select, func
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import mark_stale
+from app.crud.base import insert_returning
 from app.models.project import WaterProject
 
 
 async def create_project(session: AsyncSession, data: dict) -> WaterProject:
-    project = WaterProject(**data)
-    session.add(project)
-    await session.flush()
-    await session.refresh(project)
+    project = await insert_returning(session, WaterProject(**data))
+    mark_stale(session, "projects")
     return project
 
 
@@ -21,6 +21,16 @@ async def get_project(session: AsyncSession, project_id: int) -> WaterProject |
     return result.first()
 
 
+async def get_existing_project_ids(session: AsyncSession, project_ids: set[int]) -> set[int]:
+    """The subset of `project_ids` that exist."""
+    if not project_ids:
+        return set()
+    result = await session.exec(
+        select(WaterProject.id).where(WaterProject.id.in_(project_ids))
+    )
+    return set(result.all())
+
+
 async def list_projects(
     session: AsyncSession,
     skip: int = 0,
@@ -29,7 +39,10 @@ async def list_projects(
     status: str | None = None,
     tenant_id: int | None = None,
     project_type: str | None = None,
-) -> tuple[list[WaterProject], int]:
+    after_id: int | None = None,
+    include_total: bool = True,
+) -> tuple[list[WaterProject], int | None]:
+    """Projects ordered by id; `after_id` continues from a keyset cursor."""
     query = select(WaterProject)
     count_query = select(func.count(WaterProject.id))
 
@@ -46,10 +59,14 @@ async def list_projects(
         query = query.where(WaterProject.project_type == project_type)
         count_query = count_query.where(WaterProject.project_type == project_type)
 
-    total_result = await session.exec(count_query)
-    total = total_result.one()
+    total = (await session.exec(count_query)).one() if include_total else None
 
-    result = await session.exec(query.offset(skip).limit(limit))
+    query = query.order_by(WaterProject.id)  # type: ignore
+    if after_id is not None:
+        query = query.where(WaterProject.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    result = await session.exec(query.limit(limit))
     projects = list(result.all())
     return projects, total
 
@@ -63,6 +80,7 @@ async def update_project(
     session.add(project)
     await session.flush()
     await session.refresh(project)
+    mark_stale(session, "projects")
     return project
 
 
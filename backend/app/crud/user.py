@@ -1,10 +1,15 @@
 """User CRUD operations."""
 
+from functools import partial
+
 from sqlmodel import select, func
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models.user import User
-from app.core.security import hash_password
+from app.core.auth_cache import user_cache
+from app.core.cache import after_commit
+from app.crud.base import insert_returning
+from app.core.security import hash_password_async
 
 
 async def get_user_by_email(session: AsyncSession, email: str) -> User | None:
@@ -29,24 +34,32 @@ async def create_user(
     user = User(
         email=email,
         full_name=full_name,
-        hashed_password=hash_password(password),
+        hashed_password=await hash_password_async(password),
         role=role,
         phone=phone,
         region=region,
     )
-    session.add(user)
-    await session.flush()
-    await session.refresh(user)
-    return user
+    return await insert_returning(session, user)
 
 
 async def list_users(
-    session: AsyncSession, skip: int = 0, limit: int = 50
-) -> tuple[list[User], int]:
-    count_result = await session.exec(select(func.count(User.id)))
-    total = count_result.one()
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 50,
+    after_id: int | None = None,
+    include_total: bool = True,
+) -> tuple[list[User], int | None]:
+    """Users ordered by id; `after_id` continues from a keyset cursor."""
+    total = None
+    if include_total:
+        total = (await session.exec(select(func.count(User.id)))).one()
 
-    result = await session.exec(select(User).offset(skip).limit(limit))
+    query = select(User).order_by(User.id)  # type: ignore
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    result = await session.exec(query.limit(limit))
     users = list(result.all())
     return users, total
 
@@ -60,4 +73,6 @@ async def update_user(
     session.add(user)
     await session.flush()
     await session.refresh(user)
+    # Cached sessions must pick up role / is_active changes
+    after_commit(session, partial(user_cache.invalidate, user.id))
     return user
@@ -6,9 +6,18 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.cache import response_cache
 from app.core.config import get_settings
-from app.core.database import init_db
+from app.core.database import engine, init_db, async_session_factory
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.pubsub import broker
+from app.core.timescale import aggregate_refresher, available_aggregates
 from app.api.router import api_router
+from app.crud.metric import ensure_metric_latest, ensure_metric_totals
+from app.services.alert_state import alert_tracker
+from app.services.ingest_buffer import ingest_buffer
+from app.services.notifications import notification_dispatcher
+from app.services.model_registry import model_registry
 
 settings = get_settings()
 
@@ -24,8 +33,29 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Izbezkalī Water Dashboard v%s", settings.APP_VERSION)
     await init_db()
     logger.info("Database initialized")
+    async with async_session_factory() as session:
+        await ensure_metric_totals(session)
+        await ensure_metric_latest(session)
+    if settings.ANOMALY_ML_ENABLED:
+        model_registry.start(
+            async_session_factory, settings.ANOMALY_MODEL_REFIT_INTERVAL_SECONDS
+        )
+    if settings.INGEST_BUFFER_ENABLED:
+        ingest_buffer.start(async_session_factory)
+    broker.start()
+    if available_aggregates:
+        aggregate_refresher.start(engine)
+    alert_tracker.start(async_session_factory)
+    notification_dispatcher.start(async_session_factory)
     yield
     logger.info("Shutting down")
+    await ingest_buffer.stop()
+    await alert_tracker.stop(async_session_factory)
+    await aggregate_refresher.stop(engine)
+    await notification_dispatcher.stop()
+    await broker.stop()
+    await model_registry.stop()
+    await response_cache.close()
 
 
 app = FastAPI(
@@ -46,6 +76,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
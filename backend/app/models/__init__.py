@@ -1,8 +1,9 @@
 from app.models.link import UserTenant
 from app.models.user import User
 from app.models.project import WaterProject, Tenant
-from app.models.metric import Metric, WaterQualityReading
+from app.models.metric import Metric, MetricLatest, MetricTotal, WaterQualityReading
 from app.models.alert import Alert, AlertRule
+from app.models.notification import Notification
 
 __all__ = [
     "User",
@@ -11,6 +12,9 @@ __all__ = [
     "Tenant",
     "Metric",
     "WaterQualityReading",
+    "MetricTotal",
+    "MetricLatest",
     "Alert",
     "AlertRule",
+    "Notification",
 ]
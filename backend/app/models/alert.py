@@ -3,6 +3,7 @@
 from datetime import datetime, timezone
 from enum import Enum
 
+from sqlalchemy import DateTime, Index, text
 from sqlmodel import Field, SQLModel
 
 
@@ -20,9 +21,37 @@ class AlertStatus(str, Enum):
     SUPPRESSED = "suppressed"
 
 
+# Predicate of the one-open-alert-per-series index; upserts must repeat it
+OPEN_RULE_ALERT = "rule_id IS NOT NULL AND status <> 'resolved'"
+
+
 class Alert(SQLModel, table=True):
-    """Active and historical alerts for water projects."""
+    """Active and historical alerts for water projects.
+
+    Most reads only want active alerts, so their indexes are partial on
+    status = 'active' and stay small as history accumulates. A rule keeps
+    at most one open (unresolved) alert per project and sensor; repeat
+    firings bump `occurrences` on it instead of adding rows.
+    """
     __tablename__ = "alerts"
+    __table_args__ = (
+        Index(
+            "ix_alerts_active_created",
+            text("created_at DESC"), text("id DESC"),
+            postgresql_where=text("status = 'active'"),
+        ),
+        Index(
+            "ix_alerts_active_project_created",
+            "project_id", text("created_at DESC"),
+            postgresql_where=text("status = 'active'"),
+        ),
+        Index(
+            "uq_alerts_open_rule_series",
+            "rule_id", "project_id", text("coalesce(sensor_id, '')"),
+            unique=True,
+            postgresql_where=text(OPEN_RULE_ALERT),
+        ),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     project_id: int = Field(foreign_key="water_projects.id", index=True)
@@ -31,21 +60,26 @@ class Alert(SQLModel, table=True):
     title: str = Field(max_length=255)
     message: str
     severity: str = Field(default=AlertSeverity.WARNING.value, max_length=20)
-    status: str = Field(default=AlertStatus.ACTIVE.value, max_length=20, index=True)
+    status: str = Field(default=AlertStatus.ACTIVE.value, max_length=20)
     alert_type: str = Field(max_length=50)  # leak, pressure_drop, quality, maintenance
 
     # Context
     metric_type: str | None = Field(default=None, max_length=50)
     metric_value: float | None = Field(default=None)
     threshold_value: float | None = Field(default=None)
+    sensor_id: str | None = Field(default=None, max_length=100)
+
+    # Firings folded into this alert while it stayed open
+    occurrences: int = Field(default=1)
+    last_seen_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
 
     acknowledged_by: int | None = Field(default=None, foreign_key="users.id")
-    acknowledged_at: datetime | None = Field(default=None)
-    resolved_at: datetime | None = Field(default=None)
+    acknowledged_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    resolved_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
 
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
-        index=True,
+        sa_type=DateTime(timezone=True),
     )
 
 
@@ -62,6 +96,9 @@ class AlertRule(SQLModel, table=True):
     metric_type: str = Field(max_length=50)
     condition: str = Field(max_length=20)  # gt, lt, gte, lte, eq, anomaly
     threshold: float | None = Field(default=None)
+    # Windowed rules compare avg/min/max over the last `window_seconds`
+    aggregate: str | None = Field(default=None, max_length=10)
+    window_seconds: int | None = Field(default=None)
     severity: str = Field(default=AlertSeverity.WARNING.value, max_length=20)
 
     # Scope
@@ -72,4 +109,7 @@ class AlertRule(SQLModel, table=True):
     notify_sms: bool = Field(default=False)
     notify_email: bool = Field(default=True)
 
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
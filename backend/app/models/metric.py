@@ -2,6 +2,7 @@
 
 from datetime import datetime, timezone
 
+from sqlalchemy import BigInteger, DateTime, Index, text
 from sqlmodel import Field, SQLModel
 
 
@@ -9,16 +10,35 @@ class Metric(SQLModel, table=True):
     """Time-series water metrics (flow, pressure, levels).
 
     With TimescaleDB, this table is converted to a hypertable
-    partitioned on `recorded_at` for high-throughput ingestion.
+    partitioned on `recorded_at` for high-throughput ingestion (see
+    app.core.timescale). Hypertable unique keys must include the time
+    column, hence the composite primary key.
+
+    Indexes follow the read paths: per project and type over time (latest,
+    aggregates, filtered history) and per project over time (history,
+    keyset pages). Every extra index slows ingest, so there are no
+    single-column ones.
     """
     __tablename__ = "metrics"
+    __table_args__ = (
+        Index(
+            "ix_metrics_project_type_recorded",
+            "project_id", "metric_type", text("recorded_at DESC"), text("id DESC"),
+        ),
+        Index(
+            "ix_metrics_project_recorded",
+            "project_id", text("recorded_at DESC"), text("id DESC"),
+        ),
+    )
 
-    id: int | None = Field(default=None, primary_key=True)
-    project_id: int = Field(foreign_key="water_projects.id", index=True)
-    sensor_id: str | None = Field(default=None, max_length=100, index=True)
+    id: int | None = Field(
+        default=None, primary_key=True, sa_column_kwargs={"autoincrement": True}
+    )
+    project_id: int = Field(foreign_key="water_projects.id")
+    sensor_id: str | None = Field(default=None, max_length=100)
 
     # Metric type: flow, pressure, level, energy, nrw
-    metric_type: str = Field(max_length=50, index=True)
+    metric_type: str = Field(max_length=50)
 
     value: float
     unit: str = Field(max_length=20)  # L/s, m³/h, bar, psi, m, kWh, %
@@ -30,10 +50,12 @@ class Metric(SQLModel, table=True):
 
     recorded_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
-        index=True,
+        sa_type=DateTime(timezone=True),
+        primary_key=True,
     )
     ingested_at: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc)
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
     )
 
 
@@ -58,5 +80,66 @@ class WaterQualityReading(SQLModel, table=True):
 
     recorded_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
         index=True,
     )
+
+
+class MetricTotal(SQLModel, table=True):
+    """Running sum and count of readings per project and metric type.
+
+    Maintained incrementally on ingest so dashboard averages never scan
+    the metrics table. Water quality compliance is tracked under
+    QUALITY_COMPLIANCE as the running mean of a 0/1 indicator.
+    """
+    __tablename__ = "metric_totals"
+
+    project_id: int = Field(foreign_key="water_projects.id", primary_key=True)
+    metric_type: str = Field(max_length=50, primary_key=True)
+
+    value_sum: float = Field(default=0.0)
+    value_count: int = Field(default=0, sa_type=BigInteger)
+
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+
+
+class MetricLatest(SQLModel, table=True):
+    """Most recent reading of every series, upserted on each ingest batch.
+
+    Keyed by (project_id, metric_type, sensor_id) so the latest readings
+    of a project are a primary-key range read instead of a search through
+    its history. Readings without a sensor are stored under sensor_id "".
+    """
+    __tablename__ = "metric_latest"
+
+    project_id: int = Field(foreign_key="water_projects.id", primary_key=True)
+    metric_type: str = Field(max_length=50, primary_key=True)
+    sensor_id: str = Field(default="", max_length=100, primary_key=True)
+
+    metric_id: int = Field(sa_type=BigInteger)
+    value: float
+    unit: str = Field(max_length=20)
+    is_anomaly: bool = Field(default=False)
+    anomaly_score: float | None = Field(default=None)
+    quality_flag: str | None = Field(default=None, max_length=20)
+    recorded_at: datetime = Field(sa_type=DateTime(timezone=True))
+
+    def to_metric(self) -> Metric:
+        return Metric(
+            id=self.metric_id,
+            project_id=self.project_id,
+            sensor_id=self.sensor_id or None,
+            metric_type=self.metric_type,
+            value=self.value,
+            unit=self.unit,
+            is_anomaly=self.is_anomaly,
+            anomaly_score=self.anomaly_score,
+            quality_flag=self.quality_flag,
+            recorded_at=self.recorded_at,
+        )
+
+
+QUALITY_COMPLIANCE = "quality_compliance"
@@ -0,0 +1,56 @@
+"""Notification outbox model."""
+
+from datetime import datetime, timezone
+from enum import Enum
+
+from sqlalchemy import DateTime, Index, text
+from sqlmodel import Field, SQLModel
+
+
+class NotificationChannel(str, Enum):
+    EMAIL = "email"
+    SMS = "sms"
+
+
+class NotificationStatus(str, Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class Notification(SQLModel, table=True):
+    """One alert to deliver to one recipient over one channel.
+
+    Rows are written in the transaction that opens the alert and sent
+    later by the dispatcher, so delivery never runs inside a request.
+    A claimed row is `sending` until `next_attempt_at`, its lease; rows
+    claimed by a worker that died are claimed again once it expires.
+    """
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index(
+            "ix_notifications_pending",
+            "channel", "recipient", "next_attempt_at",
+            postgresql_where=text("status IN ('pending', 'sending')"),
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    alert_id: int = Field(foreign_key="alerts.id")
+    channel: str = Field(max_length=10)
+    recipient: str = Field(max_length=255)  # email address or phone number
+
+    status: str = Field(default=NotificationStatus.PENDING.value, max_length=20)
+    attempts: int = Field(default=0)
+    last_error: str | None = Field(default=None)
+
+    next_attempt_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+    sent_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
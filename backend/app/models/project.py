@@ -3,6 +3,7 @@
 from datetime import datetime, timezone
 from enum import Enum
 
+from sqlalchemy import DateTime
 from sqlmodel import Field, SQLModel, Relationship
 
 from app.models.link import UserTenant
@@ -38,7 +39,10 @@ class Tenant(SQLModel, table=True):
     contact_email: str | None = Field(default=None, max_length=255)
     contact_phone: str | None = Field(default=None, max_length=20)
     is_active: bool = Field(default=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
 
     # Relationships
     users: list["User"] = Relationship(
@@ -77,6 +81,12 @@ class WaterProject(SQLModel, table=True):
     tenant: Tenant | None = Relationship(back_populates="projects")
 
     # Timestamps
-    commissioned_date: datetime | None = Field(default=None)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    commissioned_date: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
@@ -2,6 +2,7 @@
 
 from datetime import datetime, timezone
 
+from sqlalchemy import DateTime
 from sqlmodel import Field, SQLModel, Relationship
 
 from app.models.link import UserTenant
@@ -19,8 +20,14 @@ class User(SQLModel, table=True):
     phone: str | None = Field(default=None, max_length=20)
     region: str | None = Field(default=None, max_length=100)
 
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
 
     # Relationships
     tenants: list["Tenant"] = Relationship(
@@ -1,8 +1,9 @@
 """Alert schemas."""
 
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
 class AlertCreate(BaseModel):
@@ -27,6 +28,9 @@ class AlertRead(BaseModel):
     metric_type: str | None = None
     metric_value: float | None = None
     threshold_value: float | None = None
+    sensor_id: str | None = None
+    occurrences: int = 1
+    last_seen_at: datetime | None = None
     acknowledged_by: int | None = None
     acknowledged_at: datetime | None = None
     resolved_at: datetime | None = None
@@ -43,14 +47,26 @@ class AlertRuleCreate(BaseModel):
     name: str
     description: str | None = None
     metric_type: str
-    condition: str  # gt, lt, gte, lte, eq, anomaly
+    condition: Literal["gt", "lt", "gte", "lte", "eq", "anomaly"]
     threshold: float | None = None
+    aggregate: Literal["avg", "min", "max"] | None = None
+    window_seconds: int | None = Field(default=None, gt=0)
     severity: str = "warning"
     project_id: int | None = None
     tenant_id: int | None = None
     notify_sms: bool = False
     notify_email: bool = True
 
+    @model_validator(mode="after")
+    def check_threshold(self) -> "AlertRuleCreate":
+        if self.condition != "anomaly" and self.threshold is None:
+            raise ValueError(f"condition '{self.condition}' needs a threshold")
+        if (self.aggregate is None) != (self.window_seconds is None):
+            raise ValueError("aggregate and window_seconds go together")
+        if self.aggregate is not None and self.condition == "anomaly":
+            raise ValueError("anomaly rules cannot be windowed")
+        return self
+
 
 class AlertRuleRead(BaseModel):
     id: int
@@ -60,6 +76,8 @@ class AlertRuleRead(BaseModel):
     metric_type: str
     condition: str
     threshold: float | None = None
+    aggregate: str | None = None
+    window_seconds: int | None = None
     severity: str
     project_id: int | None = None
     tenant_id: int | None = None
@@ -0,0 +1,13 @@
+"""Background job schemas."""
+
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class JobRead(BaseModel):
+    id: str
+    status: str  # PENDING, STARTED, PROGRESS, SUCCESS, FAILURE
+    progress: dict | None = None
+    result: Any = None
+    error: str | None = None
@@ -82,3 +82,4 @@ class DashboardKPIs(BaseModel):
     active_alerts: int
     nrw_percentage: float  # Non-Revenue Water %
     water_quality_compliance_pct: float
+    data_as_of: datetime | None = None  # Last ingest reflected in the averages
@@ -57,4 +57,5 @@ class ProjectUpdate(BaseModel):
 
 class ProjectList(BaseModel):
     items: list[ProjectRead]
-    total: int
+    total: int | None = None
+    next_cursor: str | None = None
@@ -28,4 +28,5 @@ class UserUpdate(BaseModel):
 
 class UserList(BaseModel):
     items: list[UserRead]
-    total: int
+    total: int | None = None
+    next_cursor: str | None = None
@@ -0,0 +1,342 @@
+"""Per-series alert state: de-duplication, hysteresis and storm control.
+
+The rule engine reports every evaluation of a (rule, project, sensor)
+series as a breach, a clear, or a hold (between the threshold and its
+clear margin). `AlertTracker` turns those into alert lifecycle changes:
+
+- open: after ALERT_OPEN_AFTER consecutive breaches. A project may open
+  ALERT_RATE_LIMIT alerts per ALERT_RATE_WINDOW_SECONDS, and a series
+  that closed less than ALERT_COOLDOWN_SECONDS ago may not reopen yet.
+  Alerts held back by either rule are stored as SUPPRESSED and turn
+  active on a later breach once allowed.
+- repeat: while an alert is open, breaches are only counted in memory.
+  `flush` folds them into the open row with one UPDATE, every
+  ALERT_FLUSH_SECONDS and before the alert closes.
+- close: after ALERT_CLEAR_AFTER consecutive clears the alert resolves.
+
+Opens and closes are written in the ingest transaction. Given that
+transaction, `opened`, `activated`, `closed` and `flush` undo their
+in-memory changes if it rolls back, so the tracker never holds alert ids
+or drops counts the database does not have. The database allows one
+open alert per series, so workers with separate trackers still share
+one row per series.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from functools import partial
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import after_rollback, flush_stale
+from app.core.config import get_settings
+from app.crud.alert import bump_alerts, get_open_rule_alerts
+from app.models.alert import Alert, AlertStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# (rule id, project id, sensor id or "")
+SeriesKey = tuple[int, int, str]
+# (project id, sensor id or "", metric type)
+Series = tuple[int, str, str]
+
+
+class SeriesState:
+    __slots__ = (
+        "metric_type", "alert_id", "suppressed", "breaches", "clears",
+        "closed_at", "pending", "value", "seen_at",
+    )
+
+    def __init__(self, metric_type: str):
+        self.metric_type = metric_type
+        self.alert_id: int | None = None  # open alert, once written
+        self.suppressed = False
+        self.breaches = 0  # consecutive, while closed
+        self.clears = 0  # consecutive, while open
+        self.closed_at: float | None = None
+        self.pending = 0  # repeat firings not yet written
+        self.value = None
+        self.seen_at = None
+
+
+@dataclass
+class Changes:
+    """Writes owed to the database after one evaluation."""
+
+    opened: list[dict] = field(default_factory=list)
+    activated: list[int] = field(default_factory=list)
+    resolved: list[SeriesKey] = field(default_factory=list)
+
+
+class AlertTracker:
+    """In-memory state machine for every series with a streak or open alert."""
+
+    def __init__(
+        self,
+        open_after: int = 1,
+        clear_after: int = 3,
+        cooldown_seconds: float = 300.0,
+        rate_limit: int = 20,
+        rate_window_seconds: float = 60.0,
+        flush_seconds: float = 5.0,
+        clock=time.monotonic,
+    ):
+        self.open_after = open_after
+        self.clear_after = clear_after
+        self.cooldown_seconds = cooldown_seconds
+        self.rate_limit = rate_limit
+        self.rate_window_seconds = rate_window_seconds
+        self.flush_seconds = flush_seconds
+        self.clock = clock
+        self._task: asyncio.Task | None = None
+        self.clear()
+
+    def clear(self) -> None:
+        self._states: dict[SeriesKey, SeriesState] = {}
+        self._series: dict[Series, set[SeriesKey]] = defaultdict(set)
+        self._opens: dict[int, deque[float]] = defaultdict(deque)
+        self._dirty: set[SeriesKey] = set()
+        self._loaded = False
+        self.suppressed = 0
+
+    def get(self, key: SeriesKey) -> SeriesState | None:
+        return self._states.get(key)
+
+    def tracked(self, series: Series) -> set[SeriesKey]:
+        """Keys of `series` that need a clear/hold verdict when not firing."""
+        return self._series.get(series, set())
+
+    @property
+    def has_tracked(self) -> bool:
+        return bool(self._series)
+
+    def _track(self, key: SeriesKey, state: SeriesState, on: bool) -> None:
+        series = (key[1], key[2], state.metric_type)
+        if on:
+            self._series[series].add(key)
+        elif series in self._series:
+            self._series[series].discard(key)
+            if not self._series[series]:
+                del self._series[series]
+
+    def _may_open(self, project_id: int, state: SeriesState, now: float) -> bool:
+        if state.closed_at is not None and now - state.closed_at < self.cooldown_seconds:
+            return False
+        opens = self._opens[project_id]
+        while opens and opens[0] <= now - self.rate_window_seconds:
+            opens.popleft()
+        if len(opens) >= self.rate_limit:
+            return False
+        opens.append(now)
+        return True
+
+    async def load(self, session: AsyncSession) -> None:
+        """Adopt the open rule alerts already in the database, once."""
+        if self._loaded:
+            return
+        for alert in await get_open_rule_alerts(session):
+            key = (alert.rule_id, alert.project_id, alert.sensor_id or "")
+            state = self._states[key] = SeriesState(alert.metric_type or "")
+            state.alert_id = alert.id
+            state.suppressed = alert.status == AlertStatus.SUPPRESSED.value
+            self._track(key, state, True)
+        self._loaded = True
+
+    def breach(self, changes: Changes, key: SeriesKey, data: dict) -> None:
+        """Record a firing; `data` is the alert to open if one is due."""
+        now = self.clock()
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = SeriesState(data["metric_type"])
+        state.clears = 0
+        state.value, state.seen_at = data["metric_value"], data["last_seen_at"]
+        if state.alert_id is not None:
+            state.pending += 1
+            self._dirty.add(key)
+            if state.suppressed and self._may_open(key[1], state, now):
+                state.suppressed = False
+                changes.activated.append(state.alert_id)
+            return
+
+        state.breaches += 1
+        self._track(key, state, True)
+        if state.breaches < self.open_after:
+            return
+        state.breaches = 0
+        state.suppressed = not self._may_open(key[1], state, now)
+        if state.suppressed:
+            self.suppressed += 1
+        status = AlertStatus.SUPPRESSED if state.suppressed else AlertStatus.ACTIVE
+        changes.opened.append({**data, "status": status.value})
+
+    def settle(self, changes: Changes, key: SeriesKey, clear: bool) -> None:
+        """Record an evaluation that did not fire; `clear` if past the margin."""
+        state = self._states.get(key)
+        if state is None:
+            return
+        state.breaches = 0
+        if state.alert_id is None:
+            self._track(key, state, False)
+            return
+        state.clears = state.clears + 1 if clear else 0
+        if state.clears >= self.clear_after:
+            changes.resolved.append(key)
+
+    def opened(self, alerts: list[Alert], session: AsyncSession | None = None) -> None:
+        """Bind written alerts to their series; the row's status wins."""
+        for alert in alerts:
+            key = (alert.rule_id, alert.project_id, alert.sensor_id or "")
+            state = self._states.get(key)
+            if state is None:
+                continue
+            if session is not None:
+                after_rollback(session, partial(self._unbind, key, alert.id, state.closed_at))
+            state.alert_id = alert.id
+            state.suppressed = alert.status == AlertStatus.SUPPRESSED.value
+            state.closed_at = None
+
+    def _unbind(self, key: SeriesKey, alert_id: int, closed_at: float | None) -> None:
+        state = self._states.get(key)
+        if state is not None and state.alert_id == alert_id:
+            state.alert_id = None
+            state.suppressed = False
+            state.clears = state.pending = 0
+            state.closed_at = closed_at
+            self._dirty.discard(key)
+
+    def activated(self, session: AsyncSession, alert_ids: list[int]) -> None:
+        """Turn series suppressed again if activating `alert_ids` rolls back."""
+        if alert_ids:
+            after_rollback(session, partial(self._suppress, set(alert_ids)))
+
+    def _suppress(self, alert_ids: set[int]) -> None:
+        for state in self._states.values():
+            if state.alert_id in alert_ids:
+                state.suppressed = True
+
+    def closed(self, keys: list[SeriesKey], session: AsyncSession | None = None) -> None:
+        now = self.clock()
+        for key in keys:
+            state = self._states.get(key)
+            if state is None:
+                continue
+            if session is not None and state.alert_id is not None:
+                after_rollback(session, partial(
+                    self._rebind, key, state, state.alert_id, state.suppressed, state.closed_at
+                ))
+            state.alert_id = None
+            state.suppressed = False
+            state.clears = state.pending = 0
+            state.closed_at = now
+            self._dirty.discard(key)
+            self._track(key, state, False)
+
+    def _rebind(
+        self,
+        key: SeriesKey,
+        state: SeriesState,
+        alert_id: int,
+        suppressed: bool,
+        closed_at: float | None,
+    ) -> None:
+        state = self._states.setdefault(key, state)
+        if state.alert_id is None:
+            state.alert_id = alert_id
+            state.suppressed = suppressed
+            state.closed_at = closed_at
+            self._track(key, state, True)
+
+    def _prune(self) -> None:
+        """Forget closed series whose cooldown is over."""
+        cutoff = self.clock() - self.cooldown_seconds
+        idle = [
+            key for key, state in self._states.items()
+            if state.alert_id is None and not state.breaches
+            and (state.closed_at is None or state.closed_at <= cutoff)
+        ]
+        for key in idle:
+            del self._states[key]
+
+    async def flush(self, session: AsyncSession, keys: list[SeriesKey] | None = None) -> int:
+        """Write counted repeats of `keys` (default: all) in the caller's transaction."""
+        keys = list(self._dirty) if keys is None else [k for k in keys if k in self._dirty]
+        bumps, owners = [], {}
+        for key in keys:
+            self._dirty.discard(key)
+            state = self._states.get(key)
+            if state is None or state.alert_id is None or not state.pending:
+                continue
+            bumps.append((state.alert_id, state.pending, state.value, state.seen_at))
+            owners[state.alert_id] = key
+            state.pending = 0
+        if not bumps:
+            return 0
+        after_rollback(session, partial(self._recount, owners, bumps))
+        written = {alert.id for alert in await bump_alerts(session, bumps)}
+        # Resolved by hand since the last flush: the series starts over
+        self.closed(
+            [key for alert_id, key in owners.items() if alert_id not in written], session
+        )
+        return len(written)
+
+    def _recount(self, owners: dict[int, SeriesKey], bumps: list[tuple]) -> None:
+        """Put back counts whose write rolled back."""
+        for alert_id, count, _, _ in bumps:
+            key = owners[alert_id]
+            state = self._states.get(key)
+            if state is not None and state.alert_id == alert_id:
+                state.pending += count
+                self._dirty.add(key)
+
+    # Background task
+
+    async def run(self, session_factory) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush_committed(session_factory)
+                self._prune()
+            except Exception:
+                logger.exception("Alert counter flush failed")
+
+    def start(self, session_factory) -> None:
+        self._task = asyncio.create_task(self.run(session_factory))
+
+    async def stop(self, session_factory) -> None:
+        """Stop the flush task and write whatever is still counted."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush_committed(session_factory)
+
+    async def flush_committed(self, session_factory) -> None:
+        """`flush` in a transaction of its own."""
+        async with session_factory() as session:
+            try:
+                await self.flush(session)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                await flush_stale(session, committed=False)
+                raise
+            await flush_stale(session)
+
+
+# Singleton
+alert_tracker = AlertTracker(
+    open_after=settings.ALERT_OPEN_AFTER,
+    clear_after=settings.ALERT_CLEAR_AFTER,
+    cooldown_seconds=settings.ALERT_COOLDOWN_SECONDS,
+    rate_limit=settings.ALERT_RATE_LIMIT,
+    rate_window_seconds=settings.ALERT_RATE_WINDOW_SECONDS,
+    flush_seconds=settings.ALERT_FLUSH_SECONDS,
+)
@@ -1,15 +1,20 @@
-"""Anomaly detection service using Isolation Forest.
+"""Anomaly detection service: thresholds, rolling baselines and Isolation Forest.
 
 Detects anomalous sensor readings for leak detection,
 pressure drops, and unusual flow patterns.
 """
 
 import logging
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
+from enum import Enum
 
 import numpy as np
 
+from app.core.config import get_settings
+
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Thresholds for simple rule-based detection (fallback)
 THRESHOLDS = {
@@ -20,6 +25,32 @@ THRESHOLDS = {
     "turbidity": {"min": 0, "max": 10, "unit": "NTU"},
 }
 
+# Threshold arrays for vectorized batch scoring, indexed by THRESHOLD_INDEX.
+THRESHOLD_INDEX = {metric_type: i for i, metric_type in enumerate(THRESHOLDS)}
+THRESHOLD_MIN = np.array([t["min"] for t in THRESHOLDS.values()], dtype=np.float64)
+THRESHOLD_MAX = np.array([t["max"] for t in THRESHOLDS.values()], dtype=np.float64)
+THRESHOLD_MID = (THRESHOLD_MIN + THRESHOLD_MAX) / 2
+THRESHOLD_RANGE = THRESHOLD_MAX - THRESHOLD_MIN
+
+# Maximum plausible change per second before a reading is flagged as a
+# sudden jump (e.g. a pipe burst spiking flow or dropping pressure).
+MAX_RATE_OF_CHANGE = {
+    "flow": 2.0,  # L/s per second
+    "pressure": 0.1,  # bar per second
+    "level": 0.01,  # m per second
+}
+
+
+# Smallest spread (std and MAD) assumed for a rolling baseline, relative to
+# its magnitude. With the default z threshold, readings within ~0.35% of a
+# flat baseline are not flagged.
+SPREAD_FLOOR = 1e-3
+
+
+class AnomalyStrategy(str, Enum):
+    SIMPLE = "simple"
+    ROLLING = "rolling"
+
 
 class AnomalyDetector:
     """Hybrid anomaly detector: rule-based + ML (Isolation Forest)."""
@@ -50,36 +81,87 @@ class AnomalyDetector:
         score = round(deviation * 0.3, 3)  # Low score for in-range values
         return False, score
 
+    def detect_simple_batch(
+        self, metric_types: list[str], values: list[float] | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Vectorized `detect_simple` over a whole batch.
+
+        Returns (is_anomaly, score) arrays aligned with the inputs.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        idx = np.fromiter(
+            (THRESHOLD_INDEX.get(t, -1) for t in metric_types),
+            dtype=np.intp,
+            count=len(values),
+        )
+        known = idx >= 0
+        safe_idx = np.where(known, idx, 0)
+
+        min_val = THRESHOLD_MIN[safe_idx]
+        max_val = THRESHOLD_MAX[safe_idx]
+        range_val = THRESHOLD_RANGE[safe_idx]
+
+        distance = np.maximum(min_val - values, values - max_val)
+        out_of_range = known & (distance > 0)
+
+        outside_score = np.minimum(1.0, 0.5 + distance / range_val)
+        inside_score = np.abs(values - THRESHOLD_MID[safe_idx]) / (range_val / 2) * 0.3
+
+        scores = np.where(out_of_range, outside_score, inside_score)
+        scores = np.where(known, np.round(scores, 3), 0.0)
+        return out_of_range, scores
+
+    @property
+    def is_fitted(self) -> bool:
+        return self._is_fitted
+
+    def fit(self, values: list[float] | np.ndarray) -> None:
+        """Fit the Isolation Forest on a sensor's reading history."""
+        from sklearn.ensemble import IsolationForest
+
+        model = IsolationForest(
+            n_estimators=100,
+            contamination=0.05,
+            random_state=42,
+        )
+        model.fit(np.asarray(values, dtype=np.float64).reshape(-1, 1))
+        self._model = model
+        self._is_fitted = True
+
+    def score_isolation_forest(
+        self, values: list[float] | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Score readings against the fitted model without refitting.
+
+        Returns (is_anomaly, score 0-1) arrays aligned with `values`.
+        """
+        if not self._is_fitted:
+            raise RuntimeError("Isolation Forest model is not fitted")
+
+        data = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+        decision = self._model.decision_function(data)
+        # predict() flags exactly the readings with a negative decision value
+        is_anomaly = decision < 0
+        scores = np.round(np.clip(0.5 - decision, 0, 1), 3)
+        return is_anomaly, scores
+
     def detect_isolation_forest(
         self, values: list[float], new_value: float
     ) -> tuple[bool, float]:
         """ML-based anomaly detection using Isolation Forest.
 
-        Requires scikit-learn. Falls back to simple detection if unavailable.
+        Fits a throwaway model on `values`; use `ModelRegistry` for models
+        that persist between readings. Requires scikit-learn.
         """
         try:
-            from sklearn.ensemble import IsolationForest
-
             if len(values) < 30:
                 # Not enough history for ML
                 return False, 0.0
 
-            data = np.array(values + [new_value]).reshape(-1, 1)
-            model = IsolationForest(
-                n_estimators=100,
-                contamination=0.05,
-                random_state=42,
-            )
-            model.fit(data)
-
-            score = model.decision_function([[new_value]])[0]
-            prediction = model.predict([[new_value]])[0]
-
-            # Convert to 0-1 score (lower decision_function = more anomalous)
-            normalized_score = max(0, min(1, 0.5 - score))
-            is_anomaly = prediction == -1
-
-            return is_anomaly, round(normalized_score, 3)
+            detector = AnomalyDetector()
+            detector.fit(values + [new_value])
+            is_anomaly, scores = detector.score_isolation_forest([new_value])
+            return bool(is_anomaly[0]), float(scores[0])
 
         except ImportError:
             logger.warning("scikit-learn not available, using rule-based detection")
@@ -102,6 +184,200 @@ class AnomalyDetector:
             return True, round(score, 3)
         return False, 0.0
 
+    def detect_rate_of_change_batch(
+        self,
+        current_values: np.ndarray,
+        previous_values: np.ndarray,
+        time_deltas_seconds: np.ndarray,
+        max_rates: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Vectorized `detect_rate_of_change`.
+
+        Rows with a NaN previous value or max rate, or a non-positive time
+        delta, are never flagged.
+        """
+        valid = (
+            (time_deltas_seconds > 0)
+            & ~np.isnan(previous_values)
+            & ~np.isnan(max_rates)
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.abs(current_values - previous_values) / time_deltas_seconds
+            is_anomaly = valid & (rates > max_rates)
+            scores = np.where(is_anomaly, np.round(np.minimum(1.0, rates / max_rates), 3), 0.0)
+        return is_anomaly, scores
+
+
+class RollingWindow:
+    """Fixed-size ring buffer of recent readings with O(1) mean/variance.
+
+    Mean and variance are maintained with Welford's update, adjusted for
+    the value evicted once the buffer is full.
+    """
+
+    __slots__ = ("values", "count", "pos", "mean", "m2")
+
+    def __init__(self, size: int):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.pos = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.values)
+
+    def copy(self) -> "RollingWindow":
+        window = RollingWindow.__new__(RollingWindow)
+        window.values = self.values.copy()
+        window.count, window.pos, window.mean, window.m2 = (
+            self.count, self.pos, self.mean, self.m2
+        )
+        return window
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def push(self, value: float) -> None:
+        if self.count < self.size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.values[self.pos]
+            old_mean = self.mean
+            self.mean += (value - old) / self.count
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+            self.m2 = max(self.m2, 0.0)
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+
+    def median_and_mad(self) -> tuple[float, float]:
+        window = self.values[: self.count]
+        median = float(np.median(window))
+        return median, float(np.median(np.abs(window - median)))
+
+
+class OnlineAnomalyDetector:
+    """Streaming per-sensor detector using rolling z-score and MAD.
+
+    Each series keeps a fixed-size `RollingWindow`, so scoring a reading
+    costs the same regardless of how much history the sensor has. The
+    number of tracked series is bounded with LRU eviction.
+
+    Ingest scores batches against copies (`score_batch`) and advances the
+    baselines with `push_batch` only once the readings are stored, so
+    rejected, rolled-back or retried readings never count.
+    """
+
+    def __init__(
+        self,
+        window_size: int = 64,
+        z_threshold: float = 3.5,
+        min_samples: int = 10,
+        max_series: int = 50_000,
+    ):
+        self.window_size = window_size
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.max_series = max_series
+        self._windows: OrderedDict[tuple, RollingWindow] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def clear(self) -> None:
+        self._windows.clear()
+
+    def get(self, key: tuple) -> RollingWindow | None:
+        return self._windows.get(key)
+
+    def _window(self, key: tuple) -> RollingWindow:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = RollingWindow(self.window_size)
+            if len(self._windows) > self.max_series:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+        return window
+
+    def score(self, key: tuple, value: float) -> tuple[bool, float] | None:
+        """Score a reading against its series baseline, then add it.
+
+        Returns None while the series is still warming up.
+        """
+        window = self._window(key)
+        result = self._score(window, value)
+        window.push(value)
+        return result
+
+    def _score(self, window: RollingWindow, value: float) -> tuple[bool, float] | None:
+        result = None
+        if window.count >= self.min_samples:
+            # Floor the spread so a flat baseline (common for level and
+            # pressure) still flags a jump instead of dividing by zero
+            floor = SPREAD_FLOOR * max(abs(window.mean), 1.0)
+            std = max(window.variance ** 0.5, floor)
+            z = abs(value - window.mean) / std
+            median, mad = window.median_and_mad()
+            robust_z = 0.6745 * abs(value - median) / max(mad, floor)
+            deviation = max(z, robust_z)
+            score = min(1.0, deviation / (2 * self.z_threshold))
+            result = (deviation > self.z_threshold, round(score, 3))
+        return result
+
+    def score_batch(
+        self,
+        keys: list[tuple],
+        values: list[float] | np.ndarray,
+        order: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Score readings in `order` (chronological). Returns (is_anomaly, score, scored).
+
+        Each reading is compared with its series' baseline plus the earlier
+        readings of the batch, on a copy: the baselines themselves only
+        move in `push_batch`. Series seen for the first time start being
+        tracked, with an empty baseline.
+        """
+        n = len(keys)
+        is_anomaly = np.zeros(n, dtype=bool)
+        scores = np.zeros(n, dtype=np.float64)
+        scored = np.zeros(n, dtype=bool)
+        copies: dict[tuple, RollingWindow] = {}
+        for i in (order if order is not None else range(n)):
+            window = copies.get(keys[i])
+            if window is None:
+                window = copies[keys[i]] = self._window(keys[i]).copy()
+            value = float(values[i])
+            result = self._score(window, value)
+            window.push(value)
+            if result is not None:
+                is_anomaly[i], scores[i] = result
+                scored[i] = True
+        return is_anomaly, scores, scored
+
+    def push_batch(
+        self,
+        keys: list[tuple],
+        values: list[float] | np.ndarray,
+        order: np.ndarray | None = None,
+    ) -> None:
+        """Add stored readings, in `order`, to the baselines of tracked series."""
+        for i in (order if order is not None else range(len(keys))):
+            window = self._windows.get(keys[i])
+            if window is not None:
+                window.push(float(values[i]))
+
 
-# Singleton
+# Singletons
 anomaly_detector = AnomalyDetector()
+online_detector = OnlineAnomalyDetector(
+    window_size=settings.ANOMALY_ROLLING_WINDOW,
+    z_threshold=settings.ANOMALY_ROLLING_Z_THRESHOLD,
+    min_samples=settings.ANOMALY_ROLLING_MIN_SAMPLES,
+    max_series=settings.ANOMALY_ROLLING_MAX_SERIES,
+)
@@ -0,0 +1,183 @@
+"""Metric ingestion pipeline shared by the metric routes.
+
+Scores incoming readings (rule-based, rate of change, rolling baseline
+and per-sensor Isolation Forest) before they are written, then evaluates
+alert rules against what was stored.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import after_commit
+from app.core.config import get_settings
+from app.crud.metric import batch_create_metrics
+from app.services.anomaly import (
+    MAX_RATE_OF_CHANGE,
+    AnomalyStrategy,
+    anomaly_detector,
+    online_detector,
+)
+from app.services.last_values import last_values, series_key
+from app.services.model_registry import model_registry
+
+settings = get_settings()
+
+
+def as_utc(ts: datetime) -> datetime:
+    """Treat naive timestamps as UTC, matching how they are stored."""
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def recorded_timestamps(metrics_data: list[dict]) -> np.ndarray:
+    """Epoch seconds of each reading's `recorded_at`, defaulting to now."""
+    now = datetime.now(timezone.utc)
+    return np.array(
+        [as_utc(d.get("recorded_at") or now).timestamp() for d in metrics_data],
+        dtype=np.float64,
+    )
+
+
+def check_rate_of_change(
+    metrics_data: list[dict], timestamps: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Flag sudden jumps against each sensor's previous reading.
+
+    The batch is ordered by recorded_at within each sensor, so a reading
+    is compared with the one before it in the batch, or with the cached
+    last value for the first reading of each sensor. The cache only
+    advances once the readings are stored (see `remember_baselines`).
+    """
+    n = len(metrics_data)
+    keys = [
+        series_key(d["project_id"], d.get("sensor_id"), d["metric_type"])
+        for d in metrics_data
+    ]
+    codes: dict[tuple, int] = {}
+    key_codes = np.fromiter((codes.setdefault(k, len(codes)) for k in keys), np.intp, n)
+    values = np.array([d["value"] for d in metrics_data], dtype=np.float64)
+    max_rates = np.array(
+        [MAX_RATE_OF_CHANGE.get(d["metric_type"], np.nan) for d in metrics_data],
+        dtype=np.float64,
+    )
+
+    order = np.lexsort((timestamps, key_codes))
+    sorted_codes = key_codes[order]
+    sorted_values = values[order]
+    sorted_ts = timestamps[order]
+
+    prev_values = np.empty(n, dtype=np.float64)
+    prev_ts = np.empty(n, dtype=np.float64)
+    prev_values[1:] = sorted_values[:-1]
+    prev_ts[1:] = sorted_ts[:-1]
+
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = sorted_codes[1:] != sorted_codes[:-1]
+
+    for pos in np.flatnonzero(starts):
+        cached = last_values.get(keys[order[pos]])
+        prev_ts[pos], prev_values[pos] = cached if cached else (np.nan, np.nan)
+
+    flagged, scores = anomaly_detector.detect_rate_of_change_batch(
+        sorted_values, prev_values, sorted_ts - prev_ts, max_rates[order]
+    )
+
+    is_anomaly = np.empty(n, dtype=bool)
+    roc_scores = np.empty(n, dtype=np.float64)
+    is_anomaly[order] = flagged
+    roc_scores[order] = scores
+    return is_anomaly, roc_scores
+
+
+def score_metrics(
+    metrics_data: list[dict],
+    strategy: AnomalyStrategy | None = None,
+) -> list[dict]:
+    """Annotate metric dicts in place with anomaly scores.
+
+    Rule-based thresholds and rate-of-change checks always apply. The
+    rolling strategy additionally compares each reading with its sensor's
+    recent baseline, and a fitted Isolation Forest model is consulted when
+    one exists for the sensor; it can raise the score but never flags.
+    """
+    if not metrics_data:
+        return metrics_data
+    strategy = AnomalyStrategy(strategy or settings.ANOMALY_STRATEGY)
+
+    project_ids = [d["project_id"] for d in metrics_data]
+    sensor_ids = [d.get("sensor_id") for d in metrics_data]
+    metric_types = [d["metric_type"] for d in metrics_data]
+    values = [d["value"] for d in metrics_data]
+    timestamps = recorded_timestamps(metrics_data)
+    is_anomaly, scores = anomaly_detector.detect_simple_batch(metric_types, values)
+
+    roc_anomaly, roc_scores = check_rate_of_change(metrics_data, timestamps)
+    is_anomaly = is_anomaly | roc_anomaly
+    scores = np.maximum(scores, roc_scores)
+
+    if strategy == AnomalyStrategy.ROLLING:
+        order = np.argsort(timestamps, kind="stable")
+        keys = [
+            series_key(project_id, sensor_id, metric_type)
+            for project_id, sensor_id, metric_type in zip(project_ids, sensor_ids, metric_types)
+        ]
+        rolling_anomaly, rolling_scores, scored = online_detector.score_batch(
+            keys, values, order
+        )
+        is_anomaly = is_anomaly | rolling_anomaly
+        scores = np.where(scored, np.maximum(scores, rolling_scores), scores)
+
+    if settings.ANOMALY_ML_ENABLED:
+        scores = np.maximum(scores, model_registry.outlier_scores(
+            project_ids, sensor_ids, metric_types, values
+        ))
+
+    for d, flagged, score in zip(metrics_data, is_anomaly.tolist(), scores.tolist()):
+        d["is_anomaly"] = flagged
+        d["anomaly_score"] = score
+        d["quality_flag"] = "suspect" if flagged else "good"
+    return metrics_data
+
+
+async def prepare_metrics(
+    session: AsyncSession,
+    metrics_data: list[dict],
+    strategy: AnomalyStrategy | None = None,
+) -> list[dict]:
+    """Warm the last-value cache for the batch's projects, then score it."""
+    await last_values.warm(session, {d["project_id"] for d in metrics_data})
+    return score_metrics(metrics_data, strategy)
+
+
+def remember_baselines(session: AsyncSession, metrics_data: list[dict]) -> None:
+    """Advance the last-value cache and rolling baselines to stored readings
+    once they commit.
+
+    Readings from a rejected or rolled-back write or a dropped buffer
+    batch never become the baseline the next reading is compared with,
+    and a retried batch counts once.
+    """
+    keys = [
+        series_key(d["project_id"], d.get("sensor_id"), d["metric_type"])
+        for d in metrics_data
+    ]
+    timestamps = [as_utc(d["recorded_at"]).timestamp() for d in metrics_data]
+    values = [float(d["value"]) for d in metrics_data]
+
+    async def advance() -> None:
+        for key, timestamp, value in zip(keys, timestamps, values):
+            last_values.put(key, timestamp, value)
+        online_detector.push_batch(keys, values, np.argsort(timestamps, kind="stable"))
+
+    after_commit(session, advance)
+
+
+async def store_metrics(session: AsyncSession, metrics_data: list[dict]) -> int:
+    """Write scored readings and raise the alerts they trigger."""
+    from app.services.rules import rule_engine  # rules imports this module
+
+    count = await batch_create_metrics(session, metrics_data)
+    remember_baselines(session, metrics_data)
+    await rule_engine.evaluate(session, metrics_data)
+    return count
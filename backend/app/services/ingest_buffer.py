@@ -0,0 +1,249 @@
+"""Write-behind buffer for sensor ingestion.
+
+With INGEST_BUFFER_ENABLED the metric routes score readings and hand
+them to this buffer instead of writing them in the request. A background
+task drains the bounded queue in batches of up to INGEST_BUFFER_BATCH_SIZE
+readings, or whatever arrived within INGEST_BUFFER_FLUSH_SECONDS, and
+writes each batch with one bulk insert in its own transaction.
+
+A batch rejected for its data (an integrity or data error) is split in
+halves and retried, so one bad reading costs only itself; readings that
+fail on their own are kept in a bounded dead-letter queue
+(INGEST_BUFFER_DEAD_LETTERS) for inspection. Any other failure, such as
+a lost connection, holds the whole batch and retries it with backoff
+from INGEST_BUFFER_RETRY_SECONDS; meanwhile the queue fills and the
+routes answer 429.
+
+A full queue rejects new readings (the routes answer 429) rather than
+growing without bound. `stop` drains everything queued before returning,
+so a graceful shutdown loses nothing; a crash loses what was still queued.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from app.core.cache import flush_stale
+from app.core.config import get_settings
+from app.services.ingest import store_metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Queued after the last reading to tell the drain task to finish
+_STOP = object()
+
+# SQLSTATE classes of errors a retry cannot fix: data exception, integrity
+# constraint violation
+DATA_ERROR_CLASSES = ("22", "23")
+
+
+def is_data_error(exc: BaseException) -> bool:
+    """Whether the database refused the rows themselves."""
+    for error in (exc, getattr(exc, "orig", None)):
+        sqlstate = getattr(error, "sqlstate", None)
+        if isinstance(sqlstate, str) and sqlstate[:2] in DATA_ERROR_CLASSES:
+            return True
+    return False
+
+
+class BufferFull(Exception):
+    """The ingest queue has no room for the submitted readings."""
+
+
+class IngestBuffer:
+    """Bounded queue of scored readings drained by one background task."""
+
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_seconds: float,
+        dead_letters: int = 1000,
+        retry_seconds: float = 0.5,
+        retry_max_seconds: float = 30.0,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.dead_letters: deque[dict] = deque(maxlen=dead_letters)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._accepting = False
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth,
+            "queue_capacity": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dead_letters": len(self.dead_letters),
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.flushes, 2)
+            if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    def submit(self, metrics_data: list[dict]) -> int:
+        """Queue scored readings; all or none. Raises BufferFull."""
+        if not self._accepting or self.depth + len(metrics_data) > self.max_size:
+            self.rejected += len(metrics_data)
+            raise BufferFull
+        # Stamp readings now, not when the batch is eventually written
+        now = datetime.now(timezone.utc)
+        for d in metrics_data:
+            if d.get("recorded_at") is None:
+                d["recorded_at"] = now
+            self._queue.put_nowait(d)
+        self.accepted += len(metrics_data)
+        return len(metrics_data)
+
+    async def _next_batch(self) -> tuple[list[dict], bool]:
+        """Wait for a reading, then collect until the batch is full or due."""
+        batch: list[dict] = []
+        item = await self._queue.get()
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            if self._queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _write(self, session_factory, batch: list[dict]) -> Exception | None:
+        """Write `batch` in its own transaction; the error if it rolled back."""
+        try:
+            async with session_factory() as session:
+                try:
+                    await store_metrics(session, batch)
+                    await session.commit()
+                except Exception:
+                    await flush_stale(session, committed=False)
+                    raise
+        except Exception as exc:
+            return exc
+        # Committed; flush_stale logs its own failures
+        await flush_stale(session)
+        return None
+
+    async def _write_or_split(self, session_factory, batch: list[dict]) -> int:
+        """Write `batch`, halving it on data errors and retrying it whole on
+        anything else; returns the readings written."""
+        delay = self.retry_seconds
+        while (error := await self._write(session_factory, batch)) is not None:
+            if is_data_error(error):
+                break
+            self.retries += 1
+            logger.warning(
+                "Ingest buffer could not write %d readings (%r); retrying in %.1fs",
+                len(batch), error, delay,
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max_seconds)
+        else:
+            return len(batch)
+        if len(batch) == 1:
+            logger.error("Ingest buffer dropped a reading (%r): %r", error, batch[0])
+            self.failed += 1
+            self.dead_letters.append(batch[0])
+            return 0
+        half = len(batch) // 2
+        return (
+            await self._write_or_split(session_factory, batch[:half])
+            + await self._write_or_split(session_factory, batch[half:])
+        )
+
+    async def flush(self, session_factory, batch: list[dict]) -> None:
+        """Write one batch; only readings that fail on their own are dropped."""
+        started = time.perf_counter()
+        written = await self._write_or_split(session_factory, batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.written += written
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+
+    async def run(self, session_factory) -> None:
+        while True:
+            batch, stopping = await self._next_batch()
+            if batch:
+                # The drain task must outlive any one batch, or the queue
+                # would fill and every ingest would get 429
+                try:
+                    await self.flush(session_factory, batch)
+                except Exception:
+                    logger.exception("Ingest buffer lost a batch of %d readings", len(batch))
+                    self.failed += len(batch)
+                    self.dead_letters.extend(batch)
+            if stopping:
+                return
+
+    def start(self, session_factory) -> None:
+        self._queue = asyncio.Queue()
+        self._accepting = True
+        self._task = asyncio.create_task(self.run(session_factory))
+
+    async def stop(self) -> None:
+        """Stop accepting readings and wait until the queue is written."""
+        if self._task is None:
+            return
+        self._accepting = False
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        logger.info("Ingest buffer drained (%d readings written)", self.written)
+
+
+# Singleton
+ingest_buffer = IngestBuffer(
+    max_size=settings.INGEST_BUFFER_MAX_SIZE,
+    batch_size=settings.INGEST_BUFFER_BATCH_SIZE,
+    flush_seconds=settings.INGEST_BUFFER_FLUSH_SECONDS,
+    dead_letters=settings.INGEST_BUFFER_DEAD_LETTERS,
+    retry_seconds=settings.INGEST_BUFFER_RETRY_SECONDS,
+    retry_max_seconds=settings.INGEST_BUFFER_RETRY_MAX_SECONDS,
+)
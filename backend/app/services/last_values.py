@@ -0,0 +1,68 @@
+"""Bounded in-memory cache of each sensor's most recent reading.
+
+Lets ingestion compare a reading with the previous one (rate-of-change
+checks) without a database round trip.
+"""
+
+from collections import OrderedDict
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+SeriesKey = tuple[int, str, str]
+
+
+def series_key(project_id: int, sensor_id: str | None, metric_type: str) -> SeriesKey:
+    return (project_id, sensor_id or "", metric_type)
+
+
+class LastValueCache:
+    """LRU map of (project_id, sensor_id, metric_type) -> (epoch seconds, value)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[SeriesKey, tuple[float, float]] = OrderedDict()
+        self._warmed_projects: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: SeriesKey) -> tuple[float, float] | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: SeriesKey, timestamp: float, value: float) -> None:
+        """Record a reading unless a newer one is already cached."""
+        current = self._entries.get(key)
+        if current is not None and current[0] > timestamp:
+            return
+        self._entries[key] = (timestamp, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._warmed_projects.clear()
+
+    async def warm(self, session: AsyncSession, project_ids: set[int]) -> None:
+        """Seed the cache from the latest stored readings of unseen projects."""
+        from app.crud.metric import get_latest_metrics
+
+        for project_id in project_ids - self._warmed_projects:
+            for metric in await get_latest_metrics(session, project_id):
+                self.put(
+                    series_key(metric.project_id, metric.sensor_id, metric.metric_type),
+                    metric.recorded_at.timestamp(),
+                    metric.value,
+                )
+            self._warmed_projects.add(project_id)
+
+
+# Singleton
+last_values = LastValueCache(max_entries=settings.LAST_VALUE_CACHE_SIZE)
@@ -0,0 +1,314 @@
+"""Registry of fitted Isolation Forest models, one per sensor series.
+
+Models are keyed by (project_id, sensor_id, metric_type). Ingestion only
+scores against already-fitted models; fitting happens in a background
+task when a series is first seen, when a model ages out, or when its
+observed anomaly rate drifts. Fitted models are persisted with joblib so
+a restart does not force a full retrain. With ANOMALY_REFIT_IN_WORKER
+the fitting runs on the Celery `ml` queue instead, and the API reloads
+the model files the worker writes.
+"""
+
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.anomaly import AnomalyDetector
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ModelKey = tuple[int, str, str]
+
+# Readings scored before the anomaly rate is trusted for drift detection
+DRIFT_MIN_SCORED = 100
+
+
+@dataclass
+class ModelEntry:
+    detector: AnomalyDetector
+    fitted_at: datetime
+    n_samples: int
+    scored: int = 0
+    anomalies: int = 0
+
+    @property
+    def anomaly_rate(self) -> float:
+        return self.anomalies / self.scored if self.scored else 0.0
+
+
+def model_key(project_id: int, sensor_id: str | None, metric_type: str) -> ModelKey:
+    return (project_id, sensor_id or "", metric_type)
+
+
+class ModelRegistry:
+    """Keeps fitted per-sensor models and refits them off the ingest path."""
+
+    def __init__(
+        self,
+        model_dir: str | Path,
+        max_age: timedelta,
+        min_samples: int,
+        history_limit: int,
+        drift_rate: float,
+    ):
+        self.model_dir = Path(model_dir)
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.history_limit = history_limit
+        self.drift_rate = drift_rate
+        self._models: dict[ModelKey, ModelEntry] = {}
+        self._pending: set[ModelKey] = set()
+        self._mtimes: dict[Path, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get(self, key: ModelKey) -> ModelEntry | None:
+        return self._models.get(key)
+
+    @property
+    def pending(self) -> set[ModelKey]:
+        return set(self._pending)
+
+    def request_refit(self, key: ModelKey) -> None:
+        self._pending.add(key)
+
+    # Scoring
+
+    def score_batch(
+        self,
+        project_ids: list[int],
+        sensor_ids: list[str | None],
+        metric_types: list[str],
+        values: list[float] | np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Score a batch against fitted models using decision_function only.
+
+        Returns (is_anomaly, score, scored) arrays; `scored` is False for
+        rows whose series has no fitted model yet. Those series are queued
+        for a background fit.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        is_anomaly = np.zeros(len(values), dtype=bool)
+        scores = np.zeros(len(values), dtype=np.float64)
+        scored = np.zeros(len(values), dtype=bool)
+
+        groups: dict[ModelKey, list[int]] = {}
+        for i, key in enumerate(zip(project_ids, sensor_ids, metric_types)):
+            groups.setdefault(model_key(*key), []).append(i)
+
+        for key, rows in groups.items():
+            entry = self._models.get(key)
+            if entry is None:
+                self._pending.add(key)
+                continue
+            idx = np.array(rows)
+            flagged, group_scores = entry.detector.score_isolation_forest(values[idx])
+            is_anomaly[idx] = flagged
+            scores[idx] = group_scores
+            scored[idx] = True
+            self._observe(key, entry, int(flagged.sum()), len(rows))
+
+        return is_anomaly, scores, scored
+
+    def outlier_scores(
+        self,
+        project_ids: list[int],
+        sensor_ids: list[str | None],
+        metric_types: list[str],
+        values: list[float] | np.ndarray,
+    ) -> np.ndarray:
+        """Model scores of readings outside their model's boundary, 0 elsewhere.
+
+        Models only raise `anomaly_score`; they never flag. With 5%
+        contamination about one normal reading in twenty falls outside
+        the boundary, and scores saturate too early to pick a safer cut.
+        """
+        outside, scores, scored = self.score_batch(project_ids, sensor_ids, metric_types, values)
+        return np.where(outside & scored, scores, 0.0)
+
+    def _observe(self, key: ModelKey, entry: ModelEntry, anomalies: int, n: int) -> None:
+        entry.scored += n
+        entry.anomalies += anomalies
+        if key in self._pending:
+            return
+        if entry.scored >= DRIFT_MIN_SCORED and entry.anomaly_rate > self.drift_rate:
+            logger.info(
+                "Anomaly rate %.2f for %s exceeds drift threshold, scheduling refit",
+                entry.anomaly_rate, key,
+            )
+            self._pending.add(key)
+
+    # Fitting
+
+    def install(self, key: ModelKey, detector: AnomalyDetector, n_samples: int) -> ModelEntry:
+        entry = ModelEntry(
+            detector=detector,
+            fitted_at=datetime.now(timezone.utc),
+            n_samples=n_samples,
+        )
+        self._models[key] = entry
+        self._pending.discard(key)
+        return entry
+
+    async def fit(self, key: ModelKey, values: list[float]) -> ModelEntry | None:
+        """Fit a model for `key` in a worker thread and persist it."""
+        if len(values) < self.min_samples:
+            return None
+        detector = AnomalyDetector()
+        await asyncio.to_thread(detector.fit, values)
+        entry = self.install(key, detector, len(values))
+        await asyncio.to_thread(self.save, key, entry)
+        return entry
+
+    def mark_expired(self) -> None:
+        cutoff = datetime.now(timezone.utc) - self.max_age
+        for key, entry in self._models.items():
+            if entry.fitted_at < cutoff:
+                self._pending.add(key)
+
+    async def refit(self, session_factory, key: ModelKey) -> ModelEntry | None:
+        """Fit `key` from its recent history; None while there is too little."""
+        from app.crud.metric import get_metrics
+
+        project_id, sensor_id, metric_type = key
+        async with session_factory() as session:
+            history = await get_metrics(
+                session,
+                project_id,
+                metric_type,
+                limit=self.history_limit,
+                sensor_id=sensor_id,
+            )
+        return await self.fit(key, [m.value for m in history])
+
+    async def refit_pending(self, session_factory) -> int:
+        """Refit every queued series from its recent history."""
+        refitted = 0
+        for key in list(self._pending):
+            if await self.refit(session_factory, key) is not None:
+                refitted += 1
+            else:
+                # Not enough history yet; the next ingest re-queues it
+                self._pending.discard(key)
+        return refitted
+
+    async def submit_pending(self) -> int:
+        """Hand queued series to the `ml` worker queue instead of fitting here.
+
+        The worker saves what it fits; `load` picks the files up.
+        """
+        from app.worker.jobs import submit
+        from app.worker.tasks.models import refit_models
+
+        keys = sorted(self._pending)
+        if keys:
+            await submit(refit_models, [list(k) for k in keys])
+            self._pending.difference_update(keys)
+        return len(keys)
+
+    # Persistence
+
+    def _path(self, key: ModelKey) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.model_dir / f"{digest}.joblib"
+
+    def save(self, key: ModelKey, entry: ModelEntry) -> None:
+        import joblib
+
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {
+                "key": key,
+                "model": entry.detector._model,
+                "fitted_at": entry.fitted_at,
+                "n_samples": entry.n_samples,
+            },
+            self._path(key),
+        )
+        self._mtimes[self._path(key)] = self._path(key).stat().st_mtime_ns
+
+    def load(self) -> int:
+        """Load persisted models from `model_dir`. Returns the count loaded.
+
+        Files unchanged since they were last loaded are skipped, so this is
+        cheap to call repeatedly to pick up models fitted by other processes.
+        """
+        import joblib
+
+        if not self.model_dir.is_dir():
+            return 0
+        loaded = 0
+        for path in self.model_dir.glob("*.joblib"):
+            mtime = path.stat().st_mtime_ns
+            if self._mtimes.get(path) == mtime:
+                continue
+            self._mtimes[path] = mtime
+            try:
+                payload = joblib.load(path)
+            except Exception:
+                logger.warning("Skipping unreadable model file %s", path)
+                continue
+            detector = AnomalyDetector()
+            detector._model = payload["model"]
+            detector._is_fitted = True
+            self._models[tuple(payload["key"])] = ModelEntry(
+                detector=detector,
+                fitted_at=payload["fitted_at"],
+                n_samples=payload["n_samples"],
+            )
+            loaded += 1
+        return loaded
+
+    # Background task
+
+    async def run(self, session_factory, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                self.mark_expired()
+                if settings.ANOMALY_REFIT_IN_WORKER:
+                    loaded = await asyncio.to_thread(self.load)
+                    submitted = await self.submit_pending()
+                    if loaded or submitted:
+                        logger.info("Loaded %d anomaly models, sent %d to refit",
+                                    loaded, submitted)
+                    continue
+                refitted = await self.refit_pending(session_factory)
+                if refitted:
+                    logger.info("Refitted %d anomaly models", refitted)
+            except Exception:
+                logger.exception("Anomaly model refit failed")
+
+    def start(self, session_factory, interval_seconds: float) -> None:
+        loaded = self.load()
+        if loaded:
+            logger.info("Loaded %d anomaly models from %s", loaded, self.model_dir)
+        self._task = asyncio.create_task(self.run(session_factory, interval_seconds))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton
+model_registry = ModelRegistry(
+    model_dir=settings.ANOMALY_MODEL_DIR,
+    max_age=timedelta(hours=settings.ANOMALY_MODEL_MAX_AGE_HOURS),
+    min_samples=settings.ANOMALY_MODEL_MIN_SAMPLES,
+    history_limit=settings.ANOMALY_MODEL_HISTORY_LIMIT,
+    drift_rate=settings.ANOMALY_MODEL_DRIFT_RATE,
+)
@@ -0,0 +1,357 @@
+"""Alert notifications: outbox, pooled SMTP, digests and concurrent SMS.
+
+Opening an alert only queues outbox rows (`enqueue`) in the ingest
+transaction and wakes the dispatcher once it commits; nothing is sent
+inside a request. A background task claims due rows in batches of
+NOTIFY_BATCH_SIZE, sends them and records the outcome:
+
+- email: new rows wait NOTIFY_DIGEST_SECONDS, then all pending emails of
+  a recipient go out as one digest. Messages share one long-lived SMTP
+  connection that is reopened only when the server drops it.
+- sms: sent right away, NOTIFY_SMS_CONCURRENCY requests at a time over
+  one pooled HTTP client.
+- failures retry with exponential backoff from NOTIFY_RETRY_SECONDS and
+  are marked failed after NOTIFY_MAX_ATTEMPTS.
+
+Claims use FOR UPDATE SKIP LOCKED, so every API worker can run a
+dispatcher against the same outbox. A claim is a lease of
+NOTIFY_LEASE_SECONDS, renewed while the batch is still sending, so slow
+SMTP servers never let another worker send the same rows again.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+import aiosmtplib
+import httpx
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import after_commit
+from app.core.config import get_settings
+from app.crud.alert import get_alerts
+from app.crud.notification import (
+    claim_notifications,
+    enqueue_notifications,
+    finish_notifications,
+    renew_notifications,
+)
+from app.models.alert import Alert
+from app.models.notification import Notification, NotificationChannel, NotificationStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+EMAIL = NotificationChannel.EMAIL.value
+SMS = NotificationChannel.SMS.value
+SMS_MAX_LENGTH = 160
+
+
+def alert_line(alert: Alert) -> str:
+    return f"[{alert.severity.upper()}] {alert.title}: {alert.message}"
+
+
+def compose_email(sender: str, recipient: str, alerts: list[Alert]) -> EmailMessage:
+    """One email for one alert, or a digest for several."""
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = recipient
+    if len(alerts) == 1:
+        message["Subject"] = f"[{alerts[0].severity.upper()}] {alerts[0].title}"
+    else:
+        message["Subject"] = f"{len(alerts)} new water alerts"
+    message.set_content("\n".join(
+        f"{alert.created_at:%Y-%m-%d %H:%M} UTC  {alert_line(alert)}" for alert in alerts
+    ))
+    return message
+
+
+class SmtpSender:
+    """Sends email over one long-lived SMTP connection, reconnecting on demand."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.connects = 0
+        self._smtp: aiosmtplib.SMTP | None = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        # STARTTLS is used whenever the server offers it
+        smtp = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout)
+        await smtp.connect()
+        if self.username:
+            await smtp.login(self.username, self.password)
+        self.connects += 1
+        return smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        async with self._lock:
+            for retry in (False, True):
+                if self._smtp is None or not self._smtp.is_connected:
+                    self._smtp = await self._connect()
+                try:
+                    await self._smtp.send_message(message)
+                    return
+                except aiosmtplib.SMTPServerDisconnected:
+                    # Idle connections get closed by the server; retry once
+                    self._smtp = None
+                    if retry:
+                        raise
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._smtp is not None and self._smtp.is_connected:
+                try:
+                    await self._smtp.quit()
+                except aiosmtplib.SMTPException:
+                    self._smtp.close()
+            self._smtp = None
+
+
+class SmsSender:
+    """Posts SMS to an HTTP gateway with at most `concurrency` requests in flight."""
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str = "",
+        concurrency: int = 10,
+        timeout: float = 10.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.url = url
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency),
+            transport=transport,
+        )
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def send(self, to: str, text: str) -> None:
+        async with self._slots:
+            response = await self.client.post(
+                self.url, json={"to": to, "message": text}, headers=self.headers
+            )
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class NotificationDispatcher:
+    """Drains the notification outbox in the background."""
+
+    def __init__(
+        self,
+        sender: str = "alerts@localhost",
+        batch_size: int = 500,
+        poll_seconds: float = 5.0,
+        digest_seconds: float = 60.0,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 5,
+        retry_seconds: float = 30.0,
+    ):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.digest_seconds = digest_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.email: SmtpSender | None = None
+        self.sms: SmsSender | None = None
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        self.failed = 0
+        self.digests = 0
+
+    @property
+    def channels(self) -> set[str]:
+        return {channel for channel, s in ((EMAIL, self.email), (SMS, self.sms)) if s}
+
+    def use_senders(self, email: SmtpSender | None = None, sms: SmsSender | None = None) -> None:
+        self.email = email
+        self.sms = sms
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "channels": sorted(self.channels),
+            "sent": self.sent,
+            "failed": self.failed,
+            "digests": self.digests,
+            "smtp_connects": self.email.connects if self.email else 0,
+        }
+
+    async def enqueue(self, session: AsyncSession, alert_ids: dict[str, list[int]]) -> int:
+        """Queue alerts for delivery in the caller's transaction."""
+        wanted = {c: ids for c, ids in alert_ids.items() if ids and c in self.channels}
+        if not wanted:
+            return 0
+        queued = await enqueue_notifications(
+            session, wanted, {EMAIL: self.digest_seconds, SMS: 0.0}
+        )
+        if queued:
+            after_commit(session, self.wake)
+        return queued
+
+    async def wake(self) -> None:
+        self._wake.set()
+
+    async def deliver(
+        self, claimed: list[Notification], alerts: dict[int, Alert]
+    ) -> dict[int, str]:
+        """Send claimed rows; returns the error of each row that failed."""
+        errors: dict[int, str] = {}
+        digests: dict[str, list[Notification]] = defaultdict(list)
+        texts: list[Notification] = []
+        for n in claimed:
+            (digests[n.recipient] if n.channel == EMAIL else texts).append(n)
+
+        async def send_digest(recipient: str, rows: list[Notification]) -> None:
+            try:
+                if self.email is None:
+                    raise RuntimeError("email is not configured")
+                message = compose_email(
+                    self.sender, recipient, [alerts[n.alert_id] for n in rows]
+                )
+                await self.email.send(message)
+                self.digests += len(rows) > 1
+            except Exception as exc:
+                errors.update((n.id, repr(exc)) for n in rows)
+
+        async def send_text(n: Notification) -> None:
+            try:
+                if self.sms is None:
+                    raise RuntimeError("SMS is not configured")
+                await self.sms.send(n.recipient, alert_line(alerts[n.alert_id])[:SMS_MAX_LENGTH])
+            except Exception as exc:
+                errors[n.id] = repr(exc)
+
+        await asyncio.gather(
+            *(send_digest(recipient, rows) for recipient, rows in digests.items()),
+            *(send_text(n) for n in texts),
+        )
+        return errors
+
+    def _outcome(self, n: Notification, error: str | None, now: datetime) -> tuple:
+        if error is None:
+            self.sent += 1
+            return n.id, NotificationStatus.SENT.value, None, now
+        if n.attempts >= self.max_attempts:
+            self.failed += 1
+            logger.warning("Giving up on notification %s: %s", n.id, error)
+            return n.id, NotificationStatus.FAILED.value, error, now
+        backoff = timedelta(seconds=self.retry_seconds * 2 ** (n.attempts - 1))
+        return n.id, NotificationStatus.PENDING.value, error, now + backoff
+
+    async def dispatch(self, session_factory) -> int:
+        """Claim, send and settle one batch. Returns the number of rows claimed."""
+        async with session_factory() as session:
+            claimed = await claim_notifications(session, self.batch_size, self.lease_seconds)
+            alerts = {a.id: a for a in await get_alerts(session, {n.alert_id for n in claimed})}
+            await session.commit()
+        if not claimed:
+            return 0
+        renewal = asyncio.create_task(self._renew_leases(session_factory, claimed))
+        try:
+            errors = await self.deliver(claimed, alerts)
+        finally:
+            renewal.cancel()
+            try:
+                await renewal
+            except asyncio.CancelledError:
+                pass
+        now = datetime.now(timezone.utc)
+        async with session_factory() as session:
+            await finish_notifications(
+                session, [self._outcome(n, errors.get(n.id), now) for n in claimed]
+            )
+            await session.commit()
+        return len(claimed)
+
+    async def _renew_leases(self, session_factory, claimed: list[Notification]) -> None:
+        """Renew the claim every third of a lease until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with session_factory() as session:
+                    await renew_notifications(session, claimed, self.lease_seconds)
+                    await session.commit()
+            except Exception:
+                logger.exception("Could not renew notification leases")
+
+    # Background task
+
+    async def run(self, session_factory) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.dispatch(session_factory) >= self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Notification dispatch failed")
+
+    def configure(self) -> None:
+        """Create senders for the gateways in settings, unless already set."""
+        if self.email is None and settings.SMTP_HOST:
+            self.email = SmtpSender(
+                settings.SMTP_HOST, settings.SMTP_PORT,
+                settings.SMTP_USER, settings.SMTP_PASSWORD,
+            )
+        if self.sms is None and settings.SMS_API_URL:
+            self.sms = SmsSender(
+                settings.SMS_API_URL, settings.SMS_API_KEY, settings.NOTIFY_SMS_CONCURRENCY
+            )
+
+    def start(self, session_factory) -> None:
+        self.configure()
+        if not self.channels:
+            logger.info("No SMTP or SMS gateway configured; notifications are off")
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self.run(session_factory))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for sender in (self.email, self.sms):
+            if sender is not None:
+                await sender.close()
+        self.email = self.sms = None
+
+
+# Singleton
+notification_dispatcher = NotificationDispatcher(
+    sender=settings.SMTP_FROM,
+    batch_size=settings.NOTIFY_BATCH_SIZE,
+    poll_seconds=settings.NOTIFY_POLL_SECONDS,
+    digest_seconds=settings.NOTIFY_DIGEST_SECONDS,
+    lease_seconds=settings.NOTIFY_LEASE_SECONDS,
+    max_attempts=settings.NOTIFY_MAX_ATTEMPTS,
+    retry_seconds=settings.NOTIFY_RETRY_SECONDS,
+)
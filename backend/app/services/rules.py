@@ -0,0 +1,468 @@
+"""Alert rule engine evaluated on every ingested batch.
+
+Active AlertRules are loaded once and compiled per condition into one
+array sorted by (group, threshold), where a group is a metric type plus
+a scope (one project, one tenant, or global). The rules a value fires
+within its group form one contiguous slice, so a whole batch costs one
+`np.searchsorted` per condition. Cost grows with the readings and the
+alerts raised, not with the number of rules.
+
+Windowed rules (`aggregate` over `window_seconds`) compare the avg, min
+or max of each sensor's recent readings instead of a single reading.
+They keep a SlidingWindow per (rule, project, sensor) in memory, so they
+never query metrics. A window only fires once its readings span the
+whole window, so a restart or a new sensor cannot trigger on one reading.
+
+A rule fires at most once per (project, sensor) per batch, on the newest
+matching reading. Firings then go through the AlertTracker, which keeps
+one open alert per series and decides when it opens, repeats and closes.
+A series stops breaching only once its newest reading is past the
+threshold by ALERT_CLEAR_MARGIN (relative), so values hovering at the
+threshold do not flap. Alerts that open are queued for email/SMS through
+the notification outbox. Rules are reloaded after `create_alert_rule` commits
+and every RULE_ENGINE_REFRESH_SECONDS, so other workers pick up changes.
+"""
+
+import asyncio
+import logging
+import operator
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import get_settings
+from app.crud.alert import get_alert_rules, set_alerts_status, upsert_rule_alerts
+from app.models.alert import Alert, AlertRule, AlertStatus
+from app.models.project import WaterProject
+from app.services.alert_state import AlertTracker, Changes, SeriesKey, alert_tracker
+from app.services.ingest import recorded_timestamps
+from app.services.notifications import NotificationDispatcher, notification_dispatcher
+from app.services.sliding_window import AGGREGATES, WindowStore
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+THRESHOLD_CONDITIONS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "eq": "="}
+OPERATORS = {
+    "gt": operator.gt, "gte": operator.ge, "lt": operator.lt,
+    "lte": operator.le, "eq": operator.eq,
+}
+ANOMALY = "anomaly"
+
+# (metric_type, scope kind, scope id)
+GroupKey = tuple[str, str, int | None]
+
+
+class CompiledRule(NamedTuple):
+    id: int
+    name: str
+    metric_type: str
+    condition: str
+    threshold: float | None
+    severity: str
+    aggregate: str | None = None
+    window_seconds: int | None = None
+    notify_email: bool = False
+    notify_sms: bool = False
+
+
+@dataclass
+class CompiledRules:
+    """Rules laid out for batch evaluation.
+
+    `keys[condition]` holds complex numbers `group + 1j * threshold`;
+    numpy orders complex values by real then imaginary part, so one sorted
+    array serves every group. `positions` maps each key back to `rules`.
+    Windowed rules are listed per group in `windowed` instead.
+    """
+
+    rules: list[CompiledRule] = field(default_factory=list)
+    group_ids: dict[GroupKey, int] = field(default_factory=dict)
+    keys: dict[str, np.ndarray] = field(default_factory=dict)
+    positions: dict[str, np.ndarray] = field(default_factory=dict)
+    windowed: dict[int, list[int]] = field(default_factory=lambda: defaultdict(list))
+
+
+def _scope(rule: AlertRule) -> tuple[str, int | None]:
+    if rule.project_id is not None:
+        return "project", rule.project_id
+    if rule.tenant_id is not None:
+        return "tenant", rule.tenant_id
+    return "global", None
+
+
+def _complex(groups: np.ndarray, values: np.ndarray | float) -> np.ndarray:
+    keys = np.empty(len(groups), dtype=np.complex128)
+    keys.real = groups
+    keys.imag = values
+    return keys
+
+
+def compile_rules(rules: Iterable[AlertRule]) -> CompiledRules:
+    """Index rules by (metric_type, scope); skips rules that cannot fire."""
+    compiled = CompiledRules()
+    members: dict[str, list[tuple[int, float, int]]] = defaultdict(list)
+    for rule in rules:
+        windowed = rule.aggregate is not None
+        if (rule.condition != ANOMALY or windowed) and (
+            rule.condition not in THRESHOLD_CONDITIONS or rule.threshold is None
+        ) or windowed and (rule.aggregate not in AGGREGATES or not rule.window_seconds):
+            logger.warning("Skipping alert rule %s: cannot evaluate %r", rule.id, rule.condition)
+            continue
+        group = compiled.group_ids.setdefault(
+            (rule.metric_type, *_scope(rule)), len(compiled.group_ids)
+        )
+        if windowed:
+            compiled.windowed[group].append(len(compiled.rules))
+        else:
+            threshold = 0.0 if rule.condition == ANOMALY else rule.threshold
+            members[rule.condition].append((group, threshold, len(compiled.rules)))
+        compiled.rules.append(CompiledRule(
+            rule.id, rule.name, rule.metric_type, rule.condition,
+            rule.threshold, rule.severity, rule.aggregate, rule.window_seconds,
+            rule.notify_email, rule.notify_sms,
+        ))
+
+    for condition, entries in members.items():
+        groups, thresholds, positions = (np.array(column) for column in zip(*entries))
+        keys = _complex(groups, thresholds)
+        order = np.argsort(keys, kind="stable")
+        compiled.keys[condition] = keys[order]
+        compiled.positions[condition] = positions[order].astype(np.intp)
+    return compiled
+
+
+def _slices(condition: str, keys: np.ndarray, groups: np.ndarray, values: np.ndarray):
+    """[lo, hi) into `keys` of the rules each (group, value) pair fires."""
+    probe = _complex(groups, values)
+    if condition in ("gt", "gte", ANOMALY):
+        lo = np.searchsorted(keys, _complex(groups, -np.inf), "left")
+    elif condition == "lt":  # threshold > value
+        lo = np.searchsorted(keys, probe, "right")
+    else:
+        lo = np.searchsorted(keys, probe, "left")
+    if condition in ("lt", "lte", ANOMALY):
+        hi = np.searchsorted(keys, _complex(groups, np.inf), "right")
+    elif condition == "gt":  # threshold < value
+        hi = np.searchsorted(keys, probe, "left")
+    else:
+        hi = np.searchsorted(keys, probe, "right")
+    return lo, hi
+
+
+def _expand(readings: np.ndarray, lo: np.ndarray, hi: np.ndarray):
+    """Flatten per-reading slices into (reading, key position) pairs."""
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    starts = np.cumsum(counts) - counts
+    offsets = np.arange(total) - np.repeat(starts - lo, counts)
+    return np.repeat(readings, counts), offsets
+
+
+class RuleEngine:
+    """Compiled snapshot of active alert rules plus project -> tenant map."""
+
+    def __init__(
+        self,
+        refresh_seconds: float = 60.0,
+        enabled: bool = True,
+        max_windows: int = 100_000,
+        clear_margin: float = 0.05,
+        tracker: AlertTracker | None = None,
+        notifier: NotificationDispatcher | None = None,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.enabled = enabled
+        self.clear_margin = clear_margin
+        self.compiled = CompiledRules()
+        self.windows = WindowStore(max_windows)
+        self.tracker = tracker or AlertTracker()
+        self.notifier = notifier
+        self._positions: dict[int, int] = {}
+        self._tenants: dict[int, int | None] = {}
+        self._has_tenant_rules = False
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def rules(self) -> list[CompiledRule]:
+        return self.compiled.rules
+
+    def use_rules(self, rules: Iterable[AlertRule]) -> None:
+        self.compiled = compile_rules(rules)
+        self._positions = {rule.id: i for i, rule in enumerate(self.compiled.rules)}
+        self._has_tenant_rules = any(
+            kind == "tenant" for _, kind, _ in self.compiled.group_ids
+        )
+        self._tenants.clear()
+
+    async def invalidate(self) -> None:
+        """Reload rules before the next evaluation."""
+        self._loaded_at = None
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or (
+            time.monotonic() - self._loaded_at >= self.refresh_seconds
+        )
+
+    async def load(self, session: AsyncSession) -> None:
+        self.use_rules(await get_alert_rules(session))
+        self._loaded_at = time.monotonic()
+        logger.info(
+            "Loaded %d alert rules in %d groups",
+            len(self.rules), len(self.compiled.group_ids),
+        )
+
+    async def _project_tenants(self, session: AsyncSession, project_ids: set[int]) -> dict:
+        missing = project_ids - self._tenants.keys()
+        if missing:
+            result = await session.exec(
+                select(WaterProject.id, WaterProject.tenant_id).where(
+                    WaterProject.id.in_(missing)
+                )
+            )
+            self._tenants.update(dict(result.all()))
+        return self._tenants
+
+    def match(
+        self, metrics_data: list[dict], tenants: dict[int, int | None] | None = None
+    ) -> list[tuple[int, int, float]]:
+        """(rule position, reading index, compared value) per rule/project/sensor.
+
+        The compared value is the reading itself, or the window aggregate
+        for windowed rules.
+        """
+        group_ids = self.compiled.group_ids
+        pair_readings: list[int] = []
+        pair_groups: list[int] = []
+        for i, d in enumerate(metrics_data):
+            metric_type, project_id = d["metric_type"], d["project_id"]
+            tenant_id = tenants.get(project_id) if tenants else None
+            for key in (
+                (metric_type, "global", None),
+                (metric_type, "project", project_id),
+                (metric_type, "tenant", tenant_id) if tenant_id is not None else None,
+            ):
+                group = group_ids.get(key)
+                if group is not None:
+                    pair_readings.append(i)
+                    pair_groups.append(group)
+        if not pair_readings:
+            return []
+
+        timestamps = recorded_timestamps(metrics_data)
+        all_values = np.array([d["value"] for d in metrics_data], dtype=np.float64)
+        readings = np.array(pair_readings, dtype=np.intp)
+        groups = np.array(pair_groups, dtype=np.float64)
+        values = all_values[readings]
+        fired_readings = [np.empty(0, dtype=np.intp)]
+        fired_rules = [np.empty(0, dtype=np.intp)]
+        for condition, keys in self.compiled.keys.items():
+            if condition == ANOMALY:
+                flagged = np.array(
+                    [bool(metrics_data[i].get("is_anomaly")) for i in pair_readings]
+                )
+                lo, hi = _slices(condition, keys, groups[flagged], values[flagged])
+                hit, at = _expand(readings[flagged], lo, hi)
+            else:
+                lo, hi = _slices(condition, keys, groups, values)
+                hit, at = _expand(readings, lo, hi)
+            fired_readings.append(hit)
+            fired_rules.append(self.compiled.positions[condition][at])
+
+        hit = np.concatenate(fired_readings)
+        fired = zip(
+            np.concatenate(fired_rules).tolist(), hit.tolist(), all_values[hit].tolist()
+        )
+        if self.compiled.windowed:
+            fired = [*fired, *self._match_windows(
+                metrics_data, pair_readings, pair_groups, timestamps
+            )]
+
+        # Newest matching reading per (rule, project, sensor)
+        newest: dict[tuple, tuple[float, int, float]] = {}
+        for rule, i, value in fired:
+            d = metrics_data[i]
+            key = (rule, d["project_id"], d.get("sensor_id") or "")
+            candidate = (timestamps[i], i, value)
+            if key not in newest or candidate[:2] > newest[key][:2]:
+                newest[key] = candidate
+        return sorted((key[0], i, value) for key, (_, i, value) in newest.items())
+
+    def _match_windows(
+        self,
+        metrics_data: list[dict],
+        pair_readings: list[int],
+        pair_groups: list[int],
+        timestamps: np.ndarray,
+    ) -> list[tuple[int, int, float]]:
+        """Advance each windowed rule's sensor windows in time order."""
+        windowed = self.compiled.windowed
+        pairs = [
+            (timestamps[i], i, group)
+            for i, group in zip(pair_readings, pair_groups)
+            if group in windowed
+        ]
+        pairs.sort()
+        fired = []
+        for ts, i, group in pairs:
+            d = metrics_data[i]
+            for position in windowed[group]:
+                rule = self.rules[position]
+                window = self.windows.get(
+                    (rule.id, d["project_id"], d.get("sensor_id") or ""), rule.window_seconds
+                )
+                if not window.push(ts, d["value"]) or not window.covered:
+                    continue
+                value = window.aggregate(rule.aggregate)
+                if OPERATORS[rule.condition](value, rule.threshold):
+                    fired.append((position, i, value))
+        return fired
+
+    def clears(self, rule: CompiledRule, key: SeriesKey, d: dict) -> bool:
+        """Whether reading `d` is past the rule's threshold by the clear margin."""
+        if rule.condition == ANOMALY:
+            return not d.get("is_anomaly")
+        value = d["value"]
+        if rule.aggregate:
+            window = self.windows.get(key, rule.window_seconds)
+            if not window:
+                return False
+            value = window.aggregate(rule.aggregate)
+        margin = self.clear_margin * abs(rule.threshold)
+        if rule.condition == "eq":
+            return abs(value - rule.threshold) > margin
+        # Move the threshold toward the clear side, then test for a breach
+        shifted = rule.threshold - margin if rule.condition in ("gt", "gte") else (
+            rule.threshold + margin
+        )
+        return not OPERATORS[rule.condition](value, shifted)
+
+    def _settle(self, changes: Changes, metrics_data: list[dict], fired: set) -> None:
+        """Give tracked series that saw readings but did not fire a verdict."""
+        tracker = self.tracker
+        timestamps = recorded_timestamps(metrics_data)
+        newest: dict[tuple, int] = {}
+        for i, d in enumerate(metrics_data):
+            series = (d["project_id"], d.get("sensor_id") or "", d["metric_type"])
+            if tracker.tracked(series) and (
+                series not in newest or timestamps[i] >= timestamps[newest[series]]
+            ):
+                newest[series] = i
+        for series, i in newest.items():
+            for key in list(tracker.tracked(series)):
+                position = self._positions.get(key[0])
+                if key in fired or position is None:
+                    continue
+                rule = self.rules[position]
+                tracker.settle(changes, key, self.clears(rule, key, metrics_data[i]))
+
+    def alert_data(self, rule: CompiledRule, d: dict, value: float) -> dict:
+        sensor = f" at {d['sensor_id']}" if d.get("sensor_id") else ""
+        if rule.condition == ANOMALY:
+            message = f"Anomalous {rule.metric_type} reading{sensor}: {value:g} {d['unit']}"
+        else:
+            over = ""
+            if rule.aggregate:
+                over = f" {rule.aggregate} over {rule.window_seconds:g}s"
+            message = (
+                f"{rule.metric_type.capitalize()}{sensor}{over}: {value:g} {d['unit']} "
+                f"{THRESHOLD_CONDITIONS[rule.condition]} {rule.threshold:g}"
+            )
+        return {
+            "project_id": d["project_id"],
+            "rule_id": rule.id,
+            "title": rule.name,
+            "message": message,
+            "severity": rule.severity,
+            "alert_type": ANOMALY if rule.condition == ANOMALY else "threshold",
+            "metric_type": rule.metric_type,
+            "metric_value": float(value),
+            "threshold_value": rule.threshold,
+            "sensor_id": d.get("sensor_id"),
+            "last_seen_at": d.get("recorded_at") or datetime.now(timezone.utc),
+        }
+
+    async def evaluate(self, session: AsyncSession, metrics_data: list[dict]) -> list[Alert]:
+        """Apply a stored batch to alert state in the caller's transaction.
+
+        Returns the alerts opened or re-activated by this batch.
+        """
+        if not self.enabled or not metrics_data:
+            return []
+        if self._stale():
+            async with self._lock:
+                if self._stale():
+                    await self.load(session)
+        if not self.rules:
+            return []
+
+        tenants = None
+        if self._has_tenant_rules:
+            tenants = await self._project_tenants(
+                session, {d["project_id"] for d in metrics_data}
+            )
+        tracker = self.tracker
+        await tracker.load(session)
+        changes = Changes()
+        fired = set()
+        for rule, i, value in self.match(metrics_data, tenants):
+            data = self.alert_data(self.rules[rule], metrics_data[i], value)
+            key = (data["rule_id"], data["project_id"], data["sensor_id"] or "")
+            fired.add(key)
+            tracker.breach(changes, key, data)
+        if tracker.has_tracked:
+            self._settle(changes, metrics_data, fired)
+
+        opened = await upsert_rule_alerts(session, changes.opened)
+        tracker.opened(opened, session)
+        activated = await set_alerts_status(session, changes.activated, AlertStatus.ACTIVE)
+        tracker.activated(session, changes.activated)
+        # Rows that merged into another worker's open alert were already notified
+        notify = [
+            a for a in opened if a.occurrences == 1 and a.status == AlertStatus.ACTIVE.value
+        ] + activated
+        if notify and self.notifier is not None:
+            await self.notifier.enqueue(session, self._recipients_by_channel(notify))
+        if changes.resolved:
+            # Write their counted repeats before they close
+            await tracker.flush(session, changes.resolved)
+            states = [tracker.get(key) for key in changes.resolved]
+            resolve = [s.alert_id for s in states if s and s.alert_id is not None]
+            await set_alerts_status(session, resolve, AlertStatus.RESOLVED)
+            tracker.closed(changes.resolved, session)
+        return opened + activated
+
+    def _recipients_by_channel(self, alerts: list[Alert]) -> dict[str, list[int]]:
+        """Alert ids per notification channel, from each alert's rule."""
+        by_channel: dict[str, list[int]] = {"email": [], "sms": []}
+        for alert in alerts:
+            position = self._positions.get(alert.rule_id)
+            if position is None:
+                continue
+            rule = self.rules[position]
+            if rule.notify_email:
+                by_channel["email"].append(alert.id)
+            if rule.notify_sms:
+                by_channel["sms"].append(alert.id)
+        return by_channel
+
+
+# Singleton
+rule_engine = RuleEngine(
+    refresh_seconds=settings.RULE_ENGINE_REFRESH_SECONDS,
+    enabled=settings.RULE_ENGINE_ENABLED,
+    max_windows=settings.RULE_WINDOW_MAX_SERIES,
+    clear_margin=settings.ALERT_CLEAR_MARGIN,
+    tracker=alert_tracker,
+    notifier=notification_dispatcher,
+)
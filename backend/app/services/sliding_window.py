@@ -0,0 +1,105 @@
+"""Time-based sliding windows with O(1) amortized avg/min/max.
+
+Each window holds the readings of one series from the last `seconds`.
+A running sum gives the average; monotonic deques keep the current
+minimum and maximum at their fronts. Pushing a reading and evicting
+expired ones is amortized O(1), so evaluating a windowed alert rule
+never needs to re-read the metrics table.
+"""
+
+from collections import OrderedDict, deque
+
+AGGREGATES = ("avg", "min", "max")
+
+
+class SlidingWindow:
+    """Readings with timestamps in (newest - seconds, newest]."""
+
+    __slots__ = ("seconds", "since", "readings", "total", "evicted", "mins", "maxs")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.since: float | None = None  # start of the current unbroken run
+        self.readings: deque[tuple[float, float]] = deque()
+        self.total = 0.0
+        self.evicted = 0
+        # Candidates for min/max; values increase (mins) or decrease (maxs)
+        self.mins: deque[tuple[float, float]] = deque()
+        self.maxs: deque[tuple[float, float]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.readings)
+
+    @property
+    def covered(self) -> bool:
+        """True once readings span a whole window (sustained, not a blip).
+
+        A gap of `seconds` or more with no readings starts a new run, so a
+        lone reading after a silence is never covered.
+        """
+        return bool(self.readings) and self.readings[-1][0] - self.since >= self.seconds
+
+    def push(self, ts: float, value: float) -> bool:
+        """Add a reading; False (ignored) if older than the newest one."""
+        if self.readings and ts < self.readings[-1][0]:
+            return False
+        entry = (ts, value)
+        self.readings.append(entry)
+        self.total += value
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append(entry)
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.maxs.append(entry)
+
+        cutoff = ts - self.seconds
+        while self.readings[0][0] <= cutoff:
+            old = self.readings.popleft()
+            self.total -= old[1]
+            self.evicted += 1
+            if self.mins[0] is old:
+                self.mins.popleft()
+            if self.maxs[0] is old:
+                self.maxs.popleft()
+        if len(self.readings) == 1:
+            # Everything before expired: the run restarts here
+            self.since = ts
+        # Re-add from scratch now and then so float error cannot accumulate;
+        # doing it once per window's worth of evictions keeps it amortized O(1)
+        if self.evicted >= len(self.readings):
+            self.total = sum(v for _, v in self.readings)
+            self.evicted = 0
+        return True
+
+    def aggregate(self, kind: str) -> float:
+        if kind == "avg":
+            return self.total / len(self.readings)
+        if kind == "min":
+            return self.mins[0][1]
+        if kind == "max":
+            return self.maxs[0][1]
+        raise ValueError(f"Unknown aggregate: {kind!r}")
+
+
+class WindowStore:
+    """LRU map of (rule id, project id, sensor id) -> SlidingWindow."""
+
+    def __init__(self, max_windows: int):
+        self.max_windows = max_windows
+        self._windows: OrderedDict[tuple, SlidingWindow] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def get(self, key: tuple, seconds: float) -> SlidingWindow:
+        window = self._windows.get(key)
+        if window is None or window.seconds != seconds:
+            window = self._windows[key] = SlidingWindow(seconds)
+        self._windows.move_to_end(key)
+        if len(self._windows) > self.max_windows:
+            self._windows.popitem(last=False)
+        return window
+
+    def clear(self) -> None:
+        self._windows.clear()
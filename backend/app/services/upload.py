@@ -0,0 +1,99 @@
+"""Chunked CSV/Excel readers for bulk metric uploads.
+
+Files are consumed a chunk of rows at a time so memory stays flat
+regardless of upload size.
+"""
+
+from collections.abc import Iterator
+from itertools import islice
+from typing import BinaryIO
+
+import pandas as pd
+
+REQUIRED_COLUMNS = {"project_id", "metric_type", "value", "unit"}
+
+
+def iter_upload_chunks(
+    fileobj: BinaryIO, suffix: str, chunk_rows: int
+) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of at most `chunk_rows` rows from an uploaded file."""
+    if suffix == "csv":
+        yield from pd.read_csv(fileobj, chunksize=chunk_rows)
+    elif suffix == "xlsx":
+        yield from _iter_xlsx_chunks(fileobj, chunk_rows)
+    else:
+        # Legacy .xls cannot be read incrementally
+        df = pd.read_excel(fileobj)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _iter_xlsx_chunks(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        while batch := list(islice(rows, chunk_rows)):
+            yield pd.DataFrame.from_records(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def prepare_chunk(df: pd.DataFrame) -> tuple[list[dict], int]:
+    """Validate a chunk column-wise and convert it to metric dicts.
+
+    Rows with a missing or non-numeric project_id/value, or a missing
+    metric_type/unit, are dropped. Returns (metrics_data, rejected_count).
+    """
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        raise ValueError(f"CSV must contain columns: {REQUIRED_COLUMNS}")
+
+    project_ids = pd.to_numeric(df["project_id"], errors="coerce")
+    values = pd.to_numeric(df["value"], errors="coerce")
+    valid = (
+        project_ids.notna()
+        & values.notna()
+        & df["metric_type"].notna()
+        & df["unit"].notna()
+    )
+
+    recorded_at = None
+    if "recorded_at" in df.columns:
+        recorded_at = pd.to_datetime(df["recorded_at"], utc=True, errors="coerce")
+        valid &= recorded_at.notna() | df["recorded_at"].isna()
+
+    df = df[valid]
+    n = len(df)
+    sensor_ids = (
+        df["sensor_id"].astype(str).tolist() if "sensor_id" in df.columns else [""] * n
+    )
+    timestamps = (
+        [None if pd.isna(ts) else ts.to_pydatetime() for ts in recorded_at[valid]]
+        if recorded_at is not None
+        else [None] * n
+    )
+
+    metrics_data = [
+        {
+            "project_id": project_id,
+            "metric_type": metric_type,
+            "value": value,
+            "unit": unit,
+            "sensor_id": sensor_id,
+            "recorded_at": ts,
+        }
+        for project_id, metric_type, value, unit, sensor_id, ts in zip(
+            project_ids[valid].astype(int).tolist(),
+            df["metric_type"].astype(str).tolist(),
+            values[valid].astype(float).tolist(),
+            df["unit"].astype(str).tolist(),
+            sensor_ids,
+            timestamps,
+        )
+    ]
+    return metrics_data, int((~valid).sum())
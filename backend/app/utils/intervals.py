@@ -0,0 +1,30 @@
+"""Parsing of Postgres-style interval strings ("15 minutes", "1 day")."""
+
+from datetime import timedelta
+
+INTERVAL_UNITS = {
+    "second": timedelta(seconds=1),
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+def parse_interval(interval: str) -> timedelta:
+    """Parse "<n> <unit>" (or a bare unit like "hour") into a timedelta.
+
+    Only fixed-length units are accepted, so the result can be used for
+    bucketing. Raises ValueError for anything else.
+    """
+    parts = interval.strip().lower().split()
+    if len(parts) == 1:
+        parts = ["1", parts[0]]
+    if len(parts) != 2:
+        raise ValueError(f"Invalid interval: {interval!r}")
+
+    amount, unit = parts
+    unit = unit.removesuffix("s")
+    if unit not in INTERVAL_UNITS or not amount.isdigit() or int(amount) <= 0:
+        raise ValueError(f"Invalid interval: {interval!r}")
+    return int(amount) * INTERVAL_UNITS[unit]
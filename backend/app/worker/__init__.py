@@ -0,0 +1,5 @@
+"""Celery worker for jobs too heavy for the API event loop.
+
+Run a worker per queue (or one for all) from backend/:
+    celery -A app.worker.celery_app worker -Q ingest,ml,reports
+"""
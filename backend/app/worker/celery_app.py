@@ -0,0 +1,46 @@
+"""Celery application and queue routing.
+
+Each kind of job has its own queue so a long model refit cannot hold up
+uploads: `ingest` (file uploads), `ml` (model fitting, re-scoring) and
+`reports` (aggregations). With CELERY_TASK_ALWAYS_EAGER, tasks run in
+the calling thread and results go to an in-memory backend, so tests and
+single-process setups need no broker.
+"""
+
+from celery import Celery
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+QUEUES = ("ingest", "ml", "reports")
+
+celery_app = Celery(
+    "izbezkali",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    backend=settings.CELERY_RESULT_BACKEND or settings.REDIS_URL,
+    include=[
+        "app.worker.tasks.uploads",
+        "app.worker.tasks.models",
+        "app.worker.tasks.reports",
+    ],
+)
+
+celery_app.conf.update(
+    task_routes={
+        "app.worker.tasks.uploads.*": {"queue": "ingest"},
+        "app.worker.tasks.models.*": {"queue": "ml"},
+        "app.worker.tasks.reports.*": {"queue": "reports"},
+    },
+    task_default_queue="ingest",
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    result_expires=settings.JOB_RESULT_EXPIRES_SECONDS,
+    # Report STARTED, and hand each worker process one job at a time
+    task_track_started=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_store_eager_result=True,
+)
@@ -0,0 +1,170 @@
+"""Helpers shared by the API (submitting, polling) and the tasks (sessions, progress)."""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+from celery import Task
+from celery.result import AsyncResult
+from celery.signals import worker_process_init
+from celery.utils import uuid
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import flush_stale
+from app.core.config import get_settings
+from app.core.pubsub import broker
+from app.core.timescale import aggregate_refresher, available_aggregates, detect_aggregates
+from app.services.alert_state import alert_tracker
+from app.services.model_registry import model_registry
+from app.services.notifications import notification_dispatcher
+from app.worker.celery_app import celery_app
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+PROGRESS = "PROGRESS"
+
+# The API's event loop while `submit` runs an eager job, see `run_async`
+_calling_loop: ContextVar[asyncio.AbstractEventLoop | None] = ContextVar(
+    "calling_loop", default=None
+)
+
+
+# Task side
+
+@worker_process_init.connect
+def init_worker_process(**_) -> None:
+    """Worker processes never run the API's lifespan.
+
+    Configured senders let the rule engine queue notifications; the API's
+    dispatchers deliver them from the outbox.
+    """
+    notification_dispatcher.configure()
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a task's async body.
+
+    A worker runs it on a fresh event loop. An eager job runs on the loop
+    of the API that submitted it, as the rule engine, alert tracker and
+    value caches it updates belong to that loop.
+    """
+    loop = _calling_loop.get()
+    if loop is None:
+        return asyncio.run(coro)
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+@asynccontextmanager
+async def job_sessions() -> AsyncIterator[sessionmaker]:
+    """Session factory for one job.
+
+    A worker runs each job on its own event loop, so it gets its own
+    unpooled engine instead of the API's pool. Use `transaction` for sessions that
+    write.
+    """
+    engine = create_async_engine(str(settings.DATABASE_URL), poolclass=NullPool)
+    if settings.TIMESCALE_ENABLED and not available_aggregates:
+        await detect_aggregates(engine)
+    try:
+        yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def ingest_services(session_factory: sessionmaker) -> AsyncIterator[None]:
+    """What the API's lifespan runs for ingestion, for one job's event loop.
+
+    Loads changed anomaly models, relays live events (with the "redis"
+    pub/sub backend) while the job runs, and before the loop closes writes
+    the alert repeats it counted and refreshes the rollups it backfilled.
+    """
+    if settings.ANOMALY_ML_ENABLED:
+        await asyncio.to_thread(model_registry.load)
+    # An eager job shares the API process, whose relay is already running
+    relay = not broker.relaying
+    if relay:
+        broker.start()
+    try:
+        yield
+    finally:
+        try:
+            await alert_tracker.flush_committed(session_factory)
+            await aggregate_refresher.refresh_pending(session_factory.kw["bind"])
+        finally:
+            if relay:
+                await broker.stop()
+
+
+@asynccontextmanager
+async def transaction(session_factory: sessionmaker) -> AsyncIterator[AsyncSession]:
+    """A session committed on success and rolled back on error, like `get_session`."""
+    async with session_factory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            await flush_stale(session, committed=False)
+            raise
+        await flush_stale(session)
+
+
+def report_progress(task: Task, **progress) -> None:
+    """Publish progress for `GET /jobs/{id}`; a no-op outside a worker or eager call."""
+    if task.request.id:
+        task.update_state(state=PROGRESS, meta=progress)
+
+
+# API side
+
+async def submit(task: Task, *args, owner: int | None = None, **kwargs) -> dict:
+    """Queue `task` without blocking the event loop. Returns its job status.
+
+    `owner` is the id of the submitting user, the only one `job_owner`
+    lets poll the job. With CELERY_TASK_ALWAYS_EAGER the job runs before
+    this returns, its async body on this event loop.
+    """
+    job_id = uuid()
+    if owner is not None:
+        await run_in_threadpool(celery_app.backend.set, _owner_key(job_id), str(owner))
+    token = _calling_loop.set(
+        asyncio.get_running_loop() if celery_app.conf.task_always_eager else None
+    )
+    try:
+        await run_in_threadpool(task.apply_async, args, kwargs, task_id=job_id)
+    finally:
+        _calling_loop.reset(token)
+    return job_status(job_id)
+
+
+def _owner_key(job_id: str) -> bytes:
+    return celery_app.backend.get_key_for_task(job_id, key="-owner")
+
+
+def job_owner(job_id: str) -> int | None:
+    """Id of the user who submitted a job; None for unknown, expired and internal jobs."""
+    owner = celery_app.backend.get(_owner_key(job_id))
+    return int(owner) if owner is not None else None
+
+
+def job_status(job_id: str) -> dict:
+    """State of a job: PENDING (also for unknown ids), STARTED, PROGRESS, SUCCESS or FAILURE."""
+    result = AsyncResult(job_id, app=celery_app)
+    state = result.state
+    info = result.info
+    return {
+        "id": job_id,
+        "status": state,
+        "progress": info if state == PROGRESS else None,
+        "result": info if state == "SUCCESS" else None,
+        "error": f"{type(info).__name__}: {info}" if state == "FAILURE" else None,
+    }
@@ -0,0 +1,88 @@
+"""Anomaly model retraining and re-scoring of stored history."""
+
+import asyncio
+
+import numpy as np
+from celery import Task
+
+from app.crud.metric import get_metrics, get_series_keys, update_anomaly_scores
+from app.services.anomaly import anomaly_detector
+from app.services.model_registry import model_key, model_registry
+from app.worker.celery_app import celery_app
+from app.worker.jobs import job_sessions, report_progress, run_async, transaction
+
+RESCORE_PAGE_ROWS = 5000
+
+
+@celery_app.task(bind=True)
+def refit_models(
+    self: Task, keys: list[list] | None = None, project_id: int | None = None
+) -> dict:
+    """Fit and save Isolation Forest models.
+
+    `keys` are (project_id, sensor_id, metric_type) series; by default
+    every series (of `project_id`, if given) is refitted.
+    """
+    return run_async(_refit(self, keys, project_id))
+
+
+async def _refit(task: Task, keys: list[list] | None, project_id: int | None) -> dict:
+    refitted = 0
+    async with job_sessions() as session_factory:
+        if keys is None:
+            async with session_factory() as session:
+                keys = await get_series_keys(session, project_id)
+        for done, key in enumerate(keys, start=1):
+            if await model_registry.refit(session_factory, model_key(*key)) is not None:
+                refitted += 1
+            report_progress(task, done=done, total=len(keys), refitted=refitted)
+    return {"series": len(keys), "refitted": refitted}
+
+
+@celery_app.task(bind=True)
+def rescore_metrics(self: Task, project_id: int, metric_type: str | None = None) -> dict:
+    """Recompute anomaly flags of a project's stored readings.
+
+    Flags come from the thresholds, and the current per-sensor models (as
+    saved by `refit_models`) raise the scores of outliers, so history
+    reflects models fitted after it arrived.
+    Rate-of-change and rolling scores depend on arrival order and are not
+    replayed. Runs newest first, one transaction per page.
+    """
+    return run_async(_rescore(self, project_id, metric_type))
+
+
+def _score_page(metrics) -> list[tuple]:
+    metric_types = [m.metric_type for m in metrics]
+    values = np.array([m.value for m in metrics], dtype=np.float64)
+    is_anomaly, scores = anomaly_detector.detect_simple_batch(metric_types, values)
+    scores = np.maximum(scores, model_registry.outlier_scores(
+        [m.project_id for m in metrics], [m.sensor_id for m in metrics], metric_types, values
+    ))
+    return [
+        (m.id, m.recorded_at, flagged, score)
+        for m, flagged, score in zip(metrics, is_anomaly.tolist(), scores.tolist())
+    ]
+
+
+async def _rescore(task: Task, project_id: int, metric_type: str | None) -> dict:
+    await asyncio.to_thread(model_registry.load)
+    rescored = flagged = 0
+    cursor = None
+    async with job_sessions() as session_factory:
+        while True:
+            async with transaction(session_factory) as session:
+                metrics = await get_metrics(
+                    session, project_id, metric_type, limit=RESCORE_PAGE_ROWS, cursor=cursor
+                )
+                if not metrics:
+                    break
+                scores = _score_page(metrics)
+                await update_anomaly_scores(session, scores)
+            rescored += len(scores)
+            flagged += sum(s[2] for s in scores)
+            cursor = (metrics[-1].recorded_at, metrics[-1].id)
+            report_progress(task, rescored=rescored, anomalies=flagged)
+            if len(metrics) < RESCORE_PAGE_ROWS:
+                break
+    return {"rescored": rescored, "anomalies": flagged}
@@ -0,0 +1,40 @@
+"""Long-range aggregation reports."""
+
+from datetime import datetime
+
+from app.crud.metric import get_aggregated_metrics
+from app.worker.celery_app import celery_app
+from app.worker.jobs import job_sessions, run_async
+
+
+@celery_app.task
+def aggregated_report(
+    project_id: int,
+    metric_type: str,
+    interval: str = "1 hour",
+    start_time: str | None = None,
+    end_time: str | None = None,
+) -> list[dict]:
+    """`GET /metrics/{project_id}/aggregated` for ranges too long to answer inline.
+
+    Times are ISO 8601 strings, as job arguments are JSON.
+    """
+    return run_async(_report(project_id, metric_type, interval, start_time, end_time))
+
+
+async def _report(
+    project_id: int,
+    metric_type: str,
+    interval: str,
+    start_time: str | None,
+    end_time: str | None,
+) -> list[dict]:
+    async with job_sessions() as session_factory, session_factory() as session:
+        return await get_aggregated_metrics(
+            session,
+            project_id,
+            metric_type,
+            interval,
+            datetime.fromisoformat(start_time) if start_time else None,
+            datetime.fromisoformat(end_time) if end_time else None,
+        )
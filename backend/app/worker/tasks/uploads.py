@@ -0,0 +1,53 @@
+"""Bulk CSV/Excel upload ingestion."""
+
+from contextlib import closing
+from pathlib import Path
+
+from celery import Task
+
+from app.core.config import get_settings
+from app.services.ingest import prepare_metrics, store_metrics
+from app.services.upload import iter_upload_chunks, prepare_chunk
+from app.worker.celery_app import celery_app
+from app.worker.jobs import (
+    ingest_services,
+    job_sessions,
+    report_progress,
+    run_async,
+    transaction,
+)
+
+settings = get_settings()
+
+
+@celery_app.task(bind=True)
+def ingest_upload(self: Task, path: str, suffix: str, filename: str) -> dict:
+    """Validate, score and store an uploaded file, then delete it.
+
+    The file is read in chunks of UPLOAD_CHUNK_ROWS rows and written in
+    one transaction, so a bad row further down leaves nothing half-stored.
+    """
+    try:
+        return run_async(_ingest(self, Path(path), suffix, filename))
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+
+async def _ingest(task: Task, path: Path, suffix: str, filename: str) -> dict:
+    count = rejected = 0
+    async with (
+        job_sessions() as session_factory,
+        ingest_services(session_factory),
+        transaction(session_factory) as session,
+    ):
+        with path.open("rb") as f, closing(
+            iter_upload_chunks(f, suffix, settings.UPLOAD_CHUNK_ROWS)
+        ) as chunks:
+            for df in chunks:
+                metrics_data, chunk_rejected = prepare_chunk(df)
+                rejected += chunk_rejected
+                if metrics_data:
+                    metrics_data = await prepare_metrics(session, metrics_data)
+                    count += await store_metrics(session, metrics_data)
+                report_progress(task, ingested=count, rejected=rejected, filename=filename)
+    return {"ingested": count, "rejected": rejected, "filename": filename}
@@ -0,0 +1,129 @@
+"""Benchmark single-row CRUD writes: add/flush/refresh vs INSERT/UPDATE ... RETURNING.
+
+Usage (from backend/):
+    python -m benchmarks.bench_crud_writes [iterations]
+
+Runs against DATABASE_URL. All writes happen inside a transaction that is
+rolled back, so the target database is left unchanged.
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.models  # noqa: F401
+from app.core.config import get_settings
+from app.crud.alert import acknowledge_alert, create_alert
+from app.models.alert import Alert
+from app.models.project import WaterProject
+
+settings = get_settings()
+engine = create_async_engine(str(settings.DATABASE_URL))
+session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+statements = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+async def legacy_create_alert(session: AsyncSession, data: dict) -> Alert:
+    """The previous implementation: add, flush, refresh."""
+    alert = Alert(**data)
+    session.add(alert)
+    await session.flush()
+    await session.refresh(alert)
+    return alert
+
+
+async def legacy_acknowledge_alert(
+    session: AsyncSession, alert_id: int, user_id: int | None
+) -> Alert | None:
+    """The previous implementation: SELECT, then flush the change and refresh."""
+    alert = (await session.exec(select(Alert).where(Alert.id == alert_id))).first()
+    if alert:
+        alert.status = "acknowledged"
+        alert.acknowledged_by = user_id
+        alert.acknowledged_at = datetime.now(timezone.utc)
+        session.add(alert)
+        await session.flush()
+        await session.refresh(alert)
+    return alert
+
+
+async def seed_project(session: AsyncSession) -> dict:
+    project = WaterProject(
+        name="Bench Project", project_code="BENCH-WRITES", project_type="borehole",
+        region="Dodoma", district="Bench",
+    )
+    session.add(project)
+    await session.flush()
+    return {
+        "project_id": project.id, "title": "Bench", "message": "Bench",
+        "alert_type": "leak",
+    }
+
+
+async def bench_create(create, iterations: int) -> tuple[float, int]:
+    """Writes/s and statements sent during the timed loop."""
+    async with session_factory() as session:
+        data = await seed_project(session)
+        sent = statements
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await create(session, data)
+        elapsed = time.perf_counter() - started
+        sent = statements - sent
+        await session.rollback()
+    return iterations / elapsed, sent
+
+
+async def bench_acknowledge(acknowledge, iterations: int) -> tuple[float, int]:
+    async with session_factory() as session:
+        data = await seed_project(session)
+        alerts = [Alert(**data) for _ in range(iterations)]
+        session.add_all(alerts)
+        await session.flush()
+        ids = [a.id for a in alerts]
+        session.expunge_all()
+        sent = statements
+        started = time.perf_counter()
+        for alert_id in ids:
+            await acknowledge(session, alert_id, None)
+        elapsed = time.perf_counter() - started
+        sent = statements - sent
+        await session.rollback()
+    return iterations / elapsed, sent
+
+
+async def main(iterations: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    cases = [
+        ("create: flush + refresh", bench_create, legacy_create_alert),
+        ("create: INSERT RETURNING", bench_create, create_alert),
+        ("ack: SELECT + flush + refresh", bench_acknowledge, legacy_acknowledge_alert),
+        ("ack: conditional UPDATE", bench_acknowledge, acknowledge_alert),
+    ]
+    print(f"{iterations:,} writes per case, best of 3")
+    print(f"{'case':>30} | {'writes/s':>10} | {'round trips/write':>17}")
+    for label, bench, write in cases:
+        runs = [await bench(write, iterations) for _ in range(3)]
+        best, sent = max(runs)
+        print(f"{label:>30} | {best:>10,.0f} | {sent / iterations:>17.1f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000))
@@ -0,0 +1,157 @@
+"""Benchmark dashboard KPIs: sequential full-table queries vs running totals.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dashboard_kpis [projects] [metrics] [iterations]
+
+Runs against DATABASE_URL. Seed data is written inside a transaction that
+is rolled back, so the target database is left unchanged.
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.models  # noqa: F401
+from app.core.config import get_settings
+from app.crud.dashboard import get_dashboard_kpis
+from app.crud.metric import batch_create_metrics_copy, rebuild_metric_totals
+from app.models.alert import Alert
+from app.models.metric import Metric, WaterQualityReading
+from app.models.project import WaterProject
+
+REGIONS = ["Dar es Salaam", "Dodoma", "Arusha", "Mwanza", "Mbeya", "Tanga"]
+
+settings = get_settings()
+engine = create_async_engine(str(settings.DATABASE_URL))
+session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def legacy_kpis(session: AsyncSession, region: str | None = None) -> dict:
+    """The previous implementation: one round trip per KPI."""
+    def scoped(query):
+        return query.where(WaterProject.region == region) if region else query
+
+    total = (await session.exec(scoped(select(func.count(WaterProject.id))))).one()
+    operational = (await session.exec(scoped(
+        select(func.count(WaterProject.id)).where(WaterProject.status == "operational")
+    ))).one()
+    population = (await session.exec(scoped(
+        select(func.coalesce(func.sum(WaterProject.population_served), 0))
+    ))).one()
+    connections = (await session.exec(scoped(
+        select(func.coalesce(func.sum(WaterProject.connection_count), 0))
+    ))).one()
+    avg_flow = (await session.exec(
+        select(func.coalesce(func.avg(Metric.value), 0)).where(Metric.metric_type == "flow")
+    )).one()
+    avg_pressure = (await session.exec(
+        select(func.coalesce(func.avg(Metric.value), 0)).where(Metric.metric_type == "pressure")
+    )).one()
+    active = (await session.exec(
+        select(func.count(Alert.id)).where(Alert.status == "active")
+    )).one()
+    total_q = (await session.exec(select(func.count(WaterQualityReading.id)))).one()
+    compliant = (await session.exec(
+        select(func.count(WaterQualityReading.id)).where(
+            WaterQualityReading.is_compliant == True  # noqa: E712
+        )
+    )).one()
+    return {
+        "total_projects": total,
+        "operational_projects": operational,
+        "total_population_served": population,
+        "total_connections": connections,
+        "avg_flow_rate_ls": round(float(avg_flow), 2),
+        "avg_pressure_bar": round(float(avg_pressure), 2),
+        "active_alerts": active,
+        "compliant_quality": compliant,
+        "total_quality": total_q,
+    }
+
+
+async def seed(session: AsyncSession, n_projects: int, n_metrics: int) -> None:
+    projects = [
+        WaterProject(
+            name=f"Bench Project {i}",
+            project_code=f"BENCH-KPI-{i:05d}",
+            project_type="borehole",
+            region=random.choice(REGIONS),
+            district="Bench",
+            status=random.choice(["operational", "maintenance", "planning"]),
+            population_served=random.randint(1_000, 50_000),
+            connection_count=random.randint(50, 5_000),
+        )
+        for i in range(n_projects)
+    ]
+    session.add_all(projects)
+    await session.flush()
+    ids = [p.id for p in projects]
+
+    start = datetime.now(timezone.utc) - timedelta(seconds=n_metrics)
+    await batch_create_metrics_copy(session, [
+        {
+            "project_id": random.choice(ids),
+            "metric_type": random.choice(["flow", "pressure", "level"]),
+            "value": random.uniform(1, 200),
+            "unit": "",
+            "recorded_at": start + timedelta(seconds=i),
+        }
+        for i in range(n_metrics)
+    ])
+    session.add_all(
+        Alert(
+            project_id=random.choice(ids),
+            title="Bench",
+            message="Bench",
+            alert_type="leak",
+            status=random.choice(["active", "resolved"]),
+        )
+        for _ in range(n_projects * 5)
+    )
+    session.add_all(
+        WaterQualityReading(project_id=random.choice(ids), is_compliant=random.random() > 0.1)
+        for _ in range(n_projects * 20)
+    )
+    await session.flush()
+    await rebuild_metric_totals(session)
+
+
+async def timed(fn, session: AsyncSession, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await fn(session)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main(n_projects: int, n_metrics: int, iterations: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    async with session_factory() as session:
+        await seed(session, n_projects, n_metrics)
+        await session.exec(select(1))  # warm the connection
+
+        print(f"{n_projects:,} projects, {n_metrics:,} metrics, {iterations} iterations")
+        print(f"{'query':>12} | {'p50 ms':>8} | {'p95 ms':>8}")
+        for name, fn in [("sequential", legacy_kpis), ("totals", get_dashboard_kpis)]:
+            samples = sorted(await timed(fn, session, iterations))
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"{name:>12} | {statistics.median(samples):>8.2f} | {p95:>8.2f}")
+        await session.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    defaults = [1_000, 500_000, 50]
+    asyncio.run(main(*(args + defaults[len(args):])))
@@ -0,0 +1,99 @@
+"""Benchmark metric ingestion: ORM unit of work vs binary COPY.
+
+Usage (from backend/):
+    python -m benchmarks.bench_metric_ingest [rows ...]
+
+Runs against DATABASE_URL. Each run happens in a transaction that is
+rolled back, so the target database is left unchanged apart from one
+benchmark project.
+"""
+
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.models  # noqa: F401
+from app.core.config import get_settings
+from app.crud.metric import batch_create_metrics_copy, batch_create_metrics_orm
+from app.models.project import WaterProject
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+settings = get_settings()
+engine = create_async_engine(str(settings.DATABASE_URL))
+session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def get_project_id() -> int:
+    async with session_factory() as session:
+        result = await session.exec(
+            select(WaterProject).where(WaterProject.project_code == "BENCH-0001")
+        )
+        project = result.first()
+        if project is None:
+            project = WaterProject(
+                name="Benchmark Site",
+                project_code="BENCH-0001",
+                project_type="pump_station",
+                region="Dar es Salaam",
+                district="Ilala",
+            )
+            session.add(project)
+            await session.commit()
+            await session.refresh(project)
+        return project.id
+
+
+def make_rows(project_id: int, n: int) -> list[dict]:
+    start = datetime.now(timezone.utc) - timedelta(seconds=n)
+    return [
+        {
+            "project_id": project_id,
+            "sensor_id": f"FLOW-{i % 50:03d}",
+            "metric_type": "flow",
+            "value": round(random.uniform(20, 200), 2),
+            "unit": "L/s",
+            "is_anomaly": False,
+            "anomaly_score": 0.1,
+            "quality_flag": "good",
+            "recorded_at": start + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+async def run(path, rows: list[dict]) -> float:
+    async with session_factory() as session:
+        started = time.perf_counter()
+        await path(session, rows)
+        elapsed = time.perf_counter() - started
+        await session.rollback()
+    return elapsed
+
+
+async def main(sizes: list[int]) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    project_id = await get_project_id()
+
+    print(f"{'rows':>10} | {'orm rows/s':>12} | {'copy rows/s':>12} | speedup")
+    for n in sizes:
+        rows = make_rows(project_id, n)
+        orm_s = await run(batch_create_metrics_orm, rows)
+        copy_s = await run(batch_create_metrics_copy, rows)
+        print(
+            f"{n:>10,} | {n / orm_s:>12,.0f} | {n / copy_s:>12,.0f} | "
+            f"{orm_s / copy_s:.1f}x"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES))
@@ -0,0 +1,111 @@
+"""Benchmark notification delivery throughput.
+
+Usage (from backend/):
+    python -m benchmarks.bench_notifications [alerts]
+
+Email goes to a local aiosmtpd server. It compares opening a connection
+per message with the dispatcher's one pooled connection, with and
+without digests (20 recipients). SMS goes to a fake gateway that answers
+after 20 ms, sent one at a time and with bounded concurrency. No
+database needed.
+"""
+
+import asyncio
+import socket
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+from aiosmtpd.controller import Controller
+
+from app.models.alert import Alert
+from app.models.notification import Notification
+from app.services.notifications import NotificationDispatcher, SmsSender, SmtpSender
+
+RECIPIENTS = 20
+GATEWAY_LATENCY = 0.02
+
+
+class Sink:
+    async def handle_DATA(self, server, session, envelope):
+        return "250 OK"
+
+
+async def gateway(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(GATEWAY_LATENCY)
+    return httpx.Response(200)
+
+
+def make_alerts(n: int) -> dict[int, Alert]:
+    now = datetime.now(timezone.utc)
+    return {
+        i: Alert(id=i, project_id=1, title=f"Alert {i}", message="Pressure at P-1: 0.4 bar < 1",
+                 severity="critical", alert_type="threshold", created_at=now)
+        for i in range(n)
+    }
+
+
+def rows(channel: str, n: int) -> list[Notification]:
+    address = "user{}@example.com" if channel == "email" else "+2557000{:05d}"
+    return [
+        Notification(id=i, alert_id=i, channel=channel,
+                     recipient=address.format(i % RECIPIENTS), attempts=1)
+        for i in range(n)
+    ]
+
+
+async def timed(dispatcher: NotificationDispatcher, batches, alerts) -> float:
+    started = time.perf_counter()
+    for batch in batches:
+        errors = await dispatcher.deliver(batch, alerts)
+        assert not errors, next(iter(errors.values()))
+    return time.perf_counter() - started
+
+
+async def main(n: int) -> None:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    controller = Controller(Sink(), hostname="127.0.0.1", port=port)
+    controller.start()
+    alerts = make_alerts(n)
+    emails = rows("email", n)
+    results = []
+    try:
+        # A fresh sender per message opens and closes a connection each time
+        started = time.perf_counter()
+        for row in emails:
+            dispatcher = NotificationDispatcher()
+            dispatcher.use_senders(email=SmtpSender("127.0.0.1", port))
+            await dispatcher.deliver([row], alerts)
+            await dispatcher.email.close()
+        results.append(("email, connection per message", n, time.perf_counter() - started))
+
+        dispatcher = NotificationDispatcher()
+        dispatcher.use_senders(email=SmtpSender("127.0.0.1", port))
+        elapsed = await timed(dispatcher, [[row] for row in emails], alerts)
+        results.append(("email, pooled connection", n, elapsed))
+        elapsed = await timed(dispatcher, [emails], alerts)
+        results.append((f"email, pooled + digests ({RECIPIENTS} msgs)", n, elapsed))
+        await dispatcher.email.close()
+    finally:
+        controller.stop()
+
+    texts = rows("sms", n)
+    for concurrency in (1, 10, 50):
+        dispatcher = NotificationDispatcher()
+        dispatcher.use_senders(sms=SmsSender("http://sms.test/send", concurrency=concurrency,
+                                             transport=httpx.MockTransport(gateway)))
+        elapsed = await timed(dispatcher, [texts], alerts)
+        await dispatcher.sms.close()
+        results.append((f"sms, concurrency {concurrency}", n, elapsed))
+
+    print(f"{n:,} alerts; SMS gateway latency {GATEWAY_LATENCY * 1000:.0f} ms")
+    print(f"{'mode':<36} | {'seconds':>7} | {'alerts/s':>9}")
+    for mode, count, elapsed in results:
+        print(f"{mode:<36} | {elapsed:>7.2f} | {count / elapsed:>9,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,44 @@
+"""Micro-benchmark RBAC permission checks: enum + set lookup vs bitmask AND.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rbac [iterations]
+
+No database needed.
+"""
+
+import sys
+import timeit
+
+from app.core.permissions import PERMISSION_BITS, PERMISSIONS, ROLE_MASKS, Role
+from app.core.rbac import token_permission_mask
+from app.core.security import create_access_token, decode_token
+from app.models.user import User
+
+PERMISSION = "view:metrics"
+
+
+def legacy_check(role: str) -> bool:
+    """The previous check: build the enum, then set membership."""
+    return PERMISSION in PERMISSIONS.get(Role(role), set())
+
+
+def main(iterations: int) -> None:
+    user = User(
+        email="bench@example.com", full_name="Bench", hashed_password="x", role="operator"
+    )
+    payload = decode_token(create_access_token({"sub": "1", "role": user.role}))
+    bit = PERMISSION_BITS[PERMISSION]
+
+    cases = [
+        ("enum + set", lambda: legacy_check(user.role)),
+        ("role mask", lambda: ROLE_MASKS.get(user.role, 0) & bit),
+        ("token mask", lambda: token_permission_mask(payload, user) & bit),
+    ]
+    print(f"{'check':>12} | {'ns/op':>8}")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=iterations, repeat=5))
+        print(f"{name:>12} | {best / iterations * 1e9:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
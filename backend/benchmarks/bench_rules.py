@@ -0,0 +1,92 @@
+"""Benchmark alert rule evaluation as the number of rules grows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rules [batch_size]
+
+Compares the compiled engine (sorted thresholds + searchsorted) with a
+per-rule loop that applies each rule's comparison to the whole batch.
+No database needed.
+"""
+
+import operator
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.models.alert import AlertRule
+from app.services.rules import RuleEngine
+
+OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+METRIC_TYPES = ("flow", "pressure", "level", "energy")
+
+
+def make_rules(n: int, rng: random.Random) -> list[AlertRule]:
+    rules = []
+    for i in range(n):
+        condition = rng.choice(list(OPERATORS))
+        # Mostly quiet rules: high limits for gt/gte, low limits for lt/lte
+        threshold = rng.uniform(90, 200) if condition.startswith("g") else rng.uniform(-100, 5)
+        rules.append(AlertRule(
+            id=i + 1, name=f"Rule {i}", metric_type=rng.choice(METRIC_TYPES),
+            condition=condition, threshold=threshold,
+            project_id=rng.choice([None, *range(1, 200)]),
+        ))
+    return rules
+
+
+def make_batch(n: int, rng: random.Random) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "project_id": rng.randint(1, 200), "sensor_id": f"S-{i % 500}",
+            "metric_type": rng.choice(METRIC_TYPES), "value": rng.uniform(0, 100),
+            "unit": "", "recorded_at": now,
+        }
+        for i in range(n)
+    ]
+
+
+def per_rule_loop(rules: list[AlertRule], batch: list[dict]) -> int:
+    """Baseline: test every rule against the batch with numpy masks."""
+    values = np.array([d["value"] for d in batch])
+    types = np.array([d["metric_type"] for d in batch])
+    projects = np.array([d["project_id"] for d in batch])
+    fired = 0
+    for rule in rules:
+        mask = types == rule.metric_type
+        if rule.project_id is not None:
+            mask &= projects == rule.project_id
+        mask &= OPERATORS[rule.condition](values, rule.threshold)
+        fired += int(mask.sum())
+    return fired
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(batch_size: int) -> None:
+    rng = random.Random(1)
+    batch = make_batch(batch_size, rng)
+    print(f"{batch_size:,} readings per batch, best of 5")
+    print(f"{'rules':>6} | {'per-rule loop ms':>16} | {'compiled ms':>11} | {'alerts':>6}")
+    for n in (10, 100, 1_000, 5_000):
+        rules = make_rules(n, rng)
+        engine = RuleEngine()
+        engine.use_rules(rules)
+        loop = best_of(lambda: per_rule_loop(rules, batch))
+        compiled = best_of(lambda: engine.match(batch))
+        alerts = len(engine.match(batch))
+        print(f"{n:>6,} | {loop * 1000:>16.1f} | {compiled * 1000:>11.1f} | {alerts:>6,}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
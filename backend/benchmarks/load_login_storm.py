@@ -0,0 +1,147 @@
+"""Load test: metric ingest latency while logins hammer the same worker.
+
+Usage (from backend/):
+    python -m benchmarks.load_login_storm [concurrent_logins] [ingest_requests]
+
+Drives the app in-process (one event loop, like one uvicorn worker)
+against DATABASE_URL and reports ingest p50/p99 with no logins, with
+bcrypt run inline on the event loop (the old behaviour), and with the
+bounded password-hash pool. Benchmark metrics are deleted afterwards.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlmodel import SQLModel, delete, select
+
+import app.api.routes.auth as auth_routes
+from app.core.config import get_settings
+from app.core.database import async_session_factory, engine
+from app.core.security import create_access_token, hash_password, verify_password
+from app.main import app
+from app.models.metric import Metric, MetricTotal
+from app.models.project import WaterProject
+from app.models.user import User
+
+settings = get_settings()
+
+EMAIL = "bench-operator@example.com"
+PASSWORD = "bench-password"
+
+
+async def setup() -> tuple[int, str]:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_session_factory() as session:
+        user = (await session.exec(select(User).where(User.email == EMAIL))).first()
+        if user is None:
+            user = User(
+                email=EMAIL,
+                full_name="Benchmark Operator",
+                hashed_password=hash_password(PASSWORD),
+                role="operator",
+            )
+            session.add(user)
+        project = (await session.exec(
+            select(WaterProject).where(WaterProject.project_code == "BENCH-0001")
+        )).first()
+        if project is None:
+            project = WaterProject(
+                name="Benchmark Site",
+                project_code="BENCH-0001",
+                project_type="pump_station",
+                region="Dar es Salaam",
+                district="Ilala",
+            )
+            session.add(project)
+        await session.commit()
+        await session.refresh(user)
+        await session.refresh(project)
+    token = create_access_token({"sub": str(user.id), "role": user.role})
+    return project.id, token
+
+
+async def cleanup(project_id: int) -> None:
+    async with async_session_factory() as session:
+        await session.exec(delete(Metric).where(Metric.project_id == project_id))
+        await session.exec(delete(MetricTotal).where(MetricTotal.project_id == project_id))
+        await session.commit()
+
+
+async def blocking_verify(plain: str, hashed: str) -> bool:
+    return verify_password(plain, hashed)
+
+
+async def scenario(
+    client: AsyncClient, project_id: int, token: str, logins: int, requests: int
+) -> list[float]:
+    stop = asyncio.Event()
+
+    async def login_loop():
+        while not stop.is_set():
+            await client.post(
+                "/api/v1/auth/login", json={"email": EMAIL, "password": PASSWORD}
+            )
+
+    storm = [asyncio.create_task(login_loop()) for _ in range(logins)]
+    await asyncio.sleep(0.1)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    batch = {
+        "metrics": [
+            {
+                "project_id": project_id,
+                "sensor_id": f"BENCH-{i % 10}",
+                "metric_type": "flow",
+                "value": 50.0 + i % 5,
+                "unit": "L/s",
+            }
+            for i in range(100)
+        ]
+    }
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        res = await client.post("/api/v1/metrics/batch", headers=headers, json=batch)
+        latencies.append((time.perf_counter() - started) * 1000)
+        res.raise_for_status()
+
+    stop.set()
+    await asyncio.gather(*storm)
+    return sorted(latencies)
+
+
+async def main(logins: int, requests: int) -> None:
+    project_id, token = await setup()
+    transport = ASGITransport(app=app)
+    pooled_verify = auth_routes.verify_password_async
+
+    print(
+        f"{logins} concurrent logins, {requests} ingest requests, "
+        f"PASSWORD_HASH_WORKERS={settings.PASSWORD_HASH_WORKERS}"
+    )
+    print(f"{'scenario':>16} | {'p50 ms':>8} | {'p99 ms':>8}")
+    try:
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, n_logins, verify in [
+                ("no logins", 0, pooled_verify),
+                ("inline bcrypt", logins, blocking_verify),
+                ("hash pool", logins, pooled_verify),
+            ]:
+                auth_routes.verify_password_async = verify
+                latencies = await scenario(client, project_id, token, n_logins, requests)
+                p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+                print(f"{name:>16} | {statistics.median(latencies):>8.1f} | {p99:>8.1f}")
+    finally:
+        auth_routes.verify_password_async = pooled_verify
+        await cleanup(project_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    defaults = [8, 50]
+    asyncio.run(main(*(args + defaults[len(args):])))
@@ -11,6 +11,7 @@ from sqlalchemy.orm import sessionmaker
 
 from app.core.config import get_settings
 from app.core.security import hash_password
+from app.crud.metric import rebuild_metric_latest, rebuild_metric_totals
 from app.models.user import User
 from app.models.project import WaterProject, Tenant
 from app.models.metric import Metric, WaterQualityReading
@@ -257,6 +258,11 @@ async def seed():
                       notify_email=True, notify_sms=True),
         ]
         session.add_all(rules)
+        await session.flush()
+
+        # --- Dashboard running totals and latest readings ---
+        await rebuild_metric_totals(session)
+        await rebuild_metric_latest(session)
 
         await session.commit()
         print("Seed data loaded successfully!")
@@ -0,0 +1,189 @@
+"""Alert state machine tests: dedup, hysteresis, cooldown and rate limits."""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import select
+
+from app.core.cache import flush_stale
+from app.crud.alert import resolve_alert
+from app.models.alert import Alert, AlertRule
+from app.services.alert_state import AlertTracker, Changes
+from app.services.rules import RuleEngine
+
+T0 = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _data(project_id: int = 1, sensor_id: str = "a", value: float = 0.5) -> dict:
+    return {
+        "project_id": project_id, "rule_id": 1, "sensor_id": sensor_id,
+        "metric_type": "pressure", "metric_value": value, "last_seen_at": T0,
+    }
+
+
+def _open(tracker: AlertTracker, changes: Changes, first_id: int = 1) -> list[Alert]:
+    """Pretend the opened alerts were written, and bind them."""
+    alerts = [Alert(id=first_id + n, title="t", message="m", alert_type="threshold", **d)
+              for n, d in enumerate(changes.opened)]
+    tracker.opened(alerts)
+    return alerts
+
+
+def test_hysteresis_and_repeats():
+    tracker = AlertTracker(open_after=2, clear_after=2)
+    key = (1, 1, "a")
+
+    changes = Changes()
+    tracker.breach(changes, key, _data())
+    assert changes.opened == []  # one breach is not enough
+    tracker.breach(changes, key, _data(value=0.4))
+    assert [d["status"] for d in changes.opened] == ["active"]
+    _open(tracker, changes)
+
+    # Repeats only count in memory
+    changes = Changes()
+    for value in (0.3, 0.2):
+        tracker.breach(changes, key, _data(value=value))
+    assert changes == Changes()
+    assert (tracker.get(key).pending, tracker.get(key).value) == (2, 0.2)
+
+    # A hold (inside the clear margin) resets the clear streak
+    for clear in (True, False, True):
+        tracker.settle(changes, key, clear)
+    assert changes.resolved == []
+    tracker.settle(changes, key, True)
+    assert changes.resolved == [key]
+
+
+def test_storms_and_cooldowns_suppress():
+    clock = Clock()
+    tracker = AlertTracker(cooldown_seconds=300, rate_limit=2, rate_window_seconds=60,
+                           clock=clock)
+    changes = Changes()
+    for sensor in ("a", "b", "c"):
+        tracker.breach(changes, (1, 1, sensor), _data(sensor_id=sensor))
+    tracker.breach(changes, (1, 2, "a"), _data(project_id=2))
+    assert [d["status"] for d in changes.opened] == ["active", "active", "suppressed", "active"]
+    _open(tracker, changes)
+    assert tracker.suppressed == 1
+
+    # Once the storm passes, the next breach activates the suppressed alert
+    changes = Changes()
+    tracker.breach(changes, (1, 1, "c"), _data(sensor_id="c"))
+    assert changes.activated == []
+    clock.now += 61
+    tracker.breach(changes, (1, 1, "c"), _data(sensor_id="c"))
+    assert changes.activated == [3]
+
+    # A series that just closed reopens suppressed until its cooldown ends
+    tracker.closed([(1, 1, "a")])
+    changes = Changes()
+    tracker.breach(changes, (1, 1, "a"), _data())
+    assert [d["status"] for d in changes.opened] == ["suppressed"]
+    _open(tracker, changes, first_id=10)
+    changes = Changes()
+    clock.now += 301
+    tracker.breach(changes, (1, 1, "a"), _data())
+    assert changes.activated == [10]
+
+
+async def _rule(session) -> AlertRule:
+    rule = AlertRule(name="Low Pressure", metric_type="pressure", condition="lt", threshold=1.0)
+    session.add(rule)
+    await session.flush()
+    return rule
+
+
+def _reading(project_id: int, value: float, minutes: int) -> dict:
+    return {
+        "project_id": project_id, "sensor_id": "P-1", "metric_type": "pressure",
+        "value": value, "unit": "bar", "recorded_at": T0 + timedelta(minutes=minutes),
+    }
+
+
+async def _alerts(session) -> list[Alert]:
+    result = await session.exec(
+        select(Alert).order_by(Alert.id).execution_options(populate_existing=True)
+    )
+    return list(result.all())
+
+
+async def test_one_alert_per_episode(db_session, project):
+    await _rule(db_session)
+    engine = RuleEngine(tracker=AlertTracker(clear_after=2))
+
+    opened = await engine.evaluate(db_session, [_reading(project.id, 0.5, 0)])
+    assert len(opened) == 1
+    for minutes, value in enumerate((0.4, 1.03, 1.2), start=1):
+        # 1.03 is within the 5% clear margin, so it holds the alert open
+        assert await engine.evaluate(db_session, [_reading(project.id, value, minutes)]) == []
+    assert [a.status for a in await _alerts(db_session)] == ["active"]
+
+    await engine.evaluate(db_session, [_reading(project.id, 1.3, 5)])
+    (alert,) = await _alerts(db_session)
+    assert (alert.status, alert.occurrences, alert.metric_value) == ("resolved", 2, 0.4)
+    assert alert.sensor_id == "P-1"
+
+    # The next episode opens a new alert, suppressed while the series cools down
+    (reopened,) = await engine.evaluate(db_session, [_reading(project.id, 0.2, 6)])
+    assert (reopened.id != alert.id, reopened.status) == (True, "suppressed")
+
+
+async def test_workers_share_one_open_alert(db_session, project):
+    await _rule(db_session)
+    first, second = (RuleEngine(tracker=AlertTracker()) for _ in range(2))
+    await second.tracker.load(db_session)  # loaded before the first worker writes
+
+    (a,) = await first.evaluate(db_session, [_reading(project.id, 0.5, 0)])
+    (b,) = await second.evaluate(db_session, [_reading(project.id, 0.4, 1)])
+    assert (b.id, b.occurrences, b.metric_value) == (a.id, 2, 0.4)
+
+    # A restarted worker adopts the open alert instead of opening another
+    restarted = RuleEngine(tracker=AlertTracker())
+    assert await restarted.evaluate(db_session, [_reading(project.id, 0.3, 2)]) == []
+
+    # Resolving by hand ends the episode; the next flush notices
+    await resolve_alert(db_session, a.id)
+    assert await restarted.tracker.flush(db_session) == 0
+    assert restarted.tracker.get((a.rule_id, project.id, "P-1")).alert_id is None
+
+
+async def test_rolled_back_changes_leave_the_tracker_as_it_was(db_session, project):
+    rule = await _rule(db_session)
+    await db_session.commit()
+    engine = RuleEngine(tracker=AlertTracker(clear_after=1))
+    project_id = project.id
+    key = (rule.id, project_id, "P-1")
+
+    # The opened alert never existed, so no cooldown holds the next one back
+    await engine.evaluate(db_session, [_reading(project_id, 0.5, 0)])
+    await db_session.rollback()
+    await flush_stale(db_session, committed=False)
+    assert engine.tracker.get(key).alert_id is None
+
+    (alert,) = await engine.evaluate(db_session, [_reading(project_id, 0.4, 1)])
+    await db_session.commit()
+    await flush_stale(db_session)
+    assert alert.status == "active"
+
+    # Counted repeats and the close both come back after a failed resolve
+    for minutes in (2, 3):
+        await engine.evaluate(db_session, [_reading(project_id, 0.3, minutes)])
+    await engine.evaluate(db_session, [_reading(project_id, 1.3, 4)])
+    state, alert_id = engine.tracker.get(key), alert.id
+    assert (state.alert_id, state.pending) == (None, 0)
+    await db_session.rollback()
+    await flush_stale(db_session, committed=False)
+    assert (state.alert_id, state.pending) == (alert_id, 2)
+
+    assert await engine.tracker.flush(db_session) == 1
+    await db_session.commit()
+    (stored,) = await _alerts(db_session)
+    assert (stored.status, stored.occurrences) == ("active", 3)
@@ -0,0 +1,111 @@
+"""Alert lifecycle and single-statement CRUD write tests."""
+
+from contextlib import contextmanager
+
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from app.crud.alert import acknowledge_alert, create_alert, resolve_alert
+from app.crud.metric import create_metric
+from app.crud.project import create_project
+from tests.conftest import engine
+
+
+@contextmanager
+def count_statements():
+    statements: list[str] = []
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_execute)
+
+
+def _alert(project_id: int) -> dict:
+    return {
+        "project_id": project_id,
+        "title": "Pressure drop",
+        "message": "Pressure below 1 bar",
+        "alert_type": "pressure_drop",
+    }
+
+
+async def test_create_is_one_statement(db_session, project):
+    await db_session.connection()  # exclude BEGIN/connection setup
+    with count_statements() as statements:
+        alert = await create_alert(db_session, _alert(project.id))
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("INSERT")
+    assert alert.id is not None
+    assert alert.created_at is not None
+    assert alert.status == "active"
+    assert alert in db_session
+
+
+async def test_create_returns_server_state(db_session, project):
+    created = await create_project(db_session, {
+        "project_code": "TZ-WP-0002",
+        "name": "Kigamboni Borehole",
+        "region": "Dar es Salaam",
+        "district": "Kigamboni",
+        "project_type": "borehole",
+    })
+    assert created.id is not None
+
+    metric = await create_metric(db_session, {
+        "project_id": created.id,
+        "metric_type": "flow",
+        "value": 12.5,
+        "unit": "L/s",
+    })
+    assert metric.id is not None
+    assert metric.recorded_at is not None
+    assert metric.ingested_at is not None
+
+
+async def test_acknowledge_and_resolve_are_conditional(db_session, project, test_user):
+    alert = await create_alert(db_session, _alert(project.id))
+
+    with count_statements() as statements:
+        acked = await acknowledge_alert(db_session, alert.id, test_user.id)
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("UPDATE")
+    assert acked.status == "acknowledged"
+    assert acked.acknowledged_by == test_user.id
+    assert acked.acknowledged_at is not None
+
+    # Already acknowledged: the UPDATE matches nothing
+    assert await acknowledge_alert(db_session, alert.id, test_user.id) is None
+
+    resolved = await resolve_alert(db_session, alert.id)
+    assert resolved.status == "resolved"
+    assert resolved.resolved_at is not None
+    assert await resolve_alert(db_session, alert.id) is None
+    assert await acknowledge_alert(db_session, alert.id, test_user.id) is None
+    assert await resolve_alert(db_session, 999_999) is None
+
+
+async def test_alert_routes(client: AsyncClient, db_session, project, ceo_headers):
+    alert = await create_alert(db_session, _alert(project.id))
+    await db_session.commit()
+
+    res = await client.post(f"/api/v1/alerts/{alert.id}/acknowledge", headers=ceo_headers)
+    assert res.status_code == 200
+    assert res.json()["status"] == "acknowledged"
+
+    res = await client.post(f"/api/v1/alerts/{alert.id}/acknowledge", headers=ceo_headers)
+    assert res.status_code == 409
+
+    res = await client.post(f"/api/v1/alerts/{alert.id}/resolve", headers=ceo_headers)
+    assert res.status_code == 200
+    assert res.json()["status"] == "resolved"
+
+    res = await client.post(f"/api/v1/alerts/{alert.id}/resolve", headers=ceo_headers)
+    assert res.status_code == 409
+
+    res = await client.post("/api/v1/alerts/999999/resolve", headers=ceo_headers)
+    assert res.status_code == 404
@@ -1,6 +1,14 @@
 """Anomaly detection service tests."""
 
-from app.services.anomaly import anomaly_detector
+import numpy as np
+
+from app.services.anomaly import (
+    AnomalyStrategy,
+    OnlineAnomalyDetector,
+    RollingWindow,
+    anomaly_detector,
+)
+from app.services.ingest import score_metrics
 
 
 def test_simple_detection_normal():
@@ -39,3 +47,111 @@ def test_rate_of_change_spike():
     )
     assert is_anomaly
     assert score > 0.5
+
+
+def test_simple_batch_matches_single():
+    metric_types = ["flow", "flow", "pressure", "pressure", "level", "unknown_metric"]
+    values = [100, 600, -1, 5.25, 50, 42]
+    is_anomaly, scores = anomaly_detector.detect_simple_batch(metric_types, values)
+
+    for i, (metric_type, value) in enumerate(zip(metric_types, values)):
+        expected_anomaly, expected_score = anomaly_detector.detect_simple(metric_type, value)
+        assert bool(is_anomaly[i]) == expected_anomaly
+        assert scores[i] == expected_score
+
+
+def test_simple_batch_empty():
+    is_anomaly, scores = anomaly_detector.detect_simple_batch([], [])
+    assert len(is_anomaly) == 0
+    assert len(scores) == 0
+
+
+def test_rolling_window_tracks_mean_and_variance():
+    rng = np.random.default_rng(1)
+    values = rng.normal(50, 5, 500)
+    window = RollingWindow(64)
+    for v in values:
+        window.push(float(v))
+
+    tail = values[-64:]
+    assert window.count == 64
+    assert abs(window.mean - tail.mean()) < 1e-9
+    assert abs(window.variance - tail.var(ddof=1)) < 1e-6
+    median, mad = window.median_and_mad()
+    assert median == np.median(tail)
+
+
+def test_online_detector_warm_up_and_spike():
+    detector = OnlineAnomalyDetector(window_size=32, min_samples=10)
+    key = (1, "FLOW-1", "flow")
+    for i in range(9):
+        assert detector.score(key, 100 + (i % 3)) is None
+
+    detector.score(key, 101)
+    is_anomaly, score = detector.score(key, 101)
+    assert not is_anomaly
+    is_anomaly, score = detector.score(key, 160)
+    assert is_anomaly
+    assert score > 0.5
+
+
+def test_online_detector_adapts_per_sensor():
+    detector = OnlineAnomalyDetector(window_size=32, min_samples=10)
+    low, high = (1, "A", "pressure"), (2, "B", "pressure")
+    for i in range(20):
+        detector.score(low, 1.0 + 0.05 * (i % 3))
+        detector.score(high, 6.0 + 0.05 * (i % 3))
+
+    assert detector.score(low, 6.0)[0]
+    assert not detector.score(high, 6.05)[0]
+
+
+def test_online_detector_flat_baseline():
+    detector = OnlineAnomalyDetector(window_size=32, min_samples=10)
+    key = (1, "LEVEL-1", "level")
+    for _ in range(20):
+        detector.score(key, 2.5)
+
+    assert detector.score(key, 2.5) == (False, 0.0)
+    assert not detector.score(key, 2.505)[0]  # within the spread floor
+    is_anomaly, score = detector.score(key, 3.5)
+    assert is_anomaly and score == 1.0
+
+
+def test_online_detector_bounds_series():
+    detector = OnlineAnomalyDetector(window_size=8, max_series=3)
+    for sensor in range(5):
+        detector.score((1, str(sensor), "flow"), 1.0)
+    assert len(detector) == 3
+
+
+def test_score_metrics_rolling_strategy():
+    rows = [
+        {"project_id": 99, "sensor_id": "LEAK-1", "metric_type": "flow", "value": 40.0 + (i % 2)}
+        for i in range(20)
+    ]
+    rows.append({"project_id": 99, "sensor_id": "LEAK-1", "metric_type": "flow", "value": 90.0})
+
+    simple = score_metrics([dict(r) for r in rows], AnomalyStrategy.SIMPLE)
+    rolling = score_metrics([dict(r) for r in rows], AnomalyStrategy.ROLLING)
+    assert not simple[-1]["is_anomaly"]
+    assert rolling[-1]["is_anomaly"]
+    assert rolling[-1]["quality_flag"] == "suspect"
+
+
+def test_online_detector_scores_batches_on_a_copy():
+    detector = OnlineAnomalyDetector(window_size=32, min_samples=10)
+    key = (1, "FLOW-1", "flow")
+    keys, values = [key] * 12, [100.0 + (i % 3) for i in range(12)]
+
+    detector.score_batch(keys, values)
+    # Tracked from now on, but only stored readings move the baseline
+    assert detector.get(key).count == 0
+    is_anomaly, _, scored = detector.score_batch(keys + [key], values + [160.0])
+    assert scored.tolist() == [False] * 10 + [True] * 3
+    assert is_anomaly[-1]
+
+    detector.push_batch(keys, values)
+    assert detector.get(key).count == 12
+    detector.push_batch([(2, "OTHER", "flow")], [1.0])  # untracked: ignored
+    assert len(detector) == 1
@@ -1,7 +1,12 @@
 """Authentication endpoint tests."""
 
+import asyncio
+import time
+
 from httpx import AsyncClient
 
+from app.core.security import hash_password, verify_password_async
+
 
 async def test_register(client: AsyncClient):
     res = await client.post(
@@ -62,3 +67,30 @@ async def test_me(client: AsyncClient, test_user):
     assert res.status_code == 200
     assert res.json()["email"] == "test@example.com"
     assert res.json()["role"] == "ceo"
+
+
+async def test_password_checks_do_not_block_event_loop():
+    hashed = hash_password("securepass123")
+    gaps = []
+
+    async def ticker(stop: asyncio.Event):
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(verify_password_async("securepass123", hashed) for _ in range(4))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+
+    assert all(results)
+    # bcrypt ran for most of `elapsed`, yet the loop kept ticking
+    assert max(gaps) < elapsed / 2
@@ -0,0 +1,94 @@
+"""Authenticated-user cache tests."""
+
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from app.core.auth_cache import user_cache
+
+from tests.conftest import engine
+
+
+@pytest_asyncio.fixture
+async def user_queries():
+    """Count SELECTs against the users table issued by the app."""
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest_asyncio.fixture
+async def redis_backend():
+    user_cache.backend = "redis"
+    user_cache.use_client(FakeAsyncRedis())
+    yield user_cache
+    user_cache.backend = "memory"
+    user_cache.use_client(None)
+
+
+async def test_repeat_requests_skip_user_lookup(
+    client: AsyncClient, ceo_headers, user_queries
+):
+    for _ in range(5):
+        res = await client.get("/api/v1/users/me", headers=ceo_headers)
+        assert res.status_code == 200
+    assert len(user_queries) == 1
+
+
+async def test_password_hash_is_not_cached(client: AsyncClient, ceo_headers, test_user):
+    await client.get("/api/v1/users/me", headers=ceo_headers)
+    ((_, fields),) = user_cache._entries[test_user.id].values()
+    assert "hashed_password" not in fields
+    assert fields["email"] == test_user.email
+
+
+async def test_role_change_invalidates(
+    client: AsyncClient, ceo_headers, operator_headers, project
+):
+    metric = {"project_id": project.id, "metric_type": "flow", "value": 10.0, "unit": "L/s"}
+    res = await client.post("/api/v1/metrics", headers=operator_headers, json=metric)
+    assert res.status_code == 201
+
+    me = (await client.get("/api/v1/users/me", headers=operator_headers)).json()
+    res = await client.patch(
+        f"/api/v1/users/{me['id']}", headers=ceo_headers, json={"role": "public"}
+    )
+    assert res.status_code == 200
+
+    res = await client.post("/api/v1/metrics", headers=operator_headers, json=metric)
+    assert res.status_code == 403
+
+
+async def test_deactivation_invalidates(client: AsyncClient, ceo_headers, operator_headers):
+    me = (await client.get("/api/v1/users/me", headers=operator_headers)).json()
+    await client.patch(
+        f"/api/v1/users/{me['id']}", headers=ceo_headers, json={"is_active": False}
+    )
+    res = await client.get("/api/v1/users/me", headers=operator_headers)
+    assert res.status_code == 401
+
+
+async def test_redis_backend(
+    client: AsyncClient, redis_backend, ceo_headers, operator_headers, user_queries
+):
+    for _ in range(3):
+        me = (await client.get("/api/v1/users/me", headers=operator_headers)).json()
+    assert len(user_queries) == 1
+    cached = await redis_backend.client.hgetall(f"auth:user:{me['id']}")
+    (raw,) = cached.values()
+    assert b"hashed_password" not in raw
+    assert user_cache._entries == {}  # nothing kept in process memory either
+
+    await client.patch(
+        f"/api/v1/users/{me['id']}", headers=ceo_headers, json={"is_active": False}
+    )
+    assert not await redis_backend.client.exists(f"auth:user:{me['id']}")
+    res = await client.get("/api/v1/users/me", headers=operator_headers)
+    assert res.status_code == 401
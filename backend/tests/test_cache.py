@@ -0,0 +1,138 @@
+"""Response cache tests (in-process fake Redis)."""
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from httpx import AsyncClient
+
+from app.core.cache import ResponseCache, response_cache
+from app.crud.alert import create_alert
+
+
+@pytest_asyncio.fixture
+async def cache():
+    response_cache.use_client(FakeAsyncRedis())
+    response_cache.enabled = True
+    response_cache.reset_stats()
+    yield response_cache
+    response_cache.enabled = False
+    await response_cache.close()
+
+
+async def test_dashboard_hit_rate(client: AsyncClient, cache, ceo_headers, project):
+    for _ in range(10):
+        res = await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+        assert res.status_code == 200
+        assert res.json()["total_projects"] == 1
+    assert cache.misses == 1
+    assert cache.hits == 9
+    assert cache.hit_rate == pytest.approx(0.9)
+
+
+async def test_scope_is_part_of_the_key(client: AsyncClient, cache, ceo_headers, project):
+    await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+    res = await client.get(
+        "/api/v1/dashboard/kpis", headers=ceo_headers, params={"region": "Mwanza"}
+    )
+    assert res.json()["total_projects"] == 0
+    assert cache.misses == 2
+
+
+async def test_writes_invalidate(
+    client: AsyncClient, cache, ceo_headers, operator_headers, project
+):
+    res = await client.get("/api/v1/projects/map", headers=ceo_headers)
+    assert res.json() == []
+    await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+
+    res = await client.post(
+        "/api/v1/projects",
+        headers=ceo_headers,
+        json={
+            "name": "Mwanza Intake",
+            "project_code": "TZ-WP-0002",
+            "project_type": "treatment_plant",
+            "region": "Mwanza",
+            "district": "Ilemela",
+            "latitude": -2.5,
+            "longitude": 32.9,
+        },
+    )
+    assert res.status_code == 201
+    new_id = res.json()["id"]
+    res = await client.get("/api/v1/projects/map", headers=ceo_headers)
+    assert [p["id"] for p in res.json()] == [new_id]
+
+    await client.patch(
+        f"/api/v1/projects/{new_id}", headers=ceo_headers, json={"name": "Capri Point"}
+    )
+    res = await client.get("/api/v1/projects/map", headers=ceo_headers)
+    assert res.json()[0]["name"] == "Capri Point"
+
+    res = await client.post(
+        "/api/v1/metrics",
+        headers=operator_headers,
+        json={"project_id": project.id, "metric_type": "flow", "value": 42.0, "unit": "L/s"},
+    )
+    assert res.status_code == 201
+    res = await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+    assert res.json()["avg_flow_rate_ls"] == 42.0
+    assert cache.hits == 0
+
+
+async def test_alert_acknowledge_invalidates(
+    client: AsyncClient, cache, ceo_headers, db_session, project
+):
+    alert = await create_alert(db_session, {
+        "project_id": project.id, "title": "Leak", "message": "m", "alert_type": "leak",
+    })
+    await db_session.commit()
+
+    res = await client.get("/api/v1/alerts", headers=ceo_headers)
+    assert [a["id"] for a in res.json()] == [alert.id]
+    res = await client.post(f"/api/v1/alerts/{alert.id}/acknowledge", headers=ceo_headers)
+    assert res.status_code == 200
+    res = await client.get("/api/v1/alerts", headers=ceo_headers)
+    assert res.json() == []
+
+
+class BrokenRedis:
+    async def mget(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def aclose(self):
+        pass
+
+
+async def test_redis_errors_are_misses():
+    cache = ResponseCache(url="redis://unused", ttl_seconds=60)
+    cache.use_client(BrokenRedis())
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"ok": True}
+
+    assert await cache.get_or_set("x", ("projects",), {}, loader) == {"ok": True}
+    # Backing off: Redis is skipped entirely until the retry window passes
+    assert await cache.get_or_set("x", ("projects",), {}, loader) == {"ok": True}
+    assert len(calls) == 2
+    assert cache.misses == 1
+
+
+async def test_failing_after_commit_callback_does_not_fail_the_write(
+    client: AsyncClient, project, operator_headers, monkeypatch
+):
+    from app.core.pubsub import broker
+    from app.services.last_values import last_values, series_key
+
+    async def publish_many(*args):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(broker, "publish_many", publish_many)
+    res = await client.post("/api/v1/metrics", headers=operator_headers, json={
+        "project_id": project.id, "metric_type": "flow", "value": 10.0, "unit": "L/s",
+    })
+    # The row committed, so the client must not retry it; later callbacks still ran
+    assert res.status_code == 201
+    assert last_values.get(series_key(project.id, None, "flow")) is not None
@@ -0,0 +1,197 @@
+"""Dashboard KPI tests."""
+
+from datetime import datetime, timezone
+
+from httpx import AsyncClient
+from sqlalchemy import delete, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import timescale
+from app.crud.metric import (
+    batch_create_metrics,
+    create_quality_reading,
+    rebuild_metric_totals,
+)
+from app.models.alert import Alert
+from app.models.metric import Metric, MetricTotal, WaterQualityReading
+from app.models.project import WaterProject
+
+
+async def seed(session: AsyncSession) -> None:
+    projects = [
+        WaterProject(
+            name="Ruvu Lower",
+            project_code="TZ-WP-0001",
+            project_type="pump_station",
+            region="Dar es Salaam",
+            district="Kinondoni",
+            status="operational",
+            population_served=1000,
+            connection_count=100,
+        ),
+        WaterProject(
+            name="Mwanza Intake",
+            project_code="TZ-WP-0002",
+            project_type="treatment_plant",
+            region="Mwanza",
+            district="Ilemela",
+            status="maintenance",
+            population_served=500,
+            connection_count=50,
+        ),
+    ]
+    session.add_all(projects)
+    await session.commit()
+    for p in projects:
+        await session.refresh(p)
+
+    pid = projects[0].id
+    await batch_create_metrics(session, [
+        {"project_id": pid, "metric_type": "flow", "value": 100.0, "unit": "L/s"},
+        {"project_id": pid, "metric_type": "flow", "value": 50.0, "unit": "L/s"},
+        {"project_id": pid, "metric_type": "pressure", "value": 3.0, "unit": "bar"},
+        {"project_id": pid, "metric_type": "level", "value": 80.0, "unit": "%"},
+    ])
+    for ph in (7.0, 7.1, 9.5):
+        await create_quality_reading(session, {"project_id": pid, "ph": ph})
+    session.add_all([
+        Alert(project_id=pid, title="Leak", message="m", alert_type="leak"),
+        Alert(project_id=pid, title="Old", message="m", alert_type="leak", status="resolved"),
+    ])
+    await session.commit()
+
+
+async def test_kpis(client: AsyncClient, ceo_headers, db_session):
+    await seed(db_session)
+    res = await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["total_projects"] == 2
+    assert body["operational_projects"] == 1
+    assert body["total_population_served"] == 1500
+    assert body["total_connections"] == 150
+    assert body["avg_flow_rate_ls"] == 75.0
+    assert body["avg_pressure_bar"] == 3.0
+    assert body["active_alerts"] == 1
+    assert body["nrw_percentage"] == 35.0
+    assert body["water_quality_compliance_pct"] == 66.7
+    assert body["data_as_of"] is not None
+
+
+async def test_kpis_region_filter(client: AsyncClient, ceo_headers, db_session):
+    await seed(db_session)
+    res = await client.get(
+        "/api/v1/dashboard/kpis", headers=ceo_headers, params={"region": "Mwanza"}
+    )
+    body = res.json()
+    assert body["total_projects"] == 1
+    assert body["operational_projects"] == 0
+    assert body["total_population_served"] == 500
+    assert body["avg_flow_rate_ls"] == 0.0
+    assert body["active_alerts"] == 0
+    assert body["data_as_of"] is None
+
+
+async def test_kpis_empty(client: AsyncClient, ceo_headers):
+    res = await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)
+    body = res.json()
+    assert body["total_projects"] == 0
+    assert body["avg_flow_rate_ls"] == 0.0
+    assert body["water_quality_compliance_pct"] == 100.0
+
+
+async def test_kpis_accumulate_on_ingest(
+    client: AsyncClient, ceo_headers, operator_headers, db_session
+):
+    await seed(db_session)
+    project_id = (await db_session.exec(
+        select(WaterProject.id).where(WaterProject.region == "Dar es Salaam")
+    )).one()
+    res = await client.post(
+        "/api/v1/metrics",
+        headers=operator_headers,
+        json={"project_id": project_id, "metric_type": "flow", "value": 150.0, "unit": "L/s"},
+    )
+    assert res.status_code == 201
+    body = (await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)).json()
+    assert body["avg_flow_rate_ls"] == 100.0
+
+
+async def test_rebuild_metric_totals(client: AsyncClient, ceo_headers, db_session):
+    await seed(db_session)
+    before = (await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)).json()
+
+    pid = (await db_session.exec(select(WaterProject.id))).first()
+    db_session.add(Metric(project_id=pid, metric_type="flow", value=300.0, unit="L/s"))
+    db_session.add(WaterQualityReading(project_id=pid, is_compliant=True))
+    await db_session.exec(delete(MetricTotal))
+    await rebuild_metric_totals(db_session)
+    await db_session.commit()
+
+    after = (await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)).json()
+    assert after["avg_flow_rate_ls"] == 150.0
+    assert after["avg_pressure_bar"] == before["avg_pressure_bar"]
+    assert after["water_quality_compliance_pct"] == 75.0
+
+
+async def test_region_summary(client: AsyncClient, ceo_headers, db_session):
+    await seed(db_session)
+    res = await client.get("/api/v1/dashboard/regions", headers=ceo_headers)
+    assert res.status_code == 200
+    regions = {r["region"]: r for r in res.json()}
+    assert regions["Dar es Salaam"]["avg_flow_rate_ls"] == 75.0
+    assert regions["Dar es Salaam"]["data_as_of"] is not None
+    assert regions["Mwanza"]["project_count"] == 1
+    assert regions["Mwanza"]["avg_pressure_bar"] == 0.0
+
+
+async def test_kpis_total_readings_from_daily_aggregate(
+    client: AsyncClient, ceo_headers, db_session, monkeypatch
+):
+    # A plain table stands in for the continuous aggregate
+    monkeypatch.setattr(timescale, "available_aggregates", [timescale.CONTINUOUS_AGGREGATES[-1]])
+    await db_session.exec(text("""
+        CREATE TABLE metrics_daily (
+            project_id INTEGER, metric_type VARCHAR, bucket TIMESTAMPTZ,
+            sum_value DOUBLE PRECISION, count BIGINT
+        )
+    """))
+    await db_session.commit()
+    try:
+        await seed(db_session)
+        # Ingest only keeps quality compliance in the running totals
+        stored = (await db_session.exec(select(MetricTotal.metric_type))).all()
+        assert stored == ["quality_compliance"]
+
+        pid = (await db_session.exec(
+            select(WaterProject.id).where(WaterProject.region == "Dar es Salaam")
+        )).one()
+        # The first day's raw chunk has been dropped; its rollup remains
+        await db_session.exec(text("""
+            INSERT INTO metrics_daily VALUES
+                (:pid, 'flow', :day1, 300.0, 1),
+                (:pid, 'flow', :day2, 150.0, 2),
+                (:pid, 'pressure', :day2, 3.0, 1)
+        """), params={
+            "pid": pid,
+            "day1": datetime(2025, 6, 1, tzinfo=timezone.utc),
+            "day2": datetime(2025, 6, 2, tzinfo=timezone.utc),
+        })
+        await db_session.commit()
+
+        body = (await client.get("/api/v1/dashboard/kpis", headers=ceo_headers)).json()
+        assert body["avg_flow_rate_ls"] == 150.0
+        assert body["avg_pressure_bar"] == 3.0
+        assert body["water_quality_compliance_pct"] == 66.7
+        assert body["data_as_of"] is not None
+
+        regions = {
+            r["region"]: r
+            for r in (await client.get("/api/v1/dashboard/regions", headers=ceo_headers)).json()
+        }
+        assert regions["Dar es Salaam"]["avg_flow_rate_ls"] == 150.0
+    finally:
+        await db_session.rollback()
+        await db_session.exec(text("DROP TABLE IF EXISTS metrics_daily"))
+        await db_session.commit()
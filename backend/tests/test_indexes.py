@@ -0,0 +1,160 @@
+"""Index coverage of the hot read paths, checked with EXPLAIN."""
+
+import importlib.util
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import event, text
+
+from app.crud.alert import create_alert, get_active_alerts
+from app.crud.metric import (
+    batch_create_metrics,
+    get_aggregated_metrics,
+    get_latest_metrics,
+    get_metrics,
+)
+from app.models.project import WaterProject
+from tests.conftest import engine
+
+MIGRATION = (
+    Path(__file__).parents[1] / "alembic" / "versions" / "0001_metric_alert_query_indexes.py"
+)
+
+
+METRIC_TYPES = ("flow", "pressure", "level", "energy")
+
+
+@pytest.fixture
+async def seeded(db_session, project):
+    """A few weeks of readings and alerts spread over 20 projects."""
+    others = [
+        WaterProject(
+            project_code=f"TZ-WP-9{i:03d}",
+            name=f"Project {i}",
+            project_type="borehole",
+            region="Dodoma",
+            district="Dodoma Urban",
+        )
+        for i in range(19)
+    ]
+    db_session.add_all(others)
+    await db_session.flush()
+    project_ids = [project.id] + [p.id for p in others]
+
+    start = datetime.now(timezone.utc) - timedelta(seconds=30 * 50_000)
+    await batch_create_metrics(db_session, [
+        {
+            "project_id": project_ids[i % 20],
+            "metric_type": METRIC_TYPES[(i // 20) % 4],
+            "value": float(i % 50),
+            "unit": "",
+            "recorded_at": start + timedelta(seconds=30 * i),
+        }
+        for i in range(50_000)
+    ])
+    for i in range(400):
+        alert = await create_alert(db_session, {
+            "project_id": project_ids[i % 20],
+            "title": f"Alert {i}",
+            "message": "m",
+            "alert_type": "leak",
+        })
+        if i % 4:
+            alert.status = "resolved"
+    await db_session.flush()
+    await db_session.exec(text("ANALYZE metrics"))
+    await db_session.exec(text("ANALYZE alerts"))
+    return project
+
+
+async def explain(session, query) -> str:
+    """Plan of the single statement `query()` sends, with seq scans discouraged."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await query()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    statement, parameters = captured[-1]
+
+    conn = await session.connection()
+    await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    rows = (await conn.exec_driver_sql("EXPLAIN " + statement, parameters)).all()
+    return "\n".join(row[0] for row in rows)
+
+
+async def test_metric_history_by_type_uses_composite_index(db_session, seeded):
+    now = datetime.now(timezone.utc)
+    plan = await explain(db_session, lambda: get_metrics(
+        db_session, seeded.id, "flow", now - timedelta(hours=6), now, limit=100
+    ))
+    assert "ix_metrics_project_type_recorded" in plan
+
+
+async def test_metric_history_page_uses_project_index(db_session, seeded):
+    cursor = (datetime.now(timezone.utc) - timedelta(days=1), 1000)
+    plan = await explain(db_session, lambda: get_metrics(
+        db_session, seeded.id, limit=100, cursor=cursor
+    ))
+    assert "ix_metrics_project_recorded" in plan
+
+
+async def test_latest_metrics_is_primary_key_read(db_session, seeded):
+    plan = await explain(db_session, lambda: get_latest_metrics(db_session, seeded.id))
+    assert "metric_latest_pkey" in plan
+    assert " metrics " not in plan
+
+
+async def test_raw_aggregation_uses_composite_index(db_session, seeded):
+    now = datetime.now(timezone.utc)
+    plan = await explain(db_session, lambda: get_aggregated_metrics(
+        db_session, seeded.id, "flow", "1 hour", now - timedelta(days=1), now
+    ))
+    assert "ix_metrics_project_type_recorded" in plan
+
+
+async def test_active_alerts_use_partial_indexes(db_session, seeded):
+    plan = await explain(db_session, lambda: get_active_alerts(db_session, limit=20))
+    assert "ix_alerts_active_created" in plan
+
+    plan = await explain(db_session, lambda: get_active_alerts(db_session, seeded.id, limit=20))
+    assert "ix_alerts_active_project_created" in plan
+
+
+async def _index_names(conn) -> set[str]:
+    result = await conn.exec_driver_sql(
+        "SELECT indexname FROM pg_indexes WHERE tablename IN ('metrics', 'alerts')"
+    )
+    return {row[0] for row in result}
+
+
+async def test_migration_replaces_legacy_indexes():
+    spec = importlib.util.spec_from_file_location("migration_0001", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    def run(sync_conn, step):
+        with Operations.context(MigrationContext.configure(sync_conn)):
+            step()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(run, migration.downgrade)
+        names = await _index_names(conn)
+        assert {"ix_metrics_metric_type", "ix_alerts_status"} <= names
+        assert "ix_metrics_project_type_recorded" not in names
+
+        await conn.run_sync(run, migration.upgrade)
+        names = await _index_names(conn)
+        assert set(migration.NEW_INDEXES) <= names
+        assert not names & {
+            f"ix_{table}_{column}"
+            for table, columns in migration.LEGACY_INDEXES.items()
+            for column in columns
+        }
@@ -0,0 +1,223 @@
+"""Write-behind ingest buffer tests."""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlmodel import func, select
+
+from app.models.metric import Metric, MetricTotal
+from app.services import ingest_buffer as buffer_module
+from app.services.ingest_buffer import BufferFull, IngestBuffer, ingest_buffer
+from tests.conftest import test_session_factory as session_factory
+
+
+@pytest_asyncio.fixture
+async def running_buffer():
+    ingest_buffer.reset_stats()
+    ingest_buffer.start(session_factory)
+    yield ingest_buffer
+    await ingest_buffer.stop()
+
+
+def _reading(project_id: int, value: float) -> dict:
+    return {"project_id": project_id, "metric_type": "flow", "value": value, "unit": "L/s"}
+
+
+async def _metric_count(db_session) -> int:
+    return (await db_session.exec(select(func.count(Metric.id)))).one()
+
+
+async def test_stop_drains_queue(project, db_session):
+    buffer = IngestBuffer(max_size=100, batch_size=4, flush_seconds=60)
+    buffer.start(session_factory)
+    buffer.submit([_reading(project.id, float(v)) for v in range(10)])
+    await buffer.stop()
+
+    assert await _metric_count(db_session) == 10
+    assert buffer.depth == 0
+    stats = buffer.stats()
+    assert stats["written"] == 10
+    assert stats["flushes"] == 3  # 4 + 4 + 2
+    assert not stats["running"]
+
+    total = await db_session.get(MetricTotal, (project.id, "flow"))
+    assert total.value_count == 10
+
+
+async def test_flushes_partial_batch_after_interval(project, db_session):
+    buffer = IngestBuffer(max_size=100, batch_size=1000, flush_seconds=0.05)
+    buffer.start(session_factory)
+    try:
+        buffer.submit([_reading(project.id, 1.0), _reading(project.id, 2.0)])
+        for _ in range(100):
+            if buffer.written:
+                break
+            await asyncio.sleep(0.02)
+        assert buffer.written == 2
+        assert buffer.flushes == 1
+        assert await _metric_count(db_session) == 2
+    finally:
+        await buffer.stop()
+
+
+async def test_backpressure_rejects_whole_submission(project):
+    buffer = IngestBuffer(max_size=3, batch_size=10, flush_seconds=60)
+    with pytest.raises(BufferFull):
+        buffer.submit([_reading(project.id, 1.0)])  # not started
+
+    buffer.start(session_factory)
+    buffer.submit([_reading(project.id, 1.0), _reading(project.id, 2.0)])
+    with pytest.raises(BufferFull):
+        buffer.submit([_reading(project.id, 3.0), _reading(project.id, 4.0)])
+    assert buffer.depth <= 2
+    assert buffer.rejected == 3
+    await buffer.stop()
+    assert buffer.written == 2
+
+
+async def test_submit_stamps_recorded_at(project):
+    buffer = IngestBuffer(max_size=10, batch_size=10, flush_seconds=60)
+    buffer.start(session_factory)
+    reading = _reading(project.id, 1.0)
+    buffer.submit([reading])
+    assert reading["recorded_at"] is not None
+    await buffer.stop()
+
+
+async def test_batch_route_buffers(
+    client: AsyncClient, project, operator_headers, running_buffer, db_session
+):
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={"metrics": [_reading(project.id, 100.0), _reading(project.id, 900.0)]},
+    )
+    assert res.status_code == 202
+    assert res.json()["accepted"] == 2
+
+    res = await client.post(
+        "/api/v1/metrics", headers=operator_headers, json=_reading(project.id, 110.0)
+    )
+    assert res.status_code == 202
+
+    await running_buffer.stop()
+    rows = (await db_session.exec(select(Metric).order_by(Metric.value))).all()
+    assert [m.value for m in rows] == [100.0, 110.0, 900.0]
+    # Scored before queueing
+    assert rows[-1].is_anomaly
+
+
+async def test_route_returns_429_when_full(
+    client: AsyncClient, project, operator_headers, running_buffer, monkeypatch
+):
+    monkeypatch.setattr(running_buffer, "max_size", 1)
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={"metrics": [_reading(project.id, 1.0), _reading(project.id, 2.0)]},
+    )
+    assert res.status_code == 429
+    assert res.headers["retry-after"] == "1"
+
+
+async def test_ingest_stats(client: AsyncClient, ceo_headers, running_buffer):
+    res = await client.get("/api/v1/metrics/ingest/stats", headers=ceo_headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["running"] is True
+    assert body["queue_depth"] == 0
+    assert {"last_flush_ms", "avg_flush_ms", "max_flush_ms"} <= body.keys()
+
+
+async def test_routes_write_directly_without_buffer(
+    client: AsyncClient, project, operator_headers
+):
+    assert not ingest_buffer.running
+    res = await client.post(
+        "/api/v1/metrics", headers=operator_headers, json=_reading(project.id, 110.0)
+    )
+    assert res.status_code == 201
+    assert res.json()["id"]
+
+
+async def test_bad_reading_costs_only_itself(project, db_session):
+    buffer = IngestBuffer(max_size=100, batch_size=8, flush_seconds=60, dead_letters=5)
+    buffer.start(session_factory)
+    batch = [_reading(project.id, float(v)) for v in range(8)]
+    batch[5]["project_id"] = project.id + 1000  # no such project
+    buffer.submit(batch)
+    await buffer.stop()
+
+    assert await _metric_count(db_session) == 7
+    assert (buffer.written, buffer.failed, buffer.flushes) == (7, 1, 1)
+    assert [d["value"] for d in buffer.dead_letters] == [5.0]
+    total = await db_session.get(MetricTotal, (project.id, "flow"))
+    assert total.value_count == 7
+
+
+async def test_connection_errors_retry_the_whole_batch(project, db_session, monkeypatch):
+    store_metrics, calls = buffer_module.store_metrics, []
+
+    async def flaky(session, batch):
+        calls.append(len(batch))
+        if len(calls) <= 2:
+            raise ConnectionResetError("database went away")
+        return await store_metrics(session, batch)
+
+    monkeypatch.setattr(buffer_module, "store_metrics", flaky)
+    buffer = IngestBuffer(max_size=100, batch_size=8, flush_seconds=60, retry_seconds=0.01)
+    buffer.start(session_factory)
+    buffer.submit([_reading(project.id, float(v)) for v in range(8)])
+    await buffer.stop()
+
+    # Held and retried whole, never split or dead-lettered
+    assert calls == [8, 8, 8]
+    assert (buffer.written, buffer.failed, buffer.retries) == (8, 0, 2)
+    assert not buffer.dead_letters
+    assert await _metric_count(db_session) == 8
+
+
+async def test_drain_task_survives_a_failed_flush(project, db_session, monkeypatch):
+    buffer = IngestBuffer(max_size=100, batch_size=2, flush_seconds=60)
+    flush, calls = buffer.flush, []
+
+    async def failing_once(session_factory, batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        await flush(session_factory, batch)
+
+    monkeypatch.setattr(buffer, "flush", failing_once)
+    buffer.start(session_factory)
+    buffer.submit([_reading(project.id, float(v)) for v in range(4)])
+    for _ in range(100):
+        if len(calls) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert buffer.running
+    await buffer.stop()
+    assert (buffer.written, buffer.failed, len(buffer.dead_letters)) == (2, 2, 2)
+    assert await _metric_count(db_session) == 2
+
+
+async def test_routes_refuse_unknown_projects(
+    client: AsyncClient, project, operator_headers, ceo_headers, running_buffer
+):
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={"metrics": [_reading(project.id, 1.0), _reading(project.id + 1000, 2.0)]},
+    )
+    assert res.status_code == 422
+    assert str(project.id + 1000) in res.json()["detail"]
+    res = await client.post(
+        "/api/v1/metrics", headers=operator_headers, json=_reading(project.id + 1000, 1.0)
+    )
+    assert res.status_code == 422
+    assert running_buffer.accepted == 0
+
+    res = await client.get("/api/v1/metrics/ingest/dead-letters", headers=ceo_headers)
+    assert res.status_code == 200
+    assert res.json() == []
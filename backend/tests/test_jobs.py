@@ -0,0 +1,196 @@
+"""Background job tests. Jobs run eagerly (see conftest), so results are ready on submit."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlmodel import select
+
+from app.crud.metric import batch_create_metrics
+from app.models.alert import Alert, AlertRule
+from app.models.link import UserTenant
+from app.models.metric import Metric, MetricLatest
+from app.models.notification import Notification
+from app.models.project import Tenant, WaterProject
+from app.models.user import User
+from app.services import notifications
+from app.services.model_registry import model_registry
+from app.services.notifications import notification_dispatcher
+from app.worker.celery_app import celery_app
+from app.worker.jobs import init_worker_process, job_owner, submit
+from app.worker.tasks import reports
+
+T0 = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    """The shared model registry, emptied and saving under tmp_path."""
+    monkeypatch.setattr(model_registry, "model_dir", tmp_path)
+    monkeypatch.setattr(model_registry, "_models", {})
+    monkeypatch.setattr(model_registry, "_pending", set())
+    monkeypatch.setattr(model_registry, "_mtimes", {})
+    return model_registry
+
+
+def _reading(project_id: int, value: float, minutes: int, **extra) -> dict:
+    return {
+        "project_id": project_id, "sensor_id": "P-1", "metric_type": "pressure",
+        "value": value, "unit": "bar", "recorded_at": T0 + timedelta(minutes=minutes), **extra,
+    }
+
+
+def test_tasks_are_routed_by_kind():
+    routes = {
+        "app.worker.tasks.uploads.ingest_upload": "ingest",
+        "app.worker.tasks.models.refit_models": "ml",
+        "app.worker.tasks.models.rescore_metrics": "ml",
+        "app.worker.tasks.reports.aggregated_report": "reports",
+    }
+    for name, queue in routes.items():
+        assert name in celery_app.tasks
+        assert celery_app.amqp.router.route({}, name)["queue"].name == queue
+
+
+async def test_rescore_rewrites_stored_flags(
+    client: AsyncClient, project, db_session, ceo_headers, operator_headers, registry
+):
+    # Stored with stale scores: 20 bar is far above the pressure range
+    await batch_create_metrics(db_session, [
+        _reading(project.id, 4.0, 0, is_anomaly=True, anomaly_score=0.9),
+        _reading(project.id, 20.0, 1, is_anomaly=False, anomaly_score=0.0),
+    ])
+    await db_session.commit()
+
+    url = f"/api/v1/metrics/{project.id}/rescore"
+    assert (await client.post(url, headers=operator_headers)).status_code == 403
+    res = await client.post(url, headers=ceo_headers)
+    assert res.status_code == 202
+    assert res.json()["result"] == {"rescored": 2, "anomalies": 1}
+
+    rows = (await db_session.exec(
+        select(Metric).order_by(Metric.id).execution_options(populate_existing=True)
+    )).all()
+    assert [(m.is_anomaly, m.quality_flag) for m in rows] == [
+        (False, "good"), (True, "suspect")
+    ]
+    latest = (await db_session.exec(
+        select(MetricLatest).execution_options(populate_existing=True)
+    )).one()
+    assert (latest.value, latest.is_anomaly) == (20.0, True)
+
+
+async def test_refit_saves_models_for_the_api_to_load(
+    client: AsyncClient, project, db_session, ceo_headers, registry
+):
+    await batch_create_metrics(db_session, [
+        _reading(project.id, 3.0 + (i % 5) * 0.1, i) for i in range(40)
+    ])
+    await db_session.commit()
+
+    res = await client.post(
+        "/api/v1/metrics/models/refit", headers=ceo_headers, params={"project_id": project.id}
+    )
+    assert res.json()["result"] == {"series": 1, "refitted": 1}
+    assert len(list(registry.model_dir.glob("*.joblib"))) == 1
+
+    # Another process only loads what changed on disk
+    registry._models.clear()
+    registry._mtimes.clear()
+    assert registry.load() == 1
+    assert registry.load() == 0
+    assert registry.get((project.id, "P-1", "pressure")).n_samples == 40
+
+
+async def test_report_job_and_status(
+    client: AsyncClient, project, db_session, ceo_headers, operator_headers
+):
+    await batch_create_metrics(db_session, [
+        _reading(project.id, value, minutes)
+        for value, minutes in ((2.0, 0), (4.0, 30), (6.0, 90))
+    ])
+    await db_session.commit()
+
+    url = f"/api/v1/metrics/{project.id}/aggregated/report"
+    params = {
+        "metric_type": "pressure", "interval": "1 hour",
+        "start_time": T0.isoformat(), "end_time": (T0 + timedelta(hours=2)).isoformat(),
+    }
+    assert (await client.post(url, headers=operator_headers, params=params)).status_code == 403
+    bad = await client.post(url, headers=ceo_headers, params={**params, "interval": "soon"})
+    assert bad.status_code == 400
+
+    res = await client.post(url, headers=ceo_headers, params=params)
+    assert res.status_code == 202
+    job_url = f"/api/v1/jobs/{res.json()['id']}"
+    job = (await client.get(job_url, headers=ceo_headers)).json()
+    assert job["status"] == "SUCCESS"
+    assert [(row["avg_value"], row["count"]) for row in job["result"]] == [(3.0, 2), (6.0, 1)]
+
+    # Only the submitter sees a job; to anyone else it does not exist
+    assert (await client.get(job_url, headers=operator_headers)).status_code == 404
+    unknown = await client.get("/api/v1/jobs/does-not-exist", headers=ceo_headers)
+    assert unknown.status_code == 404
+    assert (await client.get("/api/v1/jobs/does-not-exist")).status_code in (401, 403)
+
+
+async def test_eager_job_runs_on_the_calling_loop(monkeypatch):
+    loops = []
+
+    async def report(*args):
+        loops.append(asyncio.get_running_loop())
+        return []
+
+    monkeypatch.setattr(reports, "_report", report)
+    job = await submit(reports.aggregated_report, 1, "flow", owner=7)
+    assert job["status"] == "SUCCESS"
+    assert loops == [asyncio.get_running_loop()]
+    assert job_owner(job["id"]) == 7
+
+
+async def test_uploaded_breach_queues_notifications(
+    client: AsyncClient, db_session, operator_headers, monkeypatch, tmp_path
+):
+    from app.api.routes import metrics as metrics_routes
+
+    monkeypatch.setattr(metrics_routes.settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics_routes.settings, "UPLOAD_CHUNK_ROWS", 1)
+    monkeypatch.setattr(notifications.settings, "SMTP_HOST", "smtp.test")
+    monkeypatch.setattr(notification_dispatcher, "email", None)
+    monkeypatch.setattr(notification_dispatcher, "sms", None)
+    init_worker_process()  # what a worker runs instead of the API's lifespan
+    assert notification_dispatcher.channels == {"email"}
+
+    tenant = Tenant(name="DAWASA", code="DAWASA", region="Dar es Salaam")
+    db_session.add(tenant)
+    await db_session.flush()
+    site = WaterProject(name="Kimara", project_code="TZ-WP-0100", project_type="borehole",
+                        region="Dar es Salaam", district="Ubungo", tenant_id=tenant.id)
+    user = User(email="op@example.com", full_name="Op", hashed_password="x", role="operator")
+    db_session.add_all([site, user, AlertRule(
+        name="Low Pressure", metric_type="pressure", condition="lt", threshold=1.0,
+        notify_email=True,
+    )])
+    await db_session.flush()
+    db_session.add(UserTenant(user_id=user.id, tenant_id=tenant.id))
+    await db_session.commit()
+
+    csv = "project_id,sensor_id,metric_type,value,unit,recorded_at\n" + "".join(
+        f"{site.id},P-1,pressure,{value},bar,2025-06-01T00:0{i}:00Z\n"
+        for i, value in enumerate((0.5, 0.4, 0.3))
+    )
+    res = await client.post(
+        "/api/v1/metrics/upload/csv",
+        headers=operator_headers,
+        files={"file": ("readings.csv", csv, "text/csv")},
+    )
+    assert res.json()["result"]["ingested"] == 3
+
+    # Repeats counted during the job are written before it ends
+    (alert,) = (await db_session.exec(select(Alert))).all()
+    assert (alert.status, alert.occurrences, alert.metric_value) == ("active", 3, 0.3)
+    rows = (await db_session.exec(select(Notification))).all()
+    assert [(n.alert_id, n.channel, n.recipient) for n in rows] == [
+        (alert.id, "email", "op@example.com")
+    ]
@@ -0,0 +1,125 @@
+"""Latest-reading table tests."""
+
+from datetime import datetime, timedelta, timezone
+
+from httpx import AsyncClient
+from sqlmodel import select
+
+from app.crud.metric import (
+    batch_create_metrics,
+    create_metric,
+    ensure_metric_latest,
+    get_latest_metrics,
+    rebuild_metric_latest,
+)
+from app.models.metric import MetricLatest
+
+T0 = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def _reading(project_id: int, value: float, minutes: int, **extra) -> dict:
+    return {
+        "project_id": project_id,
+        "metric_type": "pressure",
+        "value": value,
+        "unit": "bar",
+        "recorded_at": T0 + timedelta(minutes=minutes),
+        **extra,
+    }
+
+
+async def _snapshot(session) -> list[tuple]:
+    rows = (await session.exec(select(MetricLatest).order_by(
+        MetricLatest.project_id, MetricLatest.metric_type, MetricLatest.sensor_id
+    ))).all()
+    return [
+        (r.project_id, r.metric_type, r.sensor_id, r.metric_id, r.value, r.recorded_at)
+        for r in rows
+    ]
+
+
+async def test_latest_per_series(db_session, project):
+    await batch_create_metrics(db_session, [
+        _reading(project.id, 3.0, 0, sensor_id="P-1"),
+        _reading(project.id, 3.5, 5, sensor_id="P-1"),
+        _reading(project.id, 2.0, 1, sensor_id="P-2"),
+        _reading(project.id, 1.0, 2),
+        {**_reading(project.id, 40.0, 3), "metric_type": "flow", "unit": "L/s"},
+    ])
+
+    latest = await get_latest_metrics(db_session, project.id)
+    by_series = {(m.metric_type, m.sensor_id): m for m in latest}
+    assert len(latest) == 4
+    assert by_series[("pressure", "P-1")].value == 3.5
+    assert by_series[("pressure", "P-2")].value == 2.0
+    assert by_series[("pressure", None)].value == 1.0
+    assert by_series[("flow", None)].value == 40.0
+    assert all(m.id is not None for m in latest)
+
+
+async def test_older_batches_do_not_regress(db_session, project):
+    await batch_create_metrics(db_session, [_reading(project.id, 5.0, 10, sensor_id="P-1")])
+    await batch_create_metrics(db_session, [_reading(project.id, 9.0, 1, sensor_id="P-1")])
+    await create_metric(db_session, _reading(project.id, 8.0, 2, sensor_id="P-1"))
+
+    (latest,) = await get_latest_metrics(db_session, project.id)
+    assert latest.value == 5.0
+    assert latest.recorded_at == T0 + timedelta(minutes=10)
+
+
+async def test_timestamp_ties_keep_one_row(db_session, project):
+    await batch_create_metrics(db_session, [
+        _reading(project.id, 1.0, 0, sensor_id="P-1"),
+        _reading(project.id, 2.0, 0, sensor_id="P-1"),
+    ])
+    await batch_create_metrics(db_session, [_reading(project.id, 3.0, 0, sensor_id="P-1")])
+
+    latest = await get_latest_metrics(db_session, project.id)
+    assert [m.value for m in latest] == [3.0]
+
+
+async def test_single_insert_updates_latest(db_session, project):
+    metric = await create_metric(db_session, _reading(project.id, 4.2, 0))
+    (latest,) = await get_latest_metrics(db_session, project.id)
+    assert latest.id == metric.id
+    assert latest.value == 4.2
+
+
+async def test_rebuild_matches_incremental(db_session, project):
+    await batch_create_metrics(db_session, [
+        _reading(project.id, float(i), i % 7, sensor_id=f"P-{i % 3}") for i in range(30)
+    ])
+    incremental = await _snapshot(db_session)
+
+    await rebuild_metric_latest(db_session)
+    assert await _snapshot(db_session) == incremental
+
+
+async def test_ensure_backfills_empty_table(db_session, project):
+    await batch_create_metrics(db_session, [_reading(project.id, 1.0, 0)])
+    await db_session.exec(MetricLatest.__table__.delete())
+    await db_session.commit()
+
+    await ensure_metric_latest(db_session)
+    assert len(await get_latest_metrics(db_session, project.id)) == 1
+
+
+async def test_latest_route(client: AsyncClient, operator_headers, project):
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={"metrics": [
+            {"project_id": project.id, "metric_type": "flow", "value": 10.0, "unit": "L/s",
+             "recorded_at": "2025-06-01T00:00:00Z"},
+            {"project_id": project.id, "metric_type": "flow", "value": 12.0, "unit": "L/s",
+             "recorded_at": "2025-06-01T00:05:00Z"},
+        ]},
+    )
+    assert res.status_code == 201
+
+    res = await client.get(f"/api/v1/metrics/{project.id}/latest", headers=operator_headers)
+    assert res.status_code == 200
+    (latest,) = res.json()
+    assert latest["value"] == 12.0
+    assert latest["sensor_id"] is None
+    assert isinstance(latest["id"], int)
@@ -0,0 +1,307 @@
+"""Metric ingestion tests."""
+
+import importlib.util
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from httpx import AsyncClient
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import flush_stale
+from app.crud.metric import (
+    batch_create_metrics,
+    batch_create_metrics_copy,
+    batch_create_metrics_orm,
+)
+from app.models.metric import Metric
+from app.services.anomaly import AnomalyStrategy, online_detector
+from app.services.ingest import prepare_metrics, store_metrics
+from app.services.last_values import last_values
+from tests.conftest import engine
+
+MIGRATION = Path(__file__).parents[1] / "alembic" / "versions" / "0006_timestamptz_columns.py"
+
+
+async def test_batch_ingest(client: AsyncClient, project, operator_headers, db_session):
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={
+            "metrics": [
+                {"project_id": project.id, "metric_type": "flow", "value": 120.5, "unit": "L/s"},
+                {"project_id": project.id, "metric_type": "flow", "value": 900, "unit": "L/s"},
+                {
+                    "project_id": project.id,
+                    "sensor_id": "PRESS-1",
+                    "metric_type": "pressure",
+                    "value": 3.2,
+                    "unit": "bar",
+                    "recorded_at": "2024-01-01T06:00:00Z",
+                },
+            ]
+        },
+    )
+    assert res.status_code == 201
+    assert res.json() == {"ingested": 3}
+
+    result = await db_session.exec(select(Metric).order_by(Metric.id))
+    rows = result.all()
+    assert [r.value for r in rows] == [120.5, 900, 3.2]
+    assert [r.is_anomaly for r in rows] == [False, True, False]
+    assert rows[1].quality_flag == "suspect"
+    assert rows[2].recorded_at == datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+
+
+async def test_copy_and_orm_paths_agree(project, db_session):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            "project_id": project.id,
+            "sensor_id": f"FLOW-{i}",
+            "metric_type": "flow",
+            "value": float(i),
+            "unit": "L/s",
+            "recorded_at": ts,
+        }
+        for i in range(50)
+    ]
+    assert await batch_create_metrics_copy(db_session, rows) == 50
+    assert await batch_create_metrics_orm(db_session, rows) == 50
+    await db_session.commit()
+
+    result = await db_session.exec(select(Metric).order_by(Metric.id))
+    stored = result.all()
+    assert len(stored) == 100
+    assert [m.value for m in stored[:50]] == [m.value for m in stored[50:]]
+    assert all(m.recorded_at == ts for m in stored)
+
+
+async def test_timestamptz_migration_keeps_utc_instants(project, db_session):
+    spec = importlib.util.spec_from_file_location("migration_0006", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    def run(sync_conn, step):
+        with Operations.context(MigrationContext.configure(sync_conn)):
+            step()
+
+    ts = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    await batch_create_metrics_copy(db_session, [{
+        "project_id": project.id, "metric_type": "flow", "value": 1.0, "unit": "L/s",
+        "recorded_at": ts,
+    }])
+    await db_session.commit()
+    await db_session.close()
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        await conn.exec_driver_sql("SET LOCAL TIME ZONE 'Africa/Dar_es_Salaam'")
+        await conn.run_sync(run, migration.downgrade)
+        stored = (await conn.exec_driver_sql("SELECT recorded_at FROM metrics")).scalar_one()
+        assert stored == ts.replace(tzinfo=None)
+
+        # Running it twice is a no-op; the query differs to skip asyncpg's statement cache
+        await conn.run_sync(run, migration.upgrade)
+        await conn.run_sync(run, migration.upgrade)
+        stored = (await conn.exec_driver_sql("SELECT max(recorded_at) FROM metrics")).scalar_one()
+        assert stored == ts
+        await trans.rollback()
+
+
+async def test_upload_csv_streams_in_chunks(
+    client: AsyncClient, project, operator_headers, db_session, monkeypatch, tmp_path
+):
+    from app.api.routes import metrics as metrics_routes
+
+    monkeypatch.setattr(metrics_routes.settings, "UPLOAD_CHUNK_ROWS", 2)
+    monkeypatch.setattr(metrics_routes.settings, "UPLOAD_DIR", str(tmp_path))
+    csv = (
+        "project_id,sensor_id,metric_type,value,unit,recorded_at\n"
+        f"{project.id},FLOW-1,flow,100,L/s,2024-01-01T00:00:00Z\n"
+        f"{project.id},FLOW-1,flow,not-a-number,L/s,2024-01-01T01:00:00Z\n"
+        f"{project.id},FLOW-1,flow,650,L/s,2024-01-01T02:00:00Z\n"
+        f"{project.id},PRESS-1,pressure,4.1,bar,\n"
+        f"{project.id},PRESS-1,pressure,3.9,bar,2024-01-01T04:00:00Z\n"
+    )
+    res = await client.post(
+        "/api/v1/metrics/upload/csv",
+        headers=operator_headers,
+        files={"file": ("readings.csv", csv, "text/csv")},
+    )
+    # The job runs eagerly in tests; the response already reflects it
+    assert res.status_code == 202
+    job = (await client.get(f"/api/v1/jobs/{res.json()['id']}", headers=operator_headers)).json()
+    assert job["status"] == "SUCCESS"
+    assert job["result"] == {"ingested": 4, "rejected": 1, "filename": "readings.csv"}
+    assert list(tmp_path.iterdir()) == []
+
+    result = await db_session.exec(select(Metric).order_by(Metric.id))
+    rows = result.all()
+    assert [r.value for r in rows] == [100, 650, 4.1, 3.9]
+    assert [r.is_anomaly for r in rows] == [False, True, False, False]
+    assert rows[1].recorded_at == datetime(2024, 1, 1, 2, tzinfo=timezone.utc)
+
+
+async def test_upload_csv_missing_columns(
+    client: AsyncClient, project, operator_headers, monkeypatch, tmp_path
+):
+    from app.api.routes import metrics as metrics_routes
+
+    monkeypatch.setattr(metrics_routes.settings, "UPLOAD_DIR", str(tmp_path))
+    res = await client.post(
+        "/api/v1/metrics/upload/csv",
+        headers=operator_headers,
+        files={"file": ("readings.csv", "project_id,value\n1,2\n", "text/csv")},
+    )
+    assert res.status_code == 202
+    assert res.json()["status"] == "FAILURE"
+    assert "must contain columns" in res.json()["error"]
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_batch_ingest_flags_sudden_jump(
+    client: AsyncClient, project, operator_headers, db_session
+):
+    def reading(value, minute):
+        return {
+            "project_id": project.id,
+            "sensor_id": "FLOW-1",
+            "metric_type": "flow",
+            "value": value,
+            "unit": "L/s",
+            "recorded_at": f"2024-01-01T00:{minute:02d}:00Z",
+        }
+
+    # Sent out of order; the 100 -> 400 L/s jump within a minute is a burst
+    batch = [reading(400, 2), reading(100, 0), reading(101, 1)]
+    res = await client.post(
+        "/api/v1/metrics/batch", headers=operator_headers, json={"metrics": batch}
+    )
+    assert res.status_code == 201
+
+    # The next batch is compared against the cached last value (400 L/s)
+    res = await client.post(
+        "/api/v1/metrics/batch",
+        headers=operator_headers,
+        json={"metrics": [reading(398, 3)]},
+    )
+    assert res.status_code == 201
+
+    result = await db_session.exec(select(Metric).order_by(Metric.recorded_at))
+    assert [(m.value, m.is_anomaly) for m in result.all()] == [
+        (100, False),
+        (101, False),
+        (400, True),
+        (398, False),
+    ]
+
+
+async def test_last_value_cache_warms_from_latest_readings(project, db_session):
+    await batch_create_metrics(
+        db_session,
+        [
+            {
+                "project_id": project.id,
+                "sensor_id": "PRESS-1",
+                "metric_type": "pressure",
+                "value": 4.0,
+                "unit": "bar",
+                "recorded_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+            }
+        ],
+    )
+    await db_session.commit()
+
+    await last_values.warm(db_session, {project.id})
+    assert last_values.get((project.id, "PRESS-1", "pressure")) == (
+        datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp(),
+        4.0,
+    )
+
+
+async def test_last_value_cache_waits_for_commit(project, db_session):
+    key = (project.id, "PRESS-1", "pressure")
+    reading = {
+        "project_id": project.id, "sensor_id": "PRESS-1", "metric_type": "pressure",
+        "value": 4.0, "unit": "bar", "recorded_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    }
+
+    await store_metrics(db_session, await prepare_metrics(db_session, [dict(reading)]))
+    assert last_values.get(key) is None
+    await db_session.rollback()
+    await flush_stale(db_session, committed=False)
+    assert last_values.get(key) is None  # never stored, never a baseline
+
+    await store_metrics(db_session, await prepare_metrics(db_session, [dict(reading)]))
+    await db_session.commit()
+    await flush_stale(db_session)
+    assert last_values.get(key) == (reading["recorded_at"].timestamp(), 4.0)
+
+
+async def test_rolling_baseline_waits_for_commit(project, db_session):
+    key = (project.id, "PRESS-1", "pressure")
+    batch = [
+        {"project_id": project.id, "sensor_id": "PRESS-1", "metric_type": "pressure",
+         "value": 4.0 + 0.1 * (i % 2), "unit": "bar",
+         "recorded_at": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)}
+        for i in range(12)
+    ]
+
+    # A batch that is scored twice (say, resent after a 429) but rolled back
+    for _ in range(2):
+        scored = await prepare_metrics(
+            db_session, [dict(r) for r in batch], AnomalyStrategy.ROLLING
+        )
+    await store_metrics(db_session, scored)
+    await db_session.rollback()
+    await flush_stale(db_session, committed=False)
+    assert online_detector.get(key).count == 0
+
+    await store_metrics(db_session, scored)
+    await db_session.commit()
+    await flush_stale(db_session)
+    window = online_detector.get(key)
+    assert window.count == 12
+    assert abs(window.mean - 4.05) < 1e-9
+
+
+async def test_aggregated_metrics(client: AsyncClient, project, operator_headers, db_session):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await batch_create_metrics_orm(db_session, [
+        {
+            "project_id": project.id,
+            "metric_type": "flow",
+            "value": float(i),
+            "unit": "L/s",
+            "recorded_at": base + timedelta(minutes=20 * i),
+        }
+        for i in range(6)
+    ])
+    await db_session.commit()
+
+    res = await client.get(
+        f"/api/v1/metrics/{project.id}/aggregated",
+        headers=operator_headers,
+        params={
+            "metric_type": "flow",
+            "interval": "1 hour",
+            "start_time": base.isoformat(),
+            "end_time": (base + timedelta(hours=2)).isoformat(),
+        },
+    )
+    assert res.status_code == 200
+    buckets = res.json()
+    assert [b["count"] for b in buckets] == [3, 3]
+    assert buckets[0]["avg_value"] == 1.0
+    assert buckets[1]["max_value"] == 5.0
+    assert datetime.fromisoformat(buckets[1]["period"]) == base + timedelta(hours=1)
+
+    res = await client.get(
+        f"/api/v1/metrics/{project.id}/aggregated",
+        headers=operator_headers,
+        params={"metric_type": "flow", "interval": "1 month"},
+    )
+    assert res.status_code == 400
@@ -0,0 +1,114 @@
+"""Isolation Forest model registry tests."""
+
+from datetime import timedelta
+
+import numpy as np
+
+from app.crud.metric import batch_create_metrics
+from app.services import ingest
+from app.services.anomaly import AnomalyStrategy
+from app.services.model_registry import ModelRegistry, model_key
+from tests.conftest import test_session_factory as session_factory
+
+
+def make_registry(tmp_path) -> ModelRegistry:
+    return ModelRegistry(
+        model_dir=tmp_path,
+        max_age=timedelta(hours=1),
+        min_samples=30,
+        history_limit=1000,
+        drift_rate=0.2,
+    )
+
+
+def normal_history(n: int = 200) -> list[float]:
+    rng = np.random.default_rng(0)
+    return rng.normal(100, 2, n).tolist()
+
+
+async def test_unfitted_series_are_queued(tmp_path):
+    registry = make_registry(tmp_path)
+    is_anomaly, scores, scored = registry.score_batch([1], ["FLOW-1"], ["flow"], [100.0])
+    assert not scored.any()
+    assert not is_anomaly.any()
+    assert registry.pending == {model_key(1, "FLOW-1", "flow")}
+
+
+async def test_fitted_model_scores_without_refit(tmp_path):
+    registry = make_registry(tmp_path)
+    key = model_key(1, "FLOW-1", "flow")
+    entry = await registry.fit(key, normal_history())
+    assert entry is not None
+    model = entry.detector._model
+
+    is_anomaly, scores, scored = registry.score_batch(
+        [1, 1, 2], ["FLOW-1", "FLOW-1", "FLOW-9"], ["flow", "flow", "flow"], [100.5, 160.0, 100.0]
+    )
+    assert scored.tolist() == [True, True, False]
+    assert not is_anomaly[0]
+    assert is_anomaly[1]
+    assert scores[1] > scores[0]
+    assert registry.get(key).detector._model is model
+
+
+async def test_too_little_history_is_not_fitted(tmp_path):
+    registry = make_registry(tmp_path)
+    assert await registry.fit(model_key(1, "", "flow"), [1.0] * 10) is None
+    assert len(registry) == 0
+
+
+async def test_models_persist_across_restart(tmp_path):
+    registry = make_registry(tmp_path)
+    key = model_key(3, "PRESS-1", "pressure")
+    await registry.fit(key, normal_history())
+
+    restarted = make_registry(tmp_path)
+    assert restarted.load() == 1
+    _, scores, scored = restarted.score_batch([3], ["PRESS-1"], ["pressure"], [160.0])
+    assert scored[0]
+    expected = registry.get(key).detector.score_isolation_forest([160.0])[1][0]
+    assert scores[0] == expected
+
+
+async def test_drift_schedules_refit(tmp_path):
+    registry = make_registry(tmp_path)
+    key = model_key(1, "FLOW-1", "flow")
+    await registry.fit(key, normal_history())
+
+    registry.score_batch([1] * 150, ["FLOW-1"] * 150, ["flow"] * 150, [300.0] * 150)
+    assert key in registry.pending
+
+
+async def test_models_raise_scores_but_never_flag(tmp_path, monkeypatch):
+    registry = make_registry(tmp_path)
+    await registry.fit(model_key(1, "FLOW-1", "flow"), normal_history())
+    monkeypatch.setattr(ingest, "model_registry", registry)
+    monkeypatch.setattr(ingest.settings, "ANOMALY_ML_ENABLED", True)
+
+    values = [100.0, 101.0, 160.0]  # all within the flow thresholds
+    rows = ingest.score_metrics(
+        [{"project_id": 1, "sensor_id": "FLOW-1", "metric_type": "flow", "value": v}
+         for v in values],
+        AnomalyStrategy.SIMPLE,
+    )
+    _, simple = ingest.anomaly_detector.detect_simple_batch(["flow"] * 3, values)
+    assert [r["is_anomaly"] for r in rows] == [False, False, False]
+    # Inliers keep their threshold score; the outlier takes the model's
+    assert [r["anomaly_score"] for r in rows[:2]] == simple[:2].tolist()
+    model_score = registry.get(model_key(1, "FLOW-1", "flow")).detector \
+        .score_isolation_forest([160.0])[1][0]
+    assert rows[2]["anomaly_score"] == max(model_score, simple[2])
+
+
+async def test_sensorless_series_fits_only_its_own_history(tmp_path, project, db_session):
+    readings = [(None, 100.0)] * 30 + [("", 100.0)] * 5 + [("FLOW-1", 5.0)] * 40
+    await batch_create_metrics(db_session, [
+        {"project_id": project.id, "sensor_id": sensor, "metric_type": "flow",
+         "value": value, "unit": "L/s"}
+        for sensor, value in readings
+    ])
+    await db_session.commit()
+
+    registry = make_registry(tmp_path)
+    entry = await registry.refit(session_factory, model_key(project.id, None, "flow"))
+    assert entry.n_samples == 35
@@ -0,0 +1,206 @@
+"""Notification outbox and delivery tests, against a local SMTP server and a fake SMS gateway."""
+
+import asyncio
+import socket
+from datetime import datetime, timezone
+from email import message_from_bytes
+
+import httpx
+import pytest
+from aiosmtpd.controller import Controller
+from sqlmodel import select
+
+from app.core.cache import flush_stale
+from app.models.alert import Alert, AlertRule
+from app.models.link import UserTenant
+from app.models.notification import Notification
+from app.models.project import Tenant, WaterProject
+from app.models.user import User
+from app.services.alert_state import AlertTracker
+from app.services.notifications import NotificationDispatcher, SmsSender, SmtpSender
+from app.services.rules import RuleEngine
+from tests.conftest import test_session_factory as session_factory
+
+
+class Inbox:
+    """aiosmtpd handler that keeps every message and counts connections."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(message_from_bytes(envelope.content))
+        self.connections.add(id(session))
+        return "250 OK"
+
+
+class Gateway:
+    """Fake SMS HTTP endpoint that tracks requests in flight."""
+
+    def __init__(self, delay: float = 0.0, reject: str | None = None):
+        self.delay = delay
+        self.reject = reject
+        self.sent: list[dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            body = httpx.Response(200, content=request.content).json()
+            if body["to"] == self.reject:
+                return httpx.Response(500)
+            self.sent.append(body)
+            return httpx.Response(200, json={"status": "queued"})
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def smtp():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    inbox.port = port
+    yield inbox
+    controller.stop()
+
+
+def _alert(alert_id: int, title: str = "Low Pressure", severity: str = "critical") -> Alert:
+    return Alert(id=alert_id, project_id=1, title=title, message="Pressure at P-1: 0.4 bar < 1",
+                 severity=severity, alert_type="threshold",
+                 created_at=datetime(2025, 6, 1, tzinfo=timezone.utc))
+
+
+def _row(row_id: int, channel: str, recipient: str, alert_id: int) -> Notification:
+    return Notification(id=row_id, alert_id=alert_id, channel=channel, recipient=recipient,
+                        attempts=1)
+
+
+async def test_emails_share_one_connection_and_coalesce(smtp):
+    dispatcher = NotificationDispatcher()
+    dispatcher.use_senders(email=SmtpSender("127.0.0.1", smtp.port))
+    alerts = {i: _alert(i, f"Alert {i}") for i in (1, 2, 3)}
+    try:
+        rows = [_row(1, "email", "ops@example.com", 1), _row(2, "email", "ops@example.com", 2),
+                _row(3, "email", "ceo@example.com", 3)]
+        assert await dispatcher.deliver(rows, alerts) == {}
+        assert await dispatcher.deliver([_row(4, "email", "ceo@example.com", 1)], alerts) == {}
+    finally:
+        await dispatcher.email.close()
+
+    subjects = sorted(m["Subject"] for m in smtp.messages)
+    assert subjects == ["2 new water alerts", "[CRITICAL] Alert 1", "[CRITICAL] Alert 3"]
+    digest = next(m for m in smtp.messages if m["To"] == "ops@example.com")
+    assert "Alert 1" in digest.get_payload() and "Alert 2" in digest.get_payload()
+    assert dispatcher.email.connects == 1 and len(smtp.connections) == 1
+
+
+async def test_sms_concurrency_is_bounded():
+    gateway = Gateway(delay=0.01, reject="+255700000013")
+    dispatcher = NotificationDispatcher()
+    dispatcher.use_senders(sms=SmsSender("http://sms.test/send", "key", concurrency=4,
+                                         transport=httpx.MockTransport(gateway)))
+    rows = [_row(i, "sms", f"+2557000000{i:02d}", 1) for i in range(1, 21)]
+    try:
+        errors = await dispatcher.deliver(rows, {1: _alert(1)})
+    finally:
+        await dispatcher.sms.close()
+
+    assert list(errors) == [13]
+    assert len(gateway.sent) == 19
+    assert gateway.max_in_flight == 4
+    assert gateway.sent[0]["message"] == "[CRITICAL] Low Pressure: Pressure at P-1: 0.4 bar < 1"
+
+
+async def _site(session) -> tuple[WaterProject, AlertRule]:
+    tenant = Tenant(name="DAWASA", code="DAWASA", region="Dar es Salaam")
+    session.add(tenant)
+    await session.flush()
+    project = WaterProject(name="Kimara", project_code="TZ-WP-0100", project_type="borehole",
+                           region="Dar es Salaam", district="Ubungo", tenant_id=tenant.id)
+    users = [
+        User(email="op@example.com", full_name="Op", hashed_password="x", role="operator",
+             phone="+255700000001"),
+        User(email="analyst@example.com", full_name="Analyst", hashed_password="x",
+             role="analyst", phone="+255700000002"),  # cannot view alerts
+        User(email="ceo@example.com", full_name="CEO", hashed_password="x", role="ceo"),
+    ]
+    rule = AlertRule(name="Low Pressure", metric_type="pressure", condition="lt",
+                     threshold=1.0, severity="critical", notify_email=True, notify_sms=True)
+    session.add_all([project, rule, *users])
+    await session.flush()
+    session.add_all([UserTenant(user_id=u.id, tenant_id=tenant.id) for u in users])
+    await session.commit()
+    return project, rule
+
+
+async def test_opened_alerts_are_delivered_from_the_outbox(db_session, smtp):
+    project, _ = await _site(db_session)
+    gateway = Gateway(reject="+255700000001")
+    dispatcher = NotificationDispatcher(digest_seconds=0, retry_seconds=30)
+    dispatcher.use_senders(
+        email=SmtpSender("127.0.0.1", smtp.port),
+        sms=SmsSender("http://sms.test/send", transport=httpx.MockTransport(gateway)),
+    )
+    engine = RuleEngine(tracker=AlertTracker(), notifier=dispatcher)
+    reading = {"project_id": project.id, "sensor_id": "P-1", "metric_type": "pressure",
+               "value": 0.4, "unit": "bar"}
+
+    await engine.evaluate(db_session, [reading])
+    await engine.evaluate(db_session, [{**reading, "value": 0.3}])  # repeat: no new rows
+    await db_session.commit()
+    await flush_stale(db_session)
+    assert dispatcher._wake.is_set()
+
+    try:
+        assert await dispatcher.dispatch(session_factory) == 3
+        assert await dispatcher.dispatch(session_factory) == 0
+    finally:
+        await dispatcher.stop()
+
+    assert sorted(m["To"] for m in smtp.messages) == ["ceo@example.com", "op@example.com"]
+    rows = (await db_session.exec(
+        select(Notification).order_by(Notification.id).execution_options(populate_existing=True)
+    )).all()
+    assert [(r.channel, r.recipient, r.status, r.attempts) for r in rows] == [
+        ("email", "op@example.com", "sent", 1),
+        ("email", "ceo@example.com", "sent", 1),
+        ("sms", "+255700000001", "pending", 1),
+    ]
+    assert rows[0].sent_at is not None
+    assert "500" in rows[2].last_error
+    assert (rows[2].next_attempt_at - datetime.now(timezone.utc)).total_seconds() > 25
+
+
+async def test_lease_is_renewed_while_sending(db_session):
+    project, _ = await _site(db_session)
+    gateway = Gateway(delay=0.6)
+
+    def dispatcher() -> NotificationDispatcher:
+        d = NotificationDispatcher(lease_seconds=0.3)
+        d.use_senders(sms=SmsSender("http://sms.test/send",
+                                    transport=httpx.MockTransport(gateway)))
+        return d
+
+    first, second = dispatcher(), dispatcher()
+    engine = RuleEngine(tracker=AlertTracker(), notifier=first)
+    await engine.evaluate(db_session, [{"project_id": project.id, "sensor_id": "P-1",
+                                        "metric_type": "pressure", "value": 0.4, "unit": "bar"}])
+    await db_session.commit()
+
+    try:
+        sending = asyncio.create_task(first.dispatch(session_factory))
+        await asyncio.sleep(0.45)  # past the first lease, still sending
+        assert await second.dispatch(session_factory) == 0
+        assert await sending == 1
+    finally:
+        await first.stop()
+        await second.stop()
+    assert len(gateway.sent) == 1
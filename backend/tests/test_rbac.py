@@ -0,0 +1,56 @@
+"""Compiled RBAC permission mask tests."""
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.permissions import (
+    PERMISSION_BITS,
+    PERMISSIONS,
+    PERMISSIONS_VERSION,
+    ROLE_MASKS,
+    permission_bit,
+)
+from app.core.rbac import require_permission, token_permission_mask
+from app.core.security import create_access_token, decode_token
+from app.models.user import User
+
+
+def test_masks_match_matrix():
+    for role, permissions in PERMISSIONS.items():
+        for permission, bit in PERMISSION_BITS.items():
+            assert bool(ROLE_MASKS[role.value] & bit) == (permission in permissions)
+
+
+def test_unknown_permission_rejected_at_definition():
+    with pytest.raises(ValueError):
+        permission_bit("view:everything")
+    with pytest.raises(ValueError):
+        require_permission("view:everything")
+
+
+def test_access_token_embeds_mask():
+    payload = decode_token(create_access_token({"sub": "1", "role": "operator"}))
+    assert payload["perm"] == ROLE_MASKS["operator"]
+    assert payload["pv"] == PERMISSIONS_VERSION
+
+
+def test_stale_claims_fall_back_to_current_role():
+    user = User(email="a@b.c", full_name="A", hashed_password="x", role="operator")
+    ceo_mask = ROLE_MASKS["ceo"]
+    # Role changed since the token was issued
+    assert token_permission_mask(
+        {"role": "ceo", "perm": ceo_mask, "pv": PERMISSIONS_VERSION}, user
+    ) == ROLE_MASKS["operator"]
+    # Token minted from an older permission matrix
+    assert token_permission_mask(
+        {"role": "operator", "perm": ceo_mask, "pv": "0000"}, user
+    ) == ROLE_MASKS["operator"]
+
+
+async def test_token_for_old_role_is_not_trusted(client: AsyncClient, operator_headers):
+    me = (await client.get("/api/v1/users/me", headers=operator_headers)).json()
+    token = create_access_token({"sub": str(me["id"]), "role": "ceo"})
+    res = await client.get(
+        "/api/v1/dashboard/kpis", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert res.status_code == 403
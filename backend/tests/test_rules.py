@@ -0,0 +1,281 @@
+"""Alert rule engine tests."""
+
+import operator
+import random
+from datetime import datetime, timedelta, timezone
+
+from httpx import AsyncClient
+
+from app.core.cache import flush_stale
+from app.models.alert import AlertRule
+from app.models.project import Tenant, WaterProject
+from app.services.rules import RuleEngine, rule_engine
+from app.services.sliding_window import SlidingWindow, WindowStore
+
+T0 = datetime(2025, 6, 1, tzinfo=timezone.utc)
+OPERATORS = {
+    "gt": operator.gt, "gte": operator.ge, "lt": operator.lt,
+    "lte": operator.le, "eq": operator.eq,
+}
+
+
+def _engine(*rules: AlertRule) -> RuleEngine:
+    engine = RuleEngine()
+    engine.use_rules(rules)
+    return engine
+
+
+def _rule(rule_id: int, condition: str, threshold: float | None = None, **extra) -> AlertRule:
+    return AlertRule(
+        id=rule_id, name=f"Rule {rule_id}", metric_type=extra.pop("metric_type", "pressure"),
+        condition=condition, threshold=threshold, **extra,
+    )
+
+
+def _reading(value: float, project_id: int = 1, minutes: int = 0, **extra) -> dict:
+    return {
+        "project_id": project_id, "metric_type": "pressure", "value": value,
+        "unit": "bar", "recorded_at": T0 + timedelta(minutes=minutes), **extra,
+    }
+
+
+def _fired(engine: RuleEngine, readings: list[dict], tenants=None) -> set[tuple[int, float]]:
+    return {
+        (engine.rules[rule].id, readings[i]["value"])
+        for rule, i, _ in engine.match(readings, tenants)
+    }
+
+
+def test_threshold_boundaries():
+    engine = _engine(
+        _rule(1, "gt", 5), _rule(2, "gte", 5), _rule(3, "lt", 5),
+        _rule(4, "lte", 5), _rule(5, "eq", 5),
+    )
+    assert {rule for rule, _ in _fired(engine, [_reading(5.0)])} == {2, 4, 5}
+    assert {rule for rule, _ in _fired(engine, [_reading(6.0, sensor_id="a")])} == {1, 2}
+    assert {rule for rule, _ in _fired(engine, [_reading(4.0, sensor_id="b")])} == {3, 4}
+
+
+def test_scopes_and_anomaly():
+    engine = _engine(
+        _rule(1, "gt", 7),
+        _rule(2, "gt", 7, project_id=2),
+        _rule(3, "gt", 7, tenant_id=10),
+        _rule(4, "anomaly", metric_type="flow"),
+    )
+    readings = [
+        _reading(8.0, project_id=1),
+        _reading(9.0, project_id=2),
+        {**_reading(1.0, project_id=3), "metric_type": "flow", "is_anomaly": True},
+        {**_reading(2.0, project_id=3, sensor_id="x"), "metric_type": "flow", "is_anomaly": False},
+    ]
+    assert _fired(engine, readings, tenants={1: 10, 2: None}) == {
+        (1, 8.0), (3, 8.0), (1, 9.0), (2, 9.0), (4, 1.0),
+    }
+
+
+def test_one_alert_per_rule_and_sensor_per_batch():
+    engine = _engine(_rule(1, "lt", 1.0))
+    readings = [
+        _reading(0.5, minutes=2, sensor_id="a"),
+        _reading(0.2, minutes=5, sensor_id="a"),
+        _reading(0.9, minutes=1, sensor_id="a"),
+        _reading(0.7, minutes=0, sensor_id="b"),
+    ]
+    assert _fired(engine, readings) == {(1, 0.2), (1, 0.7)}
+
+
+def test_matches_brute_force_over_many_rules():
+    rng = random.Random(7)
+    conditions = list(OPERATORS) + ["anomaly"]
+    rules = [
+        _rule(
+            i, (condition := rng.choice(conditions)),
+            None if condition == "anomaly" else float(rng.randint(0, 20)),
+            metric_type=rng.choice(["pressure", "flow"]),
+            project_id=rng.choice([None, None, 1, 2]),
+        )
+        for i in range(1, 2001)
+    ]
+    readings = [
+        {
+            **_reading(float(rng.randint(0, 20)), project_id=rng.choice([1, 2, 3]),
+                       sensor_id=f"s{i}"),
+            "metric_type": rng.choice(["pressure", "flow"]),
+            "is_anomaly": rng.random() < 0.2,
+        }
+        for i in range(300)
+    ]
+
+    expected = set()
+    for rule in rules:
+        for i, d in enumerate(readings):
+            if d["metric_type"] != rule.metric_type:
+                continue
+            if rule.project_id is not None and rule.project_id != d["project_id"]:
+                continue
+            hit = d["is_anomaly"] if rule.condition == "anomaly" else (
+                OPERATORS[rule.condition](d["value"], rule.threshold)
+            )
+            if hit:
+                expected.add((rule.id, i))
+
+    engine = _engine(*rules)
+    assert {(engine.rules[r].id, i) for r, i, _ in engine.match(readings)} == expected
+
+
+def test_sliding_window_matches_brute_force():
+    rng = random.Random(3)
+    window = SlidingWindow(60)
+    seen = []
+    ts = 0.0
+    for _ in range(2000):
+        ts += rng.choice([0, 1, 5, 20, 90])
+        value = rng.uniform(-10, 10)
+        assert window.push(ts, value)
+        seen.append((ts, value))
+        current = [v for t, v in seen if t > ts - 60]
+        assert len(window) == len(current)
+        assert abs(window.aggregate("avg") - sum(current) / len(current)) < 1e-9
+        assert window.aggregate("min") == min(current)
+        assert window.aggregate("max") == max(current)
+
+    # Late readings are ignored rather than corrupting the window
+    assert not window.push(ts - 1, 1000.0)
+    assert window.aggregate("max") == max(v for t, v in seen if t > ts - 60)
+
+
+def test_sliding_window_restarts_after_a_gap():
+    window = SlidingWindow(900)
+    for ts in range(0, 1000, 10):
+        window.push(float(ts), 5.0)
+    assert window.covered
+
+    # A day of silence, then one noisy reading: not a sustained breach
+    window.push(1000.0 + 86_400, 0.1)
+    assert (len(window), window.covered) == (1, False)
+    for ts in range(10, 910, 10):
+        window.push(1000.0 + 86_400 + ts, 0.1)
+    assert window.covered and abs(window.aggregate("avg") - 0.1) < 1e-9
+
+
+def test_window_store_evicts_least_recently_used():
+    store = WindowStore(max_windows=2)
+    a = store.get("a", 60)
+    store.get("b", 60)
+    assert store.get("a", 60) is a
+    store.get("c", 60)
+    assert len(store) == 2 and store.get("a", 60) is a
+    assert store.get("a", 120) is not a  # window length changed
+
+
+def test_windowed_rule_needs_a_sustained_breach():
+    engine = _engine(_rule(1, "lt", 1.0, aggregate="avg", window_seconds=600))
+
+    # Nothing fires until a sensor's readings span the whole window
+    assert _fired(engine, [_reading(0.8, minutes=0, sensor_id="low")]) == set()
+    assert _fired(engine, [_reading(0.9, minutes=5, sensor_id="low")]) == set()
+    # One dip on a healthy sensor is averaged away
+    blip = [_reading(v, minutes=m, sensor_id="blip") for m, v in ((0, 1.5), (4, 0.2), (5, 1.5))]
+    assert _fired(engine, blip) == set()
+
+    # The 0.8 at minute 0 has left the window: avg(0.9, 0.7) is reported
+    readings = [_reading(0.7, minutes=10, sensor_id="low"),
+                _reading(1.5, minutes=10, sensor_id="blip")]
+    ((rule, i, value),) = engine.match(readings)
+    assert (engine.rules[rule].id, i) == (1, 0)
+    assert abs(value - 0.8) < 1e-9
+
+
+async def test_tenant_rules_resolve_project_tenant(db_session):
+    tenant = Tenant(name="DAWASA", code="DAWASA", region="Dar es Salaam")
+    db_session.add(tenant)
+    await db_session.flush()
+    project = WaterProject(
+        name="Kimara", project_code="TZ-WP-0100", project_type="borehole",
+        region="Dar es Salaam", district="Ubungo", tenant_id=tenant.id,
+    )
+    db_session.add_all([project, _rule(None, "gt", 7, tenant_id=tenant.id)])
+    await db_session.flush()
+
+    engine = RuleEngine()
+    alerts = await engine.evaluate(db_session, [_reading(8.0, project_id=project.id)])
+    assert [(a.project_id, a.alert_type, a.threshold_value) for a in alerts] == [
+        (project.id, "threshold", 7.0)
+    ]
+
+
+async def test_ingest_raises_alerts_from_new_rules(
+    client: AsyncClient, ceo_headers, operator_headers, project, db_session
+):
+    batch = {"metrics": [
+        {"project_id": project.id, "sensor_id": "P-1", "metric_type": "pressure",
+         "value": 0.4, "unit": "bar"},
+    ]}
+    # No rules yet: nothing fires, and the engine caches the empty rule set
+    await client.post("/api/v1/metrics/batch", headers=operator_headers, json=batch)
+    res = await client.get("/api/v1/alerts", headers=ceo_headers)
+    assert res.json() == []
+
+    res = await client.post("/api/v1/alerts/rules", headers=ceo_headers, json={
+        "name": "Low Pressure", "metric_type": "pressure", "condition": "lt",
+        "threshold": 1.0, "severity": "critical",
+    })
+    assert res.status_code == 201
+
+    res = await client.post("/api/v1/metrics/batch", headers=operator_headers, json=batch)
+    assert res.status_code == 201
+    (alert,) = (await client.get("/api/v1/alerts", headers=ceo_headers)).json()
+    assert alert["title"] == "Low Pressure"
+    assert alert["severity"] == "critical"
+    assert alert["metric_value"] == 0.4
+    assert alert["message"] == "Pressure at P-1: 0.4 bar < 1"
+
+    # A repeat firing is counted on the open alert, not added as a new one
+    res = await client.post("/api/v1/metrics", headers=operator_headers,
+                            json={**batch["metrics"][0], "value": 0.3})
+    assert res.status_code == 201
+    await rule_engine.tracker.flush(db_session)
+    await db_session.commit()
+    await flush_stale(db_session)
+    (alert,) = (await client.get("/api/v1/alerts", headers=ceo_headers)).json()
+    assert (alert["metric_value"], alert["occurrences"]) == (0.3, 2)
+
+
+async def test_windowed_rule_via_api(
+    client: AsyncClient, ceo_headers, operator_headers, project
+):
+    res = await client.post("/api/v1/alerts/rules", headers=ceo_headers, json={
+        "name": "Sustained Low Pressure", "metric_type": "pressure", "condition": "lt",
+        "threshold": 1.0, "aggregate": "min", "window_seconds": 300,
+    })
+    assert res.status_code == 201
+    assert (res.json()["aggregate"], res.json()["window_seconds"]) == ("min", 300)
+
+    batch = {"metrics": [
+        {"project_id": project.id, "sensor_id": "P-1", "metric_type": "pressure",
+         "value": value, "unit": "bar", "recorded_at": f"2025-06-01T00:0{minute}:00Z"}
+        for minute, value in ((0, 0.4), (3, 0.6), (5, 0.5))
+    ]}
+    res = await client.post("/api/v1/metrics/batch", headers=operator_headers, json=batch)
+    assert res.status_code == 201
+    (alert,) = (await client.get("/api/v1/alerts", headers=ceo_headers)).json()
+    assert alert["message"] == "Pressure at P-1 min over 300s: 0.5 bar < 1"
+
+
+async def test_rule_needs_threshold(client: AsyncClient, ceo_headers):
+    res = await client.post("/api/v1/alerts/rules", headers=ceo_headers, json={
+        "name": "Broken", "metric_type": "pressure", "condition": "gt",
+    })
+    assert res.status_code == 422
+    res = await client.post("/api/v1/alerts/rules", headers=ceo_headers, json={
+        "name": "Broken", "metric_type": "pressure", "condition": "between", "threshold": 1,
+    })
+    assert res.status_code == 422
+    for extra in ({"aggregate": "avg"}, {"aggregate": "median", "window_seconds": 60},
+                  {"aggregate": "avg", "window_seconds": 0}):
+        res = await client.post("/api/v1/alerts/rules", headers=ceo_headers, json={
+            "name": "Broken", "metric_type": "pressure", "condition": "lt", "threshold": 1,
+            **extra,
+        })
+        assert res.status_code == 422
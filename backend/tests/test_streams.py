@@ -0,0 +1,241 @@
+"""Live stream (pub/sub + SSE) tests."""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis, FakeServer
+from httpx import AsyncClient
+
+from app.core.cache import flush_stale
+from app.core.pubsub import Broker, broker, make_message, sse_events
+from app.crud.alert import create_alert
+from app.crud.metric import batch_create_metrics
+from app.main import app
+from app.models.user import User
+from tests.conftest import auth_headers
+
+
+def _reading(project_id: int, metric_type: str, value: float, recorded_at: str) -> dict:
+    return {
+        "project_id": project_id,
+        "metric_type": metric_type,
+        "value": value,
+        "unit": "bar",
+        "recorded_at": recorded_at,
+    }
+
+
+def _parse(frame: str) -> tuple[str, dict]:
+    lines = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+class Stream:
+    """Drive a streaming GET through the ASGI app, frame by frame."""
+
+    def __init__(self, path: str, headers: dict):
+        self.path, _, query = path.partition("?")
+        self.query = query.encode()
+        self.headers = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+        self.status = None
+        self.frames: asyncio.Queue[str] = asyncio.Queue()
+        self._started = asyncio.Event()
+        self._gone = asyncio.Event()
+        self._requested = False
+
+    async def _receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self._started.set()
+        elif message.get("body"):
+            await self.frames.put(message["body"].decode())
+
+    async def __aenter__(self):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": self.path,
+            "raw_path": self.path.encode(), "query_string": self.query,
+            "root_path": "", "headers": self.headers,
+            "server": ("test", 80), "client": ("test", 1234),
+        }
+        self._task = asyncio.create_task(app(scope, self._receive, self._send))
+        await asyncio.wait_for(self._started.wait(), 5)
+        return self
+
+    async def event(self) -> tuple[str, dict]:
+        """Next event, skipping retry hints and keepalives."""
+        while True:
+            frame = await asyncio.wait_for(self.frames.get(), 5)
+            if frame.startswith("event:"):
+                return _parse(frame)
+
+    async def __aexit__(self, *exc):
+        self._gone.set()
+        await asyncio.wait_for(self._task, 5)
+
+
+@pytest_asyncio.fixture
+async def minister_headers(db_session) -> dict:
+    user = User(email="minister@example.com", full_name="Minister",
+                hashed_password="x", role="minister")
+    db_session.add(user)
+    await db_session.commit()
+    await db_session.refresh(user)
+    return auth_headers(user)
+
+
+async def test_fan_out_renders_once():
+    hub = Broker()
+    a, b, other = hub.subscribe("metrics:1"), hub.subscribe("metrics:1"), hub.subscribe("metrics:2")
+    await hub.publish("metrics:1", "metric", {"value": 1.0})
+
+    first, second = a.queue.get_nowait(), b.queue.get_nowait()
+    assert first.frame is second.frame
+    assert other.queue.empty()
+    assert hub.stats()["delivered"] == 2
+
+
+async def test_slow_subscriber_drops_its_oldest():
+    hub = Broker(queue_size=2)
+    slow, filtered = hub.subscribe("alerts"), hub.subscribe("alerts", lambda d: d["n"] == 4)
+    for n in range(5):
+        await hub.publish("alerts", "alert", {"n": n})
+
+    assert [slow.queue.get_nowait().data["n"] for _ in range(2)] == [3, 4]
+    assert slow.dropped == 3
+    assert filtered.queue.qsize() == 1 and filtered.dropped == 0
+
+
+async def test_unsubscribed_channels_skip_encoding():
+    hub = Broker()
+    sub = hub.subscribe("alerts")
+    sub.close()
+    await hub.publish("alerts", "alert", {})
+    assert hub.published == 0
+    assert hub.stats()["channels"] == 0
+
+
+async def test_redis_relay_reaches_other_workers():
+    server = FakeServer()
+    workers = [Broker(backend="redis", prefix="t") for _ in range(2)]
+    for worker in workers:
+        worker.use_client(FakeAsyncRedis(server=server))
+        worker.start()
+    try:
+        sub = workers[1].subscribe("alerts")
+        await asyncio.sleep(0.05)  # let the listeners subscribe
+        await workers[0].publish("alerts", "alert", {"id": 7})
+        message = await asyncio.wait_for(sub.queue.get(), 5)
+        assert message.data == {"id": 7}
+    finally:
+        for worker in workers:
+            await worker.stop()
+
+
+async def test_sse_heartbeat_lag_and_expiry():
+    hub = Broker(queue_size=1)
+    sub = hub.subscribe("alerts")
+    frames = sse_events(sub, [make_message("alert", {"id": 0})],
+                        heartbeat_seconds=0.01, expires_at=time.time() + 0.2)
+
+    assert await anext(frames) == "retry: 3000\n\n"
+    assert _parse(await anext(frames)) == ("alert", {"id": 0})
+    assert await anext(frames) == ": keepalive\n\n"
+
+    for n in (1, 2):
+        await hub.publish("alerts", "alert", {"id": n})
+    assert _parse(await anext(frames)) == ("lagged", {"dropped": 1})
+    assert _parse(await anext(frames)) == ("alert", {"id": 2})
+
+    rest = [frame async for frame in frames]
+    assert all(frame == ": keepalive\n\n" for frame in rest)
+    assert hub.stats()["subscribers"] == 0
+
+
+async def _ingest(session, *readings: dict) -> None:
+    await batch_create_metrics(session, [
+        {**r, "recorded_at": datetime.fromisoformat(r["recorded_at"])} for r in readings
+    ])
+
+
+async def test_committed_batch_publishes_changed_series(db_session, project):
+    sub = broker.subscribe(f"metrics:{project.id}")
+    try:
+        await _ingest(
+            db_session,
+            _reading(project.id, "pressure", 1.0, "2025-06-01T00:00:00Z"),
+            _reading(project.id, "pressure", 2.0, "2025-06-01T00:01:00Z"),
+            _reading(project.id, "flow", 9.0, "2025-06-01T00:00:00Z"),
+        )
+        assert sub.queue.empty()  # nothing before commit
+        await db_session.commit()
+        await flush_stale(db_session)
+        events = [sub.queue.get_nowait().data for _ in range(sub.queue.qsize())]
+        assert {(e["metric_type"], e["value"]) for e in events} == {("pressure", 2.0), ("flow", 9.0)}
+
+        # An older reading does not move the series, so nothing is pushed
+        await _ingest(db_session, _reading(project.id, "pressure", 0.5, "2025-05-01T00:00:00Z"))
+        await db_session.commit()
+        await flush_stale(db_session)
+        assert sub.queue.empty()
+    finally:
+        sub.close()
+
+
+async def test_metric_stream_endpoint(client: AsyncClient, operator_headers, project):
+    await client.post("/api/v1/metrics", headers=operator_headers,
+                      json=_reading(project.id, "flow", 10.0, "2025-06-01T00:00:00Z"))
+
+    async with Stream(f"/api/v1/metrics/{project.id}/stream", operator_headers) as stream:
+        assert stream.status == 200
+        event, data = await stream.event()
+        assert (event, data["value"]) == ("metric", 10.0)
+
+        res = await client.post("/api/v1/metrics", headers=operator_headers,
+                                json=_reading(project.id, "flow", 11.0, "2025-06-01T00:01:00Z"))
+        event, data = await stream.event()
+        assert (event, data["value"], data["id"]) == ("metric", 11.0, res.json()["id"])
+
+
+async def test_alert_stream_filters_and_pushes(client: AsyncClient, ceo_headers, project, db_session):
+    await create_alert(db_session, {"project_id": project.id, "title": "Old", "message": "m",
+                                    "alert_type": "leak", "severity": "critical"})
+    await db_session.commit()
+    await flush_stale(db_session)
+
+    path = "/api/v1/alerts/stream?severity=critical"
+    async with Stream(path, ceo_headers) as stream:
+        event, data = await stream.event()
+        assert (event, data["title"]) == ("alert", "Old")
+
+        for title, severity in (("Minor", "info"), ("Burst", "critical")):
+            await create_alert(db_session, {"project_id": project.id, "title": title,
+                                            "message": "m", "alert_type": "leak",
+                                            "severity": severity})
+        await db_session.commit()
+        await flush_stale(db_session)
+        event, data = await stream.event()
+        assert data["title"] == "Burst"
+
+        res = await client.post(f"/api/v1/alerts/{data['id']}/resolve", headers=ceo_headers)
+        assert res.status_code == 200
+        event, data = await stream.event()
+        assert (data["title"], data["status"]) == ("Burst", "resolved")
+
+
+async def test_streams_require_permission(client: AsyncClient, minister_headers, project):
+    res = await client.get(f"/api/v1/metrics/{project.id}/stream", headers=minister_headers)
+    assert res.status_code == 403
+    res = await client.get(f"/api/v1/metrics/{project.id}/stream")
+    assert res.status_code == 401
+    assert broker.stats()["subscribers"] == 0
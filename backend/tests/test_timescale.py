@@ -0,0 +1,234 @@
+"""TimescaleDB setup and aggregate routing tests."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.core import timescale
+from app.core.timescale import CONTINUOUS_AGGREGATES, AggregateRefresher, setup_timescale
+from app.crud import metric as metric_crud
+from app.core.cache import flush_stale
+from app.crud.metric import (
+    QuerySegment,
+    backfilled_spans,
+    batch_create_metrics,
+    batch_create_metrics_orm,
+    get_aggregated_metrics,
+    plan_aggregation,
+)
+from app.utils.intervals import parse_interval
+
+from tests.conftest import engine
+
+
+@pytest.mark.parametrize(
+    "interval, expected",
+    [
+        ("1 hour", timedelta(hours=1)),
+        ("15 minutes", timedelta(minutes=15)),
+        ("day", timedelta(days=1)),
+        ("2 Weeks", timedelta(weeks=2)),
+    ],
+)
+def test_parse_interval(interval, expected):
+    assert parse_interval(interval) == expected
+
+
+@pytest.mark.parametrize("interval", ["", "1 month", "hourly", "-1 hour", "1 2 hours"])
+def test_parse_interval_rejects(interval):
+    with pytest.raises(ValueError):
+        parse_interval(interval)
+
+
+NOW = datetime(2024, 3, 10, 12, 30, tzinfo=timezone.utc)
+MINUTELY, HOURLY, DAILY = CONTINUOUS_AGGREGATES
+
+
+def test_plan_without_tiers():
+    start = NOW - timedelta(days=90)
+    assert plan_aggregation(timedelta(days=1), start, NOW, [], NOW) == [
+        QuerySegment("metrics", start, NOW)
+    ]
+
+
+def test_plan_picks_coarsest_tier_with_raw_head_and_tail():
+    start = NOW - timedelta(days=90, hours=5)
+    segments = plan_aggregation(timedelta(days=1), start, NOW, CONTINUOUS_AGGREGATES, NOW)
+    head, middle, tail = segments
+    assert head == QuerySegment("metrics", start, datetime(2023, 12, 12, tzinfo=timezone.utc))
+    assert middle.source == "metrics_daily"
+    assert middle.start == head.end
+    # Daily buckets lag a day, so yesterday and today are read raw
+    assert middle.end == datetime(2024, 3, 9, tzinfo=timezone.utc)
+    assert tail == QuerySegment("metrics", middle.end, NOW)
+
+
+def test_plan_uses_finer_tier_when_width_does_not_tile():
+    start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    segments = plan_aggregation(timedelta(hours=6), start, NOW, CONTINUOUS_AGGREGATES, NOW)
+    assert [s.source for s in segments] == ["metrics_hourly", "metrics"]
+    assert segments[0].end == datetime(2024, 3, 10, 11, tzinfo=timezone.utc)
+
+    segments = plan_aggregation(
+        timedelta(minutes=15), NOW - timedelta(hours=3), NOW, CONTINUOUS_AGGREGATES, NOW
+    )
+    assert segments[0].source == "metrics_minutely"
+
+
+def test_plan_skips_tier_past_its_retention():
+    start = NOW - MINUTELY.horizon - timedelta(days=1)
+    segments = plan_aggregation(timedelta(minutes=5), start, NOW, CONTINUOUS_AGGREGATES, NOW)
+    assert segments == [QuerySegment("metrics", start, NOW)]
+
+
+def test_plan_short_range_reads_raw():
+    start = NOW - timedelta(minutes=50)
+    segments = plan_aggregation(timedelta(hours=1), start, NOW, CONTINUOUS_AGGREGATES, NOW)
+    assert segments == [QuerySegment("metrics", start, NOW)]
+
+
+def test_backfilled_spans_cover_what_policies_miss():
+    times = [
+        NOW - timedelta(hours=1),  # every policy still refreshes this
+        NOW - timedelta(days=4, minutes=50),
+        NOW - timedelta(days=5, hours=2, minutes=10),
+        (NOW - timedelta(days=400)).replace(tzinfo=None),  # naive UTC
+    ]
+    spans = backfilled_spans(times, CONTINUOUS_AGGREGATES, NOW)
+    utc = lambda *args: datetime(*args, tzinfo=timezone.utc)  # noqa: E731
+    # Minutely rollups keep 30 days, so the 400-day-old reading is left out
+    assert spans == [
+        ("metrics_minutely", utc(2024, 3, 5, 10, 20), utc(2024, 3, 5, 10, 21)),
+        ("metrics_minutely", utc(2024, 3, 6, 11, 40), utc(2024, 3, 6, 11, 41)),
+        # Gaps shorter than the 3-day look-back are refreshed in one go
+        ("metrics_hourly", utc(2023, 2, 4, 12), utc(2023, 2, 4, 13)),
+        ("metrics_hourly", utc(2024, 3, 5, 10), utc(2024, 3, 6, 12)),
+        ("metrics_daily", utc(2023, 2, 4), utc(2023, 2, 5)),
+    ]
+
+
+async def test_backfill_queues_rollup_refresh_after_commit(monkeypatch, db_session, project):
+    refresher = AggregateRefresher()
+    monkeypatch.setattr(metric_crud, "available_aggregates", [HOURLY])
+    monkeypatch.setattr(metric_crud, "aggregate_refresher", refresher)
+    now = datetime.now(timezone.utc)
+    backfill = now - timedelta(days=10)
+    await batch_create_metrics(db_session, [
+        {"project_id": project.id, "metric_type": "flow", "value": v, "unit": "L/s",
+         "recorded_at": at}
+        for v, at in ((1.0, backfill), (2.0, now))
+    ])
+    assert refresher.pending == []  # not before the readings are visible
+    await db_session.commit()
+    await flush_stale(db_session)
+
+    start = backfill.replace(minute=0, second=0, microsecond=0)
+    assert refresher.pending == [("metrics_hourly", start, start + timedelta(hours=1))]
+
+
+async def test_refresher_coalesces_and_retries(monkeypatch):
+    calls, fail = [], set()
+
+    async def refresh(engine, spans):
+        calls.append(list(spans))
+        return [span for span in spans if span[0] in fail]
+
+    monkeypatch.setattr(timescale, "refresh_continuous_aggregates", refresh)
+    refresher = AggregateRefresher()
+    hour = timedelta(hours=1)
+    await refresher.add([("metrics_hourly", NOW, NOW + hour), ("metrics_daily", NOW, NOW + hour)])
+    await refresher.add([
+        ("metrics_hourly", NOW + hour, NOW + 2 * hour),  # touches the first span
+        ("metrics_hourly", NOW + 5 * hour, NOW + 6 * hour),
+    ])
+    fail.add("metrics_daily")
+    assert await refresher.refresh_pending(engine) == 2
+    assert calls[0] == [
+        ("metrics_daily", NOW, NOW + hour),
+        ("metrics_hourly", NOW, NOW + 2 * hour),
+        ("metrics_hourly", NOW + 5 * hour, NOW + 6 * hour),
+    ]
+    # The failed span waits for the next run
+    assert refresher.pending == [("metrics_daily", NOW, NOW + hour)]
+    fail.clear()
+    assert await refresher.refresh_pending(engine) == 1
+    assert await refresher.refresh_pending(engine) == 0
+    assert len(calls) == 2
+
+
+async def test_aggregated_metrics_merges_rollup_and_raw(monkeypatch, db_session, project):
+    """Emulate an hourly rollup with a plain table and check the merge."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    base = today - timedelta(days=2)
+    monkeypatch.setattr(timescale, "available_aggregates", [HOURLY])
+    monkeypatch.setattr(metric_crud, "available_aggregates", [HOURLY])
+    await db_session.exec(text("""
+        CREATE TABLE metrics_hourly (
+            project_id integer, metric_type varchar, bucket timestamptz,
+            sum_value float, min_value float, max_value float, count bigint
+        )
+    """))
+    try:
+        # Rollup covers 01:00-03:00 with an end bound inside the 03:00
+        # bucket; the unaligned head (00:30) and the tail (03:10) are raw.
+        await db_session.exec(text("""
+            INSERT INTO metrics_hourly VALUES
+                (:p, 'flow', :b1, 30.0, 10.0, 20.0, 2),
+                (:p, 'flow', :b2, 40.0, 40.0, 40.0, 1)
+        """), params={
+            "p": project.id,
+            "b1": base + timedelta(hours=1),
+            "b2": base + timedelta(hours=2),
+        })
+        await batch_create_metrics_orm(db_session, [
+            {
+                "project_id": project.id,
+                "metric_type": "flow",
+                "value": v,
+                "unit": "L/s",
+                "recorded_at": base + offset,
+            }
+            for v, offset in [
+                (5.0, timedelta(minutes=30)),
+                (7.0, timedelta(hours=3, minutes=10)),
+                # Inside the rollup span: must come from metrics_hourly only
+                (999.0, timedelta(hours=1, minutes=5)),
+            ]
+        ])
+
+        rows = await get_aggregated_metrics(
+            db_session, project.id, "flow", "2 hours",
+            base + timedelta(minutes=15), base + timedelta(hours=3, minutes=30),
+        )
+    finally:
+        await db_session.rollback()
+
+    assert rows == [
+        {"period": base.isoformat(), "avg_value": 11.667, "min_value": 5.0,
+         "max_value": 20.0, "count": 3},
+        {"period": (base + timedelta(hours=2)).isoformat(), "avg_value": 23.5,
+         "min_value": 7.0, "max_value": 40.0, "count": 2},
+    ]
+
+
+async def test_setup_without_extension():
+    async with engine.connect() as conn:
+        installed = (await conn.execute(text(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'"
+        ))).first()
+    if installed is not None:
+        pytest.skip("TimescaleDB is installed on the test database")
+    assert await setup_timescale(engine) is False
+    assert timescale.available_aggregates == []
+
+
+async def test_refresh_without_a_connection_returns_every_span():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    unreachable = create_async_engine("postgresql+asyncpg://nobody@127.0.0.1:1/none")
+    spans = [("metrics_hourly", NOW, NOW + timedelta(hours=1))]
+    try:
+        assert await timescale.refresh_continuous_aggregates(unreachable, spans) == spans
+    finally:
+        await unreachable.dispose()